@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import argparse
+import io
+import os
+import sys
+from time import time
+
+from lockdown.utils import set_debug, set_runtime_type_information, profile
+
+
+# Only what --help needs is imported here. The parser, and the ANTLR runtime that it imports, are
+# imported when a program is not in the parse cache.
+
+parser = argparse.ArgumentParser(prog="lockdown")
+parser.add_argument('-d', action='store_true', help='debug')
+parser.add_argument('-t', action='store_false', help='rtti mode off')
+commands = parser.add_subparsers(dest="command")
+
+run_parser = commands.add_parser("run", help="verify a program and run it")
+run_parser.add_argument("file", help="the program")
+run_parser.add_argument("-m", "--mode", choices=[ "interpret", "transpile" ], default="interpret", help="how to execute the program")
+run_parser.add_argument("-s", "--safe", action="store_true", help="refuse to run a program that might exit unsafely")
+run_parser.add_argument("-b", "--backend", default="antlr", help="the parser backend")
+run_parser.add_argument(
+    "--parse-cache", nargs="?", const=os.path.join("~", ".cache", "lockdown", "parse"), metavar="DIRECTORY",
+    help="also cache parses on disk, in DIRECTORY or ~/.cache/lockdown/parse. LOCKDOWN_PARSE_CACHE by default, and only in memory if neither is given"
+)
+run_parser.add_argument("--profile", help="write cProfile stats for the run to this file")
+run_parser.add_argument(
+    "--profile-opcodes", metavar="FILE",
+    help="profile the opcodes that run, writing pstats to FILE, flamegraph stacks to FILE.collapsed and the hottest lines to stderr"
+)
+run_parser.add_argument(
+    "--profile-samples", metavar="FILE",
+    help="sample the Lockdown stack while the program runs, writing flamegraph stacks to FILE and the hottest lines to stderr"
+)
+run_parser.add_argument("--sample-interval", type=float, default=0.001, help="the seconds of CPU time between samples")
+run_parser.add_argument("--timings", action="store_true", help="print the wall time of each phase to stderr")
+
+compile_parser = commands.add_parser("compile", help="verify a program and compile it into a python module")
+compile_parser.add_argument("file", help="the program")
+compile_parser.add_argument("-o", "--output", help="the python module to write, FILE with a .py extension by default")
+compile_parser.add_argument("-b", "--backend", default="antlr", help="the parser backend")
+compile_parser.add_argument("--no-transpile", dest="transpile", action="store_false", help="interpret the program rather than transpiling it")
+
+
+def read_source(path):
+    with io.open(path, encoding="utf-8") as source:
+        return source.read()
+
+def load_code(source, backend, cache_directory):
+    from lockdown.executor.raw_code import RawCode
+    from lockdown.parser.parse_cache import ParseCache, get_default_cache_directory
+
+    if cache_directory is None:
+        cache_directory = get_default_cache_directory()
+    cache = ParseCache(directory=os.path.expanduser(cache_directory) if cache_directory else None)
+
+    code = cache.get(source, backend)
+    if code is None:
+        from lockdown.parser.parser import parse
+        code = parse(source, use_cache=False, backend=backend)
+        cache.put(source, code, backend)
+
+    # As parse(debug=True) does, so that errors can quote the source
+    if isinstance(code, RawCode):
+        code = code.extend(raw_code=source)
+    return code
+
+def run_program(args, source, timings):
+    start = time()
+    code = load_code(source, args.backend, args.parse_cache)
+    timings.append(("parse", time() - start))
+
+    from lockdown.executor.bootstrap import get_default_global_context, \
+        prepare_function, invoke_function
+
+    start = time()
+    context = get_default_global_context()
+    closed_function = prepare_function(code, context, check_safe_exit=args.safe).close(context)
+    timings.append(("prepare", time() - start))
+
+    if args.mode == "transpile":
+        start = time()
+        closed_function = closed_function.transpile(args.file)
+        timings.append(("transpile", time() - start))
+
+    profiler = sampler = None
+    if args.profile_opcodes:
+        from lockdown.executor.profiler import OpcodeProfiler
+        profiler = OpcodeProfiler(filename=args.file)
+    if args.profile_samples:
+        from lockdown.executor.profiler import SamplingProfiler
+        sampler = SamplingProfiler(interval=args.sample_interval, filename=args.file)
+
+    start = time()
+    if profiler:
+        profiler.enable()
+    if sampler:
+        sampler.start()
+    try:
+        result = invoke_function(closed_function)
+    finally:
+        if sampler:
+            sampler.stop()
+        if profiler:
+            profiler.disable()
+    timings.append(("execute", time() - start))
+
+    if profiler:
+        profiler.dump_stats(args.profile_opcodes)
+        profiler.dump_collapsed_stacks(args.profile_opcodes + ".collapsed")
+        sys.stderr.write(profiler.format_lines(source))
+    if sampler:
+        sampler.dump_collapsed_stacks(args.profile_samples)
+        sys.stderr.write(sampler.format_lines(source))
+
+    return code, result
+
+def run_command(args):
+    from lockdown.executor.bootstrap import print_result
+
+    source = read_source(args.file)
+    timings = []
+    if args.profile:
+        with profile(args.profile):
+            code, result = run_program(args, source, timings)
+    else:
+        code, result = run_program(args, source, timings)
+
+    if args.timings:
+        for phase, seconds in timings:
+            sys.stderr.write("{:<10} {:>9.3f} s\n".format(phase, seconds))
+
+    print_result(result, code)
+
+def compile_command(args):
+    from lockdown.executor.aot import compile_program
+    from lockdown.parser.parser import parse
+
+    code = parse(read_source(args.file), use_cache=False, backend=args.backend)
+
+    module = compile_program(code, os.path.basename(args.file), transpile=args.transpile)
+
+    output = args.output or os.path.splitext(args.file)[0] + ".py"
+    with io.open(output, "w", encoding="utf-8") as compiled:
+        compiled.write(module)
+
+COMMANDS = {
+    "run": run_command,
+    "compile": compile_command
+}
+
+def main():
+    args = parser.parse_args()
+
+    set_debug(args.d)
+    set_runtime_type_information(args.t)
+
+    from lockdown.executor.bootstrap import BootstrapException
+    from lockdown.executor.exceptions import PreparationException
+    from lockdown.parser.exceptions import ParseError
+
+    try:
+        COMMANDS[args.command](args)
+    except (ParseError, PreparationException, BootstrapException) as e:
+        sys.stderr.write("{}\n".format(unicode(e) or type(e).__name__))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+# Solutions to https://projecteuler.net/ problems, shared by the benchmarks
+EULER_SOURCES = {
+    "euler_1": """
+            function() {
+                int result = 0;
+                for(var i from range(1, 1000)) {
+                    if(i % 3 == 0 || i % 5 == 0) {
+                        result = result + i;
+                    };
+                };
+                return result;
+            };
+        """,
+    "euler_2": """
+            function() {
+                int i = 1, j = 2, result = 0;
+                while(j < 4000000) {
+                    if(j % 2 == 0) {
+                        result = result + j;
+                    };
+                    var k = j;
+                    j = i + j;
+                    i = k;
+                };
+                return result;
+            }
+        """,
+    "euler_3": """
+            function() {
+                int test = 2, result = 600851475143;
+                while(result != 1) {
+                    if(result % test == 0) {
+                        result = result / test;
+                    } else {
+                        test = test + 1;
+                    };
+                };
+                return test;
+            }
+        """,
+    "euler_4": """
+            function() {
+                int bestResult = 0;
+                int i = 999;
+                while(i >= 100) {
+                    int j = 999;
+                    while(j >= i) {
+                        int testResult = i * j;
+                        if(testResult <= bestResult) {
+                            break;
+                        };
+                        if(testResult > 100000
+                                && testResult > bestResult
+                                && testResult / 1 % 10 == testResult / 100000 % 10
+                                && testResult / 10 % 10 == testResult / 10000 % 10
+                                && testResult / 100 % 10 == testResult / 1000 % 10
+                        ) {
+                            bestResult = testResult;
+                        };
+                        j = j - 1;
+                    };
+                    i = i - 1;
+                };
+                return bestResult;
+            }
+        """,
+    "euler_6": """
+            function() {
+                int sumSquares = 0, sum = 0;
+                for(var i from range(1, 101)) {
+                    sumSquares = sumSquares + i * i;
+                    sum = sum + i;
+                };
+                return sum * sum - sumSquares;
+            }
+        """,
+    "euler_9": """
+             function() {
+                 int a = 1, topb = 998;
+                 while(a < 998) {
+                     int b = topb;
+                     while(b > a) {
+                         int c = 1000 - a - b;
+                         int test = a * a + b * b - c * c;
+                         if(test < 0) {
+                             topb = b + 1;
+                             break;
+                         };
+                         if(test == 0) {
+                             return a * b * c;
+                         };
+                         b = b - 1;
+                     };
+                     a = a + 1;
+                 };
+             }
+
+        """,
+}
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import argparse
+import sys
+from time import time
+
+from lockdown.utils import set_debug, set_runtime_type_information
+
+
+parser = argparse.ArgumentParser(description="Measures the latency of reparsing and reverifying a large module after small edits")
+parser.add_argument('-f', '--functions', type=int, default=250, help='functions in the synthetic module')
+parser.add_argument('-n', type=int, default=5, help='edits of each kind per measurement')
+parser.add_argument('--verify', action='store_true', help='also prepare the functions of the module')
+parser.add_argument(
+    '--max-reparse-fraction', type=float, default=0.1,
+    help='fail if reparsing after an edit costs more than this fraction of a full parse, which suits the default number of functions'
+)
+args = parser.parse_args()
+
+set_debug(False)
+set_runtime_type_information(True)
+
+from lockdown.executor.incremental import IncrementalVerifier
+from lockdown.parser.incremental import IncrementalParser
+from lockdown.parser.parser import parse
+
+
+FUNCTION = """    "f{index}": function() {{
+        int result = 0;
+        int total = {index};
+        for(var i from range(0, 10)) {{
+            total = total + i * 2 - {index} % 3;
+        }};
+        var helper = function(int x, int y) {{
+            if (x > y) {{
+                return x - y;
+            }} else {{
+                return y - x;
+            }};
+        }};
+        {{ int first, int second }} = {{ first: total, second: 2 }};
+        while(total > 100) {{
+            total = total / 2;
+        }};
+        result = result + helper(total, 3) + first * second;
+        return result;
+    }}"""
+
+def create_module(functions):
+    return "{\n" + ",\n".join(FUNCTION.format(index=index) for index in range(functions)) + "\n}\n"
+
+def edit_keystroke(code, edit):
+    # Types a digit into a function half way down the module
+    target = "int total = {};".format(args.functions // 2)
+    return code.replace(target, "int total = {}{};".format(args.functions // 2, edit % 10), 1)
+
+def edit_newline(code, edit):
+    # Adds a line to a function half way down the module, or takes it away again, so that every
+    # function below it moves
+    target = "int total = {};".format(args.functions // 2)
+    return code.replace(target, target + "\n", 1) if edit % 2 == 0 else code
+
+def measure(name, code, edit, verifier=None):
+    incremental_parser = IncrementalParser()
+    incremental_parser.parse(code)
+    if verifier:
+        verifier.verify(incremental_parser.parse(code))
+
+    parse_seconds = verify_seconds = 0
+    for index in range(args.n):
+        start = time()
+        ast = incremental_parser.parse(edit(code, index))
+        parse_seconds += time() - start
+        if verifier:
+            start = time()
+            verifier.verify(ast)
+            verify_seconds += time() - start
+
+    print "{:<10} {:>12.1f} {:>14} {:>16}".format(
+        name, parse_seconds / args.n * 1000, incremental_parser.tokens_lexed, incremental_parser.functions_reused
+    ) + ("" if verifier is None else " {:>12.1f} {:>10}".format(verify_seconds / args.n * 1000, verifier.functions_prepared))
+    return parse_seconds / args.n
+
+def main():
+    code = create_module(args.functions)
+    print "{} functions, {} lines".format(args.functions, code.count("\n"))
+
+    start = time()
+    parse(code, use_cache=False, backend="pratt")
+    full_parse_seconds = time() - start
+    print "full parse: {:.1f} ms".format(full_parse_seconds * 1000)
+
+    verifier = None
+    if args.verify:
+        verifier = IncrementalVerifier()
+        start = time()
+        verifier.verify(parse(code, use_cache=False, backend="pratt"))
+        print "full verification: {:.1f} ms".format((time() - start) * 1000)
+
+    print "{:<10} {:>12} {:>14} {:>16}".format("edit", "reparse ms", "tokens lexed", "functions reused") + (
+        "" if verifier is None else " {:>12} {:>10}".format("reverify ms", "prepared")
+    )
+    slow_edits = [
+        name for name, edit in [ ("keystroke", edit_keystroke), ("newline", edit_newline) ]
+        if measure(name, code, edit, verifier) > full_parse_seconds * args.max_reparse_fraction
+    ]
+    if slow_edits:
+        sys.exit("reparsing after {} cost over {:.0f}% of a full parse".format(
+            " and ".join(slow_edits), args.max_reparse_fraction * 100
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import argparse
+import json
+import subprocess
+import sys
+
+
+parser = argparse.ArgumentParser(description="Measures the time and memory to parse and prepare large synthetic programs")
+parser.add_argument('-s', '--sizes', type=int, nargs='+', default=[ 1, 2, 3, 4 ], help='blocks in each synthetic program')
+parser.add_argument('-b', '--backend', default="pratt", help='the parser backend')
+args = parser.parse_args()
+
+
+BLOCK = """
+    int total{index} = {index};
+    for(var i from range(0, 10)) {{
+        total{index} = total{index} + i * 2 - {index} % 3;
+    }};
+    var helper{index} = function(int x, int y) {{
+        if (x > y) {{
+            return x - y;
+        }} else {{
+            return y - x;
+        }};
+    }};
+    {{ int first{index}, int second{index} }} = {{ first{index}: total{index}, second{index}: 2 }};
+    while(total{index} > 100) {{
+        total{index} = total{index} / 2;
+    }};
+    result = result + helper{index}(total{index}, 3) + first{index} * second{index};
+"""
+
+def create_program(blocks):
+    return "function() {{\n    int result = 0;\n{}\n    return result;\n}}\n".format(
+        "".join(BLOCK.format(index=index) for index in range(blocks))
+    )
+
+# Run in a fresh interpreter for each program, so that the peak resident set size is its own
+MEASURE_SCRIPT = """
+import json, resource, sys
+from time import time
+from lockdown.utils import set_debug, set_runtime_type_information
+set_debug(False)
+set_runtime_type_information(True)
+from lockdown.executor.bootstrap import bootstrap_function, get_default_global_context
+from lockdown.parser.parser import parse
+from lockdown.type_system.managers import managers_by_object_id
+
+def get_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+get_default_global_context()
+rss, managers = get_rss(), len(managers_by_object_id)
+
+start = time()
+code = parse(sys.argv[1], use_cache=False, backend=sys.argv[2])
+parsed = time()
+parsed_rss, parsed_managers = get_rss(), len(managers_by_object_id)
+
+bootstrap_function(code, check_safe_exit=True)
+bootstrapped = time()
+
+print json.dumps([
+    parsed - start, parsed_managers - managers, parsed_rss - rss,
+    bootstrapped - parsed, len(managers_by_object_id) - parsed_managers, get_rss() - parsed_rss
+])
+"""
+
+def measure(code):
+    output = subprocess.check_output([ sys.executable, "-c", MEASURE_SCRIPT, code, args.backend ])
+    return json.loads(output.splitlines()[-1])
+
+def main():
+    print "{:<8} {:>6} | {:>9} {:>9} {:>9} | {:>12} {:>9} {:>9}".format(
+        "blocks", "lines", "parse s", "managers", "rss KB", "bootstrap s", "managers", "rss KB"
+    )
+    for blocks in args.sizes:
+        code = create_program(blocks)
+        parse_seconds, parse_managers, parse_rss, bootstrap_seconds, bootstrap_managers, bootstrap_rss = measure(code)
+        print "{:<8} {:>6} | {:>9.3f} {:>9} {:>9} | {:>12.3f} {:>9} {:>9}".format(
+            blocks, code.count("\n"), parse_seconds, parse_managers, parse_rss,
+            bootstrap_seconds, bootstrap_managers, bootstrap_rss
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import argparse
+import shutil
+import tempfile
+from time import time
+
+from lockdown.utils import set_debug, set_runtime_type_information
+
+
+parser = argparse.ArgumentParser(description="Compares cold and warm parses of the Euler sources")
+parser.add_argument('-n', type=int, default=5, help='parses of each source per measurement')
+args = parser.parse_args()
+
+set_debug(False)
+set_runtime_type_information(True)
+
+from lockdown.benchmarks.euler import EULER_SOURCES
+from lockdown.parser import parser as lockdown_parser
+from lockdown.parser.parse_cache import ParseCache
+
+
+def measure(code, repeats):
+    start = time()
+    for _ in range(repeats):
+        lockdown_parser.parse(code)
+    return (time() - start) / repeats * 1000
+
+def main():
+    directory = tempfile.mkdtemp(prefix="lockdown-parse-cache-")
+    try:
+        print "{:<12} {:>10} {:>12} {:>12}".format("source", "cold ms", "memory ms", "disk ms")
+        for name, code in sorted(EULER_SOURCES.items()):
+            # Cold: ANTLR and the visitor on every parse
+            lockdown_parser.PARSE_CACHE = ParseCache(directory=None, max_memory_entries=0)
+            cold = measure(code, args.n)
+
+            # Warm from memory: the serialised entry is in the LRU
+            lockdown_parser.PARSE_CACHE = ParseCache(directory=directory)
+            lockdown_parser.parse(code)
+            memory = measure(code, args.n)
+
+            # Warm from disk: a new process with the same cache directory
+            disk_cache = ParseCache(directory=directory, max_memory_entries=0)
+            lockdown_parser.PARSE_CACHE = disk_cache
+            disk = measure(code, args.n)
+
+            print "{:<12} {:>10.2f} {:>12.2f} {:>12.2f}".format(name, cold, memory, disk)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import argparse
+from time import time
+
+from lockdown.utils import set_debug, set_runtime_type_information
+
+
+parser = argparse.ArgumentParser(description="Compares the throughput of the parser backends on large synthetic programs")
+parser.add_argument('-n', type=int, default=3, help='parses of each program per measurement')
+parser.add_argument('-s', '--sizes', type=int, nargs='+', default=[ 1, 4, 32 ], help='blocks in each synthetic program')
+parser.add_argument('--antlr-limit', type=int, default=4, help='the largest program, in blocks, to parse with ANTLR')
+args = parser.parse_args()
+
+set_debug(False)
+set_runtime_type_information(True)
+
+from lockdown.parser.parser import parse, PARSE_BACKENDS
+
+
+BLOCK = """
+    int total{index} = {index};
+    for(var i from range(0, 10)) {{
+        total{index} = total{index} + i * 2 - {index} % 3;
+    }};
+    function helper{index}(int x, int y) => int {{
+        if (x > y && x != {index}) {{
+            return x - y;
+        }} else {{
+            return y - x;
+        }};
+    }};
+    List<int> values{index} = [ 1, 2, helper{index}(total{index}, 3) ];
+    {{ int first{index}, int second{index} }} = {{ first{index}: values{index}[0], second{index}: values{index}[1] }};
+    while(total{index} > 100) {{
+        total{index} = total{index} / 2;
+    }};
+    result = result + total{index} + first{index} * second{index};
+"""
+
+def create_program(blocks):
+    return "function() {{\n    int result = 0;\n{}\n    return result;\n}}\n".format(
+        "".join(BLOCK.format(index=index) for index in range(blocks))
+    )
+
+def measure(function, code):
+    # One parse first, so that the ANTLR DFA caches are warm
+    function(code)
+    start = time()
+    for _ in range(args.n):
+        function(code)
+    return (time() - start) / args.n
+
+def main():
+    print "{:<8} {:>8} {:<8} {:>14} {:>18}".format("blocks", "lines", "backend", "tree lines/s", "visited lines/s")
+    for blocks in args.sizes:
+        code = create_program(blocks)
+        lines = code.count("\n")
+        for backend in sorted(PARSE_BACKENDS.keys()):
+            # ANTLR's lookahead over the nested code blocks makes it superlinear in program length
+            if backend == "antlr" and blocks > args.antlr_limit:
+                print "{:<8} {:>8} {:<8} {:>14} {:>18}".format(blocks, lines, backend, "-", "-")
+                continue
+            tree_seconds = measure(PARSE_BACKENDS[backend], code)
+            visited_seconds = measure(lambda code: parse(code, use_cache=False, backend=backend), code)
+            print "{:<8} {:>8} {:<8} {:>14.0f} {:>18.0f}".format(
+                blocks, lines, backend, lines / tree_seconds, lines / visited_seconds
+            )
+
+if __name__ == "__main__":
+    main()
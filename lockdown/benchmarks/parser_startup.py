@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import time
+
+from lockdown.utils import set_debug, set_runtime_type_information
+
+
+parser = argparse.ArgumentParser(description="Measures parser start-up and throughput on the Euler sources")
+parser.add_argument('-n', type=int, default=5, help='rounds over the sources for the throughput measurements')
+args = parser.parse_args()
+
+set_debug(False)
+set_runtime_type_information(True)
+
+from lockdown.benchmarks.euler import EULER_SOURCES
+from lockdown.parser.parser import parse_json
+
+
+# Run in a fresh interpreter, so that nothing is imported or warmed up yet
+STARTUP_SCRIPT = """
+import json, sys
+from time import time
+from lockdown.utils import set_debug, set_runtime_type_information
+set_debug(False)
+set_runtime_type_information(True)
+start = time()
+from lockdown.parser.parser import parse
+imported = time()
+parse(sys.argv[1], use_cache=sys.argv[2] == "cached")
+parsed = time()
+print json.dumps([ (imported - start) * 1000, (parsed - imported) * 1000 ])
+"""
+
+def measure_startup(code, cache_directory, mode):
+    environment = dict(os.environ, LOCKDOWN_PARSE_CACHE=cache_directory)
+    output = subprocess.check_output([ sys.executable, "-c", STARTUP_SCRIPT, code, mode ], env=environment)
+    return json.loads(output.splitlines()[-1])
+
+def measure_throughput(try_sll):
+    sources = EULER_SOURCES.values()
+    # The first round fills the DFA caches that later parses share
+    for code in sources:
+        parse_json(code, try_sll=try_sll)
+
+    start = time()
+    for _ in range(args.n):
+        for code in sources:
+            parse_json(code, try_sll=try_sll)
+    return len(sources) * args.n / (time() - start)
+
+def main():
+    code = EULER_SOURCES["euler_1"]
+    cache_directory = tempfile.mkdtemp(prefix="lockdown-parse-cache-")
+    try:
+        print "start-up, in a new process (ms)"
+        import_ms, parse_ms = measure_startup(code, "", "uncached")
+        print "  {:<32} import {:>7.1f}  first parse {:>7.1f}".format("uncached", import_ms, parse_ms)
+        measure_startup(code, cache_directory, "cached")
+        import_ms, parse_ms = measure_startup(code, cache_directory, "cached")
+        print "  {:<32} import {:>7.1f}  first parse {:>7.1f}".format("warm parse cache, no ANTLR", import_ms, parse_ms)
+    finally:
+        shutil.rmtree(cache_directory)
+
+    print "throughput, ANTLR only (parses per second)"
+    print "  {:<32} {:>7.1f}".format("LL", measure_throughput(False))
+    print "  {:<32} {:>7.1f}".format("SLL, falling back to LL", measure_throughput(True))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import argparse
+from datetime import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+from time import time
+
+
+parser = argparse.ArgumentParser(description="Times the Euler and speed test programs in every execution mode, and compares the results of two runs")
+commands = parser.add_subparsers(dest="command")
+
+run_parser = commands.add_parser("run", help="time the programs and save the results as JSON")
+run_parser.add_argument("-o", "--output", help="the JSON file to write, stdout by default")
+run_parser.add_argument("-m", "--modes", nargs="+", help="the modes to run, all by default")
+run_parser.add_argument("-p", "--programs", nargs="+", help="the programs to run, all by default")
+run_parser.add_argument("-n", "--repeat", type=int, default=3, help="timed runs of each program")
+run_parser.add_argument("-w", "--warmup", type=int, default=1, help="untimed runs of each program first")
+
+compare_parser = commands.add_parser("compare", help="compare two saved runs, exiting with 1 if anything regressed")
+compare_parser.add_argument("base", help="the JSON of the earlier run")
+compare_parser.add_argument("new", help="the JSON of the later run")
+compare_parser.add_argument("-t", "--threshold", type=float, default=0.1, help="the fractional slow down that is a regression")
+
+# Runs in a fresh interpreter for each mode, as debug and RTTI are fixed once they are set
+worker_parser = commands.add_parser("worker")
+worker_parser.add_argument("mode")
+worker_parser.add_argument("programs", nargs="+")
+worker_parser.add_argument("-n", "--repeat", type=int, default=3)
+worker_parser.add_argument("-w", "--warmup", type=int, default=1)
+
+
+# debug, runtime type information, transpile
+MODES = {
+    "normal": (False, True, False),
+    "debug": (True, True, False),
+    "rtti-off": (False, False, False),
+    "transpiled": (False, True, True)
+}
+
+# The programs of TestSpeed
+SPEED_SOURCES = {
+    "speed_loops": """
+            function() {
+                int i = 0, j = 0;
+                while(i < 20) {
+                    j = 0;
+                    while(j < 20) {
+                        int foo = i * j;
+                        int bar = i * j;
+                        int baz = i * j;
+                        j = j + 1;
+                    };
+                    i = i + 1;
+                };
+                return i * j;
+            }
+        """,
+    "speed_loop_faster": """
+            function() {
+                int i = 0, j = 0;
+                while(i < 100) {
+                    j = 0;
+                    while(j < 100) {
+                        int foo = i * j;
+                        int bar = i * j;
+                        int baz = i * j;
+                        j = j + 1;
+                    };
+                    i = i + 1;
+                };
+                return i * j;
+            }
+        """
+}
+
+def get_sources():
+    from lockdown.benchmarks.euler import EULER_SOURCES
+    sources = dict(EULER_SOURCES)
+    sources.update(SPEED_SOURCES)
+    return sources
+
+def get_median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2.0
+
+
+def measure_program(code, transpile, repeat, warmup):
+    from lockdown.executor.bootstrap import get_default_global_context, \
+        prepare_function, invoke_function
+    from lockdown.parser.parser import parse
+
+    data = parse(code, use_cache=False)
+
+    prepare_seconds, execute_seconds = [], []
+    for index in range(warmup + repeat):
+        start = time()
+        context = get_default_global_context()
+        closed_function = prepare_function(data, context, check_safe_exit=True).close(context)
+        if transpile:
+            closed_function = closed_function.transpile()
+        prepared = time()
+        invoke_function(closed_function)
+        executed = time()
+
+        if index >= warmup:
+            prepare_seconds.append(prepared - start)
+            execute_seconds.append(executed - prepared)
+    return prepare_seconds, execute_seconds
+
+def worker(args):
+    from lockdown.utils import set_debug, set_runtime_type_information
+
+    debug, runtime_type_information, transpile = MODES[args.mode]
+    set_debug(debug)
+    set_runtime_type_information(runtime_type_information)
+
+    sources = get_sources()
+    results = []
+    for program in args.programs:
+        result = { "program": program, "mode": args.mode }
+        try:
+            prepare_seconds, execute_seconds = measure_program(sources[program], transpile, args.repeat, args.warmup)
+        except Exception as e:
+            result["error"] = "{}: {}".format(type(e).__name__, e)
+        else:
+            total_seconds = [ p + e for p, e in zip(prepare_seconds, execute_seconds) ]
+            result.update({
+                "prepare_seconds": prepare_seconds,
+                "execute_seconds": execute_seconds,
+                "median_seconds": get_median(total_seconds),
+                "min_seconds": min(total_seconds)
+            })
+        results.append(result)
+    print json.dumps(results)
+
+
+def get_commit():
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output([ "git", "rev-parse", "HEAD" ], cwd=directory, stderr=subprocess.STDOUT).strip()
+        dirty = subprocess.check_output([ "git", "status", "--porcelain", "--untracked-files=no" ], cwd=directory).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+def get_machine():
+    return {
+        "node": platform.node(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "python": "{} {}".format(platform.python_implementation(), platform.python_version())
+    }
+
+def run(args):
+    sources = get_sources()
+    modes = args.modes or sorted(MODES.keys())
+    programs = args.programs or sorted(sources.keys())
+    for name in modes:
+        if name not in MODES:
+            parser.error("unknown mode {}".format(name))
+    for name in programs:
+        if name not in sources:
+            parser.error("unknown program {}".format(name))
+
+    results = []
+    for mode in modes:
+        sys.stderr.write("{}...\n".format(mode))
+        output = subprocess.check_output([
+            sys.executable, "-m", "lockdown.benchmarks.suite", "worker", mode
+        ] + programs + [ "-n", str(args.repeat), "-w", str(args.warmup) ])
+        results.extend(json.loads(output.splitlines()[-1]))
+
+    report = json.dumps({
+        "commit": get_commit(),
+        "machine": get_machine(),
+        "date": datetime.utcnow().isoformat(),
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "results": results
+    }, indent=2, sort_keys=True)
+
+    if args.output:
+        with io.open(args.output, "w", encoding="utf-8") as output:
+            output.write(unicode(report))
+    else:
+        print report
+
+    for result in results:
+        sys.stderr.write("{:<20} {:<12} {}\n".format(
+            result["program"], result["mode"],
+            result["error"] if "error" in result else "{:.3f} s".format(result["median_seconds"])
+        ))
+
+
+def compare(args):
+    def load(path):
+        with io.open(path, encoding="utf-8") as results:
+            report = json.load(results)
+        return report, {
+            (result["program"], result["mode"]): result for result in report["results"]
+        }
+
+    base_report, base = load(args.base)
+    new_report, new = load(args.new)
+    if base_report["machine"] != new_report["machine"]:
+        print "warning: the runs were on different machines"
+
+    regressions = 0
+    print "{:<20} {:<12} {:>10} {:>10} {:>8}".format("program", "mode", "base s", "new s", "change")
+    for key in sorted(set(base.keys()) & set(new.keys())):
+        base_result, new_result = base[key], new[key]
+        if "error" in base_result or "error" in new_result:
+            status = "error" if "error" in new_result else "fixed"
+            regressions += 1 if status == "error" and "error" not in base_result else 0
+            print "{:<20} {:<12} {:>10} {:>10} {:>8}".format(key[0], key[1], "", "", status)
+            continue
+        change = new_result["median_seconds"] / base_result["median_seconds"] - 1
+        regressed = change > args.threshold
+        regressions += 1 if regressed else 0
+        print "{:<20} {:<12} {:>10.3f} {:>10.3f} {:>+7.1f}%{}".format(
+            key[0], key[1], base_result["median_seconds"], new_result["median_seconds"], change * 100,
+            "  REGRESSION" if regressed else ""
+        )
+
+    print "{} regressions beyond {:.0f}% ({} -> {})".format(
+        regressions, args.threshold * 100, base_report["commit"], new_report["commit"]
+    )
+    return 1 if regressions else 0
+
+
+def main():
+    args = parser.parse_args()
+    if args.command == "worker":
+        worker(args)
+    elif args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+if __name__ == "__main__":
+    main()
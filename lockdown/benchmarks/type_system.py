@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import argparse
+from datetime import datetime
+import io
+import json
+from math import log
+from timeit import default_timer
+
+from lockdown.utils import set_debug, set_runtime_type_information
+
+
+parser = argparse.ArgumentParser(description="Times the hot operations of the type system at several sizes, and fits how their cost grows with the size")
+parser.add_argument('-s', '--sizes', type=int, nargs="+", default=[ 1, 4, 16, 64 ], help='the sizes to time each operation at')
+parser.add_argument('-n', '--number', type=int, default=20, help='operations per timing')
+parser.add_argument('-r', '--repeat', type=int, default=5, help='timings of each operation and size, of which the fastest is kept')
+parser.add_argument('-b', '--benchmarks', nargs="+", help='the operations to time, all by default')
+parser.add_argument('-o', '--output', help='also write the results to this JSON file')
+args = parser.parse_args()
+
+set_debug(False)
+set_runtime_type_information(True)
+
+from lockdown.benchmarks.suite import get_commit, get_machine
+from lockdown.type_system.core_types import IntegerType, UnitType, merge_types
+from lockdown.type_system.list_types import RDHList, RDHListType
+from lockdown.type_system.managers import get_manager, get_type_of_value
+from lockdown.type_system.object_types import RDHObject, RDHObjectType
+
+
+# Each benchmark takes the size and the number of operations to time, builds what they need, and
+# returns the operation, which is called with the index of each. Operations that change the size,
+# like append, move it by the number of operations during a timing.
+
+def create_attached_object(size):
+    # An object with size distinct types attached, which all share foo
+    obj = RDHObject({ "foo": 1 })
+    for index in range(size):
+        obj.__dict__["bar{}".format(index)] = index
+        get_manager(obj).add_composite_type(RDHObjectType({
+            "foo": IntegerType(),
+            "bar{}".format(index): IntegerType()
+        }))
+    return obj
+
+def object_get(size, number):
+    obj = create_attached_object(size)
+    def operation(index):
+        obj.foo
+    return operation
+
+def object_set(size, number):
+    obj = create_attached_object(size)
+    def operation(index):
+        obj.foo = index
+    return operation
+
+def create_typed_list(size):
+    return RDHList(range(size), bind=RDHListType([], IntegerType()))
+
+def list_append(size, number):
+    values = create_typed_list(size)
+    def operation(index):
+        values.append(index)
+    return operation
+
+def list_insert(size, number):
+    values = create_typed_list(size)
+    def operation(index):
+        values.insert(0, index)
+    return operation
+
+def list_delete(size, number):
+    values = create_typed_list(size + number)
+    def operation(index):
+        del values[0]
+    return operation
+
+def create_nested_object(depth):
+    obj = RDHObject({ "value": 1 })
+    for _ in range(depth):
+        obj = RDHObject({ "child": obj })
+    return obj
+
+def create_nested_type(depth):
+    type = RDHObjectType({ "value": IntegerType() })
+    for _ in range(depth):
+        type = RDHObjectType({ "child": type })
+    return type
+
+def add_composite_type(size, number):
+    type = create_nested_type(size)
+    objs = [ create_nested_object(size) for _ in range(number) ]
+    def operation(index):
+        get_manager(objs[index]).add_composite_type(type)
+    return operation
+
+def remove_composite_type(size, number):
+    type = create_nested_type(size)
+    objs = [ create_nested_object(size) for _ in range(number) ]
+    for obj in objs:
+        get_manager(obj).add_composite_type(type)
+    def operation(index):
+        get_manager(objs[index]).remove_composite_type(type)
+    return operation
+
+def create_wide_type(width):
+    return RDHObjectType({
+        "p{}".format(index): IntegerType() for index in range(width)
+    })
+
+def is_copyable_from_wide(size, number):
+    first, second = create_wide_type(size), create_wide_type(size)
+    def operation(index):
+        first.is_copyable_from(second)
+    return operation
+
+def create_recursive_type(length):
+    # A ring of length types, each with a next property of the following one
+    types = [ RDHObjectType() for _ in range(length) ]
+    for index, type in enumerate(types):
+        type.micro_op_types.update(RDHObjectType({
+            "value": IntegerType(),
+            "next": types[(index + 1) % length]
+        }).micro_op_types)
+    return types[0]
+
+def is_copyable_from_recursive(size, number):
+    first, second = create_recursive_type(size), create_recursive_type(size)
+    def operation(index):
+        first.is_copyable_from(second)
+    return operation
+
+def merge_unit_types(size, number):
+    types = [ UnitType(index) for index in range(size) ]
+    def operation(index):
+        merge_types(types, "super")
+    return operation
+
+def get_type_of_object(size, number):
+    obj = create_attached_object(size)
+    def operation(index):
+        get_type_of_value(obj)
+    return operation
+
+def get_type_of_object_rebuilt(size, number):
+    obj = create_attached_object(size)
+    manager = get_manager(obj)
+    def operation(index):
+        # As attaching or detaching a type does
+        manager.cached_effective_composite_type = None
+        get_type_of_value(obj)
+    return operation
+
+BENCHMARKS = [
+    ("object_get", "attached types", object_get),
+    ("object_set", "attached types", object_set),
+    ("list_append", "length", list_append),
+    ("list_insert", "length", list_insert),
+    ("list_delete", "length", list_delete),
+    ("add_composite_type", "depth", add_composite_type),
+    ("remove_composite_type", "depth", remove_composite_type),
+    ("is_copyable_from_wide", "properties", is_copyable_from_wide),
+    ("is_copyable_from_recursive", "types in cycle", is_copyable_from_recursive),
+    ("merge_types", "types", merge_unit_types),
+    ("get_type_of_value", "attached types", get_type_of_object),
+    ("get_type_of_value_rebuilt", "attached types", get_type_of_object_rebuilt)
+]
+
+
+def measure(benchmark, size):
+    """
+    Returns the nanoseconds per operation of the fastest timing
+    """
+    best = None
+    for _ in range(args.repeat):
+        operation = benchmark(size, args.number)
+        start = default_timer()
+        for index in range(args.number):
+            operation(index)
+        seconds = default_timer() - start
+        best = seconds if best is None else min(best, seconds)
+    return best / args.number * 1e9
+
+def fit_exponent(sizes, nanoseconds):
+    """
+    The least squares slope of log(nanoseconds) against log(size): about 0 for constant operations,
+    1 for linear ones and 2 for quadratic ones
+    """
+    points = [ (log(size), log(ns)) for size, ns in zip(sizes, nanoseconds) if size > 0 and ns > 0 ]
+    if len(set(x for x, _ in points)) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / sum((x - mean_x) ** 2 for x, _ in points)
+
+
+def main():
+    names = [ name for name, _, _ in BENCHMARKS ]
+    for name in args.benchmarks or []:
+        if name not in names:
+            parser.error("unknown benchmark {}".format(name))
+
+    print "{:<28} {:<16} {}  exponent".format("operation", "size", " ".join("{:>11}".format(size) for size in args.sizes))
+
+    results = []
+    for name, size_name, benchmark in BENCHMARKS:
+        if args.benchmarks and name not in args.benchmarks:
+            continue
+        nanoseconds = [ measure(benchmark, size) for size in args.sizes ]
+        exponent = fit_exponent(args.sizes, nanoseconds)
+        results.append({
+            "operation": name,
+            "size": size_name,
+            "sizes": args.sizes,
+            "nanoseconds": nanoseconds,
+            "exponent": exponent
+        })
+        print "{:<28} {:<16} {}  {}".format(
+            name, size_name, " ".join("{:>11.0f}".format(ns) for ns in nanoseconds),
+            "-" if exponent is None else "{:.2f}".format(exponent)
+        )
+
+    if args.output:
+        with io.open(args.output, "w", encoding="utf-8") as output:
+            output.write(unicode(json.dumps({
+                "commit": get_commit(),
+                "machine": get_machine(),
+                "date": datetime.utcnow().isoformat(),
+                "number": args.number,
+                "repeat": args.repeat,
+                "results": results
+            }, indent=2, sort_keys=True)))
+
+if __name__ == "__main__":
+    main()
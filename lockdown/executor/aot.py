@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import cPickle
+from cStringIO import StringIO
+import pickle
+import sys
+from types import MethodType, ModuleType, FunctionType, BuiltinFunctionType, \
+    ClassType
+
+from lockdown.executor.ast_utils import default_globals
+from lockdown.executor.bootstrap import get_default_global_context, \
+    prepare_function, invoke_function, print_result
+from lockdown.executor.opcodes import OPCODES
+from lockdown.executor.raw_code import RawCode
+from lockdown.type_system.composites import Composite, objects_with_deferred_types
+from lockdown.type_system.exceptions import FatalError
+from lockdown.type_system.managers import get_manager
+from lockdown.utils import is_debug, runtime_type_information, spread_dict
+
+
+MODULE_TEMPLATE = """# -*- coding: utf-8 -*-
+\"\"\"
+Compiled by lockdown from {source_name}. Import it and call run(), or run it with python.
+\"\"\"
+from __future__ import unicode_literals
+
+from lockdown import utils
+
+# The modes that the program was verified in, unless the importer has already chosen
+if utils.DEBUG_MODE is None:
+    utils.set_debug({debug!r})
+if utils.runtime_type_information_active is None:
+    utils.set_runtime_type_information({runtime_type_information!r})
+
+from lockdown.executor.aot import CompiledProgram, load_dependencies
+
+
+# The prepared types and values that the code below refers to by name
+globals().update(load_dependencies(
+    {dependencies}
+))
+
+{code}
+
+PROGRAM = CompiledProgram({open_function}, source_name={source_name!r})
+
+def run(argument=None):
+    return PROGRAM.run(argument)
+
+if __name__ == "__main__":
+    PROGRAM.main()
+"""
+
+# The name that the prepared OpenFunction of a program that is not transpiled is loaded as
+OPEN_FUNCTION_NAME = "open_function"
+
+
+def compile_program(code, source_name, transpile=True):
+    """
+    Verifies code, the parsed function literal of a program, and returns the source of a python
+    module that runs it.
+
+    If transpile, the module holds the python that OpenFunction.transpile builds, otherwise the
+    prepared OpenFunction, which is interpreted. Either way, the prepared types and values that
+    are needed are pickled into the module, so importing it neither parses nor verifies anything.
+    """
+    context = get_default_global_context()
+    open_function = prepare_function(code, context, check_safe_exit=True)
+
+    if transpile:
+        import astor
+        module_ast, open_function_name, dependencies, _ = open_function.to_module_ast()
+        module_code = astor.to_source(module_ast)
+    else:
+        open_function_name = OPEN_FUNCTION_NAME
+        dependencies = { OPEN_FUNCTION_NAME: open_function }
+        module_code = ""
+
+    return MODULE_TEMPLATE.format(
+        source_name=source_name,
+        debug=is_debug(),
+        runtime_type_information=runtime_type_information(),
+        dependencies=format_bytes(dump_dependencies(dependencies)),
+        code=module_code,
+        open_function=open_function_name
+    )
+
+
+# The modules that running a compiled program imports anyway, so that the objects they hold can be
+# shared with it without importing the parser
+RUNTIME_MODULES = ( "lockdown.utils", "lockdown.type_system.", "lockdown.executor." )
+
+def format_bytes(data, width=64):
+    # As a literal of one line per width bytes
+    return "\n    ".join("b" + repr(data[start:start + width]) for start in range(0, len(data), width)) or "b''"
+
+
+# Values that pickle already refers to by name, or copies by value
+SHARED_BY_REFERENCE = (
+    type, ClassType, ModuleType, FunctionType, BuiltinFunctionType, basestring, int, long, float, bool, tuple
+)
+
+def get_shared_paths():
+    """
+    The objects that a loaded module must share with the process that loads it, rather than have
+    copies of, by id: the instances that lockdown modules hold, such as the default types and
+    NO_VALUE, the opcode classes that BinaryOp builds, and everything in the default global
+    context. Each is given as the path to it.
+    """
+    paths = {}
+
+    for name, opcode_class in OPCODES.items():
+        paths[id(opcode_class)] = ("opcode", name)
+
+    for module_name, module in sys.modules.items():
+        if not module_name.startswith(RUNTIME_MODULES) or module_name.endswith(".test") or not isinstance(module, ModuleType):
+            continue
+        for name, value in vars(module).items():
+            if value is None or isinstance(value, SHARED_BY_REFERENCE):
+                continue
+            paths.setdefault(id(value), ("module", module_name, name))
+
+    def add_global_paths(value, path):
+        if id(value) in paths and paths[id(value)][0] == "global":
+            return
+        paths[id(value)] = path
+        if isinstance(value, Composite):
+            for key in value._keys():
+                add_global_paths(value._get(key), path + (key,))
+        elif hasattr(value, "open_function"):
+            add_global_paths(value.open_function, path + ("open_function",))
+
+    add_global_paths(get_default_global_context(), ("global",))
+    return paths
+
+def get_shared_object(path):
+    if path[0] == "opcode":
+        return OPCODES[path[1]]
+    if path[0] == "module":
+        __import__(path[1])
+        return getattr(sys.modules[path[1]], path[2])
+
+    value = get_default_global_context()
+    for key in path[1:]:
+        value = value._get(key) if isinstance(value, Composite) else getattr(value, key)
+    return value
+
+
+def new_composite(composite_class):
+    return composite_class.__new__(composite_class)
+
+class DependencyPickler(pickle.Pickler):
+    """
+    Pickles the dependencies of a compiled program.
+
+    Composites are pickled without their managers, which are keyed by the ids of the process, and
+    whose states are pickled once the dependencies have been. RawCode is pickled by its fields,
+    and bound methods by their name on the object they are bound to.
+    """
+    def __init__(self, output):
+        pickle.Pickler.__init__(self, output, pickle.HIGHEST_PROTOCOL)
+        self.shared_paths = get_shared_paths()
+        self.composites = []
+
+    def persistent_id(self, obj):
+        return self.shared_paths.get(id(obj), None)
+
+    def save(self, obj):
+        if id(obj) not in self.memo and id(obj) not in self.shared_paths:
+            if isinstance(obj, RawCode):
+                return self.save_reduce(RawCode, (obj._to_dict(),), obj=obj)
+            if isinstance(obj, MethodType):
+                return self.save_reduce(getattr, (obj.im_self, obj.__name__), obj=obj)
+            if isinstance(obj, Composite):
+                self.composites.append(obj)
+                return self.save_reduce(new_composite, (type(obj),), state=dict(obj.__dict__), obj=obj)
+        pickle.Pickler.save(self, obj)
+
+def get_manager_state(obj):
+    manager = get_manager(obj)
+    return (
+        obj,
+        [ (type, manager.attached_type_counts[type_id]) for type_id, type in manager.attached_types.items() ],
+        manager.deferred_element_types.values(),
+        manager.default_factory,
+        manager.debug_reason,
+        manager.frozen
+    )
+
+def dump_dependencies(dependencies):
+    """
+    Pickles dependencies, a dict of the objects that transpiled code refers to by name.
+    """
+    output = StringIO()
+    pickler = DependencyPickler(output)
+    try:
+        pickler.dump(dependencies)
+
+        # Pickling the states of managers can reach more composites, whose states follow
+        dumped = 0
+        while dumped < len(pickler.composites):
+            composites = pickler.composites[dumped:]
+            dumped = len(pickler.composites)
+            pickler.dump([ get_manager_state(obj) for obj in composites ])
+        pickler.dump(None)
+    except pickle.PicklingError as e:
+        raise FatalError("Can not compile a program that depends on {}".format(e))
+    return output.getvalue()
+
+def load_dependencies(data):
+    """
+    Unpickles what dump_dependencies pickled, restoring the types bound to each composite as they
+    were when it was pickled, rather than binding them again.
+    """
+    unpickler = cPickle.Unpickler(StringIO(data))
+    unpickler.persistent_load = get_shared_object
+
+    dependencies = unpickler.load()
+    while True:
+        manager_states = unpickler.load()
+        if manager_states is None:
+            break
+        for obj, attached_types, deferred_element_types, default_factory, debug_reason, frozen in manager_states:
+            manager = get_manager(obj)
+            for type, count in attached_types:
+                manager.attach_type(type, multiplier=count)
+            for deferred_element_type in deferred_element_types:
+                manager.deferred_element_types[id(deferred_element_type.type)] = deferred_element_type
+                if deferred_element_type.strict:
+                    objects_with_deferred_types.add(manager.obj_id)
+            manager.default_factory = default_factory
+            manager.debug_reason = debug_reason
+            manager.frozen = frozen
+            obj._types_attached(manager)
+
+    return spread_dict(dependencies, default_globals())
+
+
+class CompiledProgram(object):
+    """
+    A program in a module that compile_program built, given by the transpiled class of its
+    function, or the prepared OpenFunction.
+    """
+    def __init__(self, open_function, source_name=None):
+        self.open_function = open_function
+        self.source_name = source_name
+        self.closed_function = None
+
+    def get_closed_function(self):
+        if self.closed_function is None:
+            self.closed_function = self.open_function.close(get_default_global_context())
+        return self.closed_function
+
+    def run(self, argument=None):
+        return invoke_function(self.get_closed_function(), argument)
+
+    def main(self):
+        print_result(self.run())
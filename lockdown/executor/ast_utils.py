@@ -54,6 +54,9 @@ def compile_module(code, context_name, dependency_builder, **subs):
     except KeyError:
         raise
     code = ast.parse(code)
+    # The lines of the template mean nothing, so its nodes take the Lockdown line of the code
+    # around them when they are compiled
+    remove_locations(code)
 
     for key, sub_ast in ast_subs.items():
         code = ASTInliner(key, sub_ast, context_name, dependency_builder).visit(code)
@@ -97,14 +100,15 @@ def build_and_compile_ast_function(name, arguments, body, dependencies):
         dependencies
     )
 
-def compile_ast_function_def(function_creator_ast, open_function_id, dependencies):
+def compile_ast_function_def(function_creator_ast, open_function_id, dependencies, filename="<string>"):
 #    print ast.dump(function_creator_ast)
     ast.fix_missing_locations(function_creator_ast)
+    make_lines_monotonic(function_creator_ast)
 
 #    print "--- {} ---".format(open_function_id)
 #    print to_source(function_creator_ast)
 
-    function_creator = compile(function_creator_ast, "<string>", "exec")
+    function_creator = compile(function_creator_ast, filename, "exec")
 
     function_creation_context = spread_dict(
         dependencies, default_globals()
@@ -114,6 +118,63 @@ def compile_ast_function_def(function_creator_ast, open_function_id, dependencie
 
     return function_creation_context[open_function_id]
 
+def remove_locations(node):
+    for child in ast.walk(node):
+        for attribute in ("lineno", "col_offset"):
+            if hasattr(child, attribute):
+                delattr(child, attribute)
+
+def set_location(node, line, column):
+    """
+    Gives node, or the statements of a Module, the Lockdown line and column that it was built
+    from, unless it has a location already. Nodes below it without a location inherit it when
+    fix_missing_locations runs.
+    """
+    for child in (node.body if isinstance(node, ast.Module) else [ node ]):
+        if "lineno" in child._attributes and not hasattr(child, "lineno"):
+            child.lineno = line
+            child.col_offset = column or 0
+
+def make_lines_monotonic(node, minimum=1):
+    """
+    Python 2 stores the line of each instruction as an unsigned delta from the last one, so a
+    statement that is compiled after a later line would get a garbage line. Moves such statements
+    down to the latest line compiled before them. Expressions never move the line backwards, so
+    they are left alone. The bodies of functions, classes and lambdas are compiled into code
+    objects of their own, which start again from the line of their definition.
+
+    Returns the latest line compiled after node.
+    """
+    if isinstance(node, (ast.stmt, ast.excepthandler)):
+        node.lineno = max(node.lineno, minimum)
+        minimum = node.lineno
+    elif isinstance(node, ast.expr):
+        minimum = max(node.lineno, minimum)
+
+    if isinstance(node, (ast.FunctionDef, ast.Lambda)):
+        for child in node.args.defaults + getattr(node, "decorator_list", []):
+            minimum = make_lines_monotonic(child, minimum)
+        body_minimum = node.lineno
+        for child in (node.body if isinstance(node.body, list) else [ node.body ]):
+            body_minimum = make_lines_monotonic(child, body_minimum)
+    elif isinstance(node, ast.ClassDef):
+        for child in node.bases + node.decorator_list:
+            minimum = make_lines_monotonic(child, minimum)
+        body_minimum = node.lineno
+        for child in node.body:
+            body_minimum = make_lines_monotonic(child, body_minimum)
+    else:
+        for child in ast.iter_child_nodes(node):
+            minimum = make_lines_monotonic(child, minimum)
+    return minimum
+
+def get_transpiled_filename(source_name=None):
+    # A name that can not be a real file, so that linecache only finds the source registered under it
+    return "<lockdown:{}>".format(source_name) if source_name else "<lockdown>"
+
+def is_transpiled_filename(filename):
+    return filename.startswith("<lockdown")
+
 def default_globals():
     from lockdown.executor.flow_control import BreakException
     from lockdown.type_system.managers import get_manager
@@ -201,6 +262,12 @@ class ASTInliner(ast.NodeTransformer):
             return ast.If(test=node.test, body=new_body or node.body, orelse=new_orelse or node.orelse)
         return self.generic_visit(node)
 
+    def visit_TryExcept(self, node):
+        new_body = self.create_new_statements(node.body)
+        if new_body:
+            return ast.TryExcept(body=new_body, handlers=node.handlers, orelse=node.orelse)
+        return self.generic_visit(node)
+
     def visit_FunctionDef(self, node):
         new_body = self.create_new_statements(node.body)
         if new_body:
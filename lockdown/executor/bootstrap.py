@@ -1,23 +1,25 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
+
+import atexit
 from time import time
 
+from lockdown.executor.builtins import get_builtins
 from lockdown.executor.flow_control import FrameManager, \
     break_exception_to_string
 from lockdown.executor.function import prepare
 from lockdown.executor.opcodes import get_context_type
-from lockdown.executor.raw_code_factories import inferred_type, function_lit, \
+from lockdown.executor.raw_code_factories import function_lit, \
     int_type, infer_all, dereference, loop_op, comma_op, condition_op, \
-    binary_integer_op, nop, list_type, \
-    function_type, list_template_op, insert_op, transform_op, literal_op, \
+    binary_integer_op, list_type, insert_op, transform_op, literal_op, \
     invoke_op, object_template_op, prepared_function, no_value_type, \
-    assignment_op, dict_template_op, addition_op, reset_op, shift_op, \
-    transform, local_function, map_op
+    assignment_op, addition_op, shift_op
+from lockdown.type_system.composites import freeze
 from lockdown.type_system.default_composite_types import DEFAULT_OBJECT_TYPE, \
     READONLY_DEFAULT_OBJECT_TYPE
 from lockdown.type_system.managers import get_manager
 from lockdown.type_system.object_types import RDHObject
-from lockdown.utils import NO_VALUE, print_code, MISSING
+from lockdown.utils import NO_VALUE, print_code, MISSING, spread_dict
 
 
 class ObjectDictWrapper(object):
@@ -28,9 +30,54 @@ class ObjectDictWrapper(object):
 class BootstrapException(Exception):
     pass
 
+DEFAULT_GLOBAL_CONTEXT = None
+
 def get_default_global_context():
+    """
+    Returns the global context that programs are bootstrapped in when no context is given.
+
+    It is built on first use and shared by every bootstrap_function call in the process. It is
+    bound to READONLY_DEFAULT_OBJECT_TYPE and frozen when built, so neither programs nor Python
+    callers can modify it.
+    """
+    global DEFAULT_GLOBAL_CONTEXT
+    if DEFAULT_GLOBAL_CONTEXT is None:
+        DEFAULT_GLOBAL_CONTEXT = build_default_global_context()
+        freeze(DEFAULT_GLOBAL_CONTEXT)
+    return DEFAULT_GLOBAL_CONTEXT
+
+@atexit.register
+def drop_default_global_context():
+    # Managers clean up after their objects when they are collected, which needs the modules
+    # that are torn down at exit
+    global DEFAULT_GLOBAL_CONTEXT
+    DEFAULT_GLOBAL_CONTEXT = None
+
+def build_default_global_context():
+    range_function = prepare(
+        function_lit(
+            list_type([ int_type(), int_type() ], None),
+            infer_all(), int_type(), dereference("argument.0"),
+            prepared_function(
+                loop_op(
+                    condition_op(
+                        binary_integer_op("lt", dereference("outer.local"), dereference("outer.argument.1")),
+                        comma_op(
+                            shift_op(dereference("outer.local"), no_value_type()),
+                            assignment_op(dereference("outer"), literal_op("local"), addition_op(dereference("outer.local"), literal_op(1)))
+                        ),
+                        transform_op("break")
+                    )
+                )
+            )
+        ),
+        None, FrameManager()
+    ).close(None)
+    # Loops over this function are run natively by RangeLoopOp
+    range_function.is_builtin_range = True
+
     return RDHObject({
-        "static": RDHObject({
+        "static": RDHObject(spread_dict({
             "any": RDHObject({
                 "type": "Any"
             }, debug_reason="default-global-context"),
@@ -43,96 +90,8 @@ def get_default_global_context():
             "var": RDHObject({
                 "type": "Inferred"
             }, debug_reason="default-global-context"),
-            "range": prepare(
-                function_lit(
-                    list_type([ int_type(), int_type() ], None),
-                    infer_all(), int_type(), dereference("argument.0"),
-                    prepared_function(
-                        loop_op(
-                            condition_op(
-                                binary_integer_op("lt", dereference("outer.local"), dereference("outer.argument.1")),
-                                comma_op(
-                                    shift_op(dereference("outer.local"), no_value_type()),
-                                    assignment_op(dereference("outer"), literal_op("local"), addition_op(dereference("outer.local"), literal_op(1)))
-                                ),
-                                transform_op("break")
-                            )
-                        )
-                    )
-                ),
-                None, FrameManager()
-            ).close(None),
-            "list": prepare(
-                function_lit(
-                    list_type([
-                        function_type(no_value_type(), {
-                            "yield": list_template_op([ dict_template_op({
-                                "in": no_value_type(),
-                                "out": int_type()
-                            })]),
-                            "value": list_template_op([ dict_template_op({
-                                "out": no_value_type()
-                            })]),
-                        }),
-                    ], None),
-                    infer_all(),
-                    inferred_type(),
-                    dereference("argument.0"),
-                    loop_op(
-                        invoke_op(
-                            local_function(
-                                transform(
-                                    ("yield", "value"),
-                                    ("value", "end"),
-                                    reset_op(dereference("outer.local"), nop())
-                                ),
-                                comma_op(
-                                    assignment_op(
-                                        dereference("outer"),
-                                        literal_op("local"),
-                                        dereference("local.continuation")
-                                    ),
-                                    transform_op(
-                                        "value",
-                                        "continue",
-                                        dereference("local.value")
-                                    )
-                                )
-                            )
-                        )
-                    )
-                ),
-                None, FrameManager()
-            ).close(None),
-            "max": prepare(
-                function_lit(
-                    list_type([ int_type() ], int_type()),
-                    infer_all(),
-                    inferred_type(),
-                    dereference("argument.0"),
-                    map_op(
-                        dereference("argument"),
-                        prepared_function(
-                            int_type(),
-                            condition_op(
-                                binary_integer_op(
-                                    "gt",
-                                    dereference("argument"),
-                                    dereference("outer.local")
-                                ),
-                                assignment_op(
-                                    dereference("outer"),
-                                    literal_op("local"),
-                                    dereference("argument")
-                                ),
-                                nop()
-                            )
-                        )
-                    )
-                ),
-                None, FrameManager()
-            ).close(None),
-        }, debug_reason="default-global-context")
+            "range": range_function
+        }, get_builtins()), debug_reason="default-global-context")
     }, bind=READONLY_DEFAULT_OBJECT_TYPE, debug_reason="default-global-context")
 
 def format_unhandled_break_type(break_type, raw_code):
@@ -204,14 +163,10 @@ def format_unhandled_break(mode, value, caused_by, opcode, data):
 def raise_unhandled_break(mode, value, caused_by, opcode, data):
     raise BootstrapException(format_unhandled_break(mode, value, caused_by, opcode, data))
 
-def bootstrap_function(data, argument=None, context=None, check_safe_exit=False, transpile=False, measure=False, print_ast=False):
-    if argument is None:
-        argument = NO_VALUE
-    if context is None:
-        context = get_default_global_context()
-
-    get_manager(context).add_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
-
+def prepare_function(data, context, check_safe_exit=False, print_ast=False):
+    """
+    Verifies the function literal data against context, and returns its OpenFunction.
+    """
     frame_manager = FrameManager()
 
     with frame_manager.capture() as capture_preparation:
@@ -229,15 +184,21 @@ def bootstrap_function(data, argument=None, context=None, check_safe_exit=False,
         if check_safe_exit:
             raise_unhandled_break_types(open_function, data)
 
-        closed_function = open_function.close(context)
-
     if capture_preparation.caught_break_mode is not MISSING:
         raise_unhandled_break(capture_preparation.caught_break_mode, capture_preparation.value, None, capture_preparation.opcode, data)
 
-    with frame_manager.capture() as capture_result:
-        if transpile:
-            closed_function = closed_function.transpile()
+    return open_function
+
+def invoke_function(closed_function, argument=None, measure=False):
+    """
+    Invokes closed_function, and returns the capture of how it exited.
+    """
+    if argument is None:
+        argument = NO_VALUE
 
+    frame_manager = FrameManager()
+
+    with frame_manager.capture() as capture_result:
         if measure:
             start = time()
 
@@ -248,3 +209,25 @@ def bootstrap_function(data, argument=None, context=None, check_safe_exit=False,
             print end - start
 
     return capture_result
+
+def print_result(result, data=None):
+    """
+    Prints the value that a program returned, or raises BootstrapException if it exited any other way.
+    """
+    if result.caught_break_mode != "value":
+        raise_unhandled_break(result.caught_break_mode, result.value, None, result.opcode, data)
+    if result.value is not NO_VALUE:
+        print result.value
+
+def bootstrap_function(data, argument=None, context=None, check_safe_exit=False, transpile=False, measure=False, print_ast=False):
+    if context is None:
+        context = get_default_global_context()
+    else:
+        get_manager(context).add_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
+
+    closed_function = prepare_function(data, context, check_safe_exit, print_ast).close(context)
+
+    if transpile:
+        closed_function = closed_function.transpile()
+
+    return invoke_function(closed_function, argument, measure)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from lockdown.executor.function import WrappedFunction
+from lockdown.executor.function_type import ClosedFunctionType
+from lockdown.type_system.composites import prepare_lhs_type, get_bound_value, \
+    get_bound_values
+from lockdown.type_system.core_types import IntegerType, NoValueType, \
+    StringType, OneOfType, Const
+from lockdown.type_system.default_composite_types import \
+    READONLY_DEFAULT_LIST_TYPE
+from lockdown.type_system.list_types import RDHList, RDHListType
+from lockdown.utils import NO_VALUE
+
+
+class BuiltinFunction(WrappedFunction):
+    """
+    A builtin implemented in Python, with a declared ClosedFunctionType so that the verifier checks
+    invocations of it like any other function.
+
+    wrapped is called with the argument and the frame manager, and returns the value of the
+    function. Builtins only ever break with that value, and are never restartable.
+    """
+    def __init__(self, name, wrapped, argument_type, value_type):
+        super(BuiltinFunction, self).__init__(wrapped)
+        self.name = name
+        self.argument_type = prepare_lhs_type(argument_type, None)
+        self.break_types = {
+            "value": [ { "out": value_type } ]
+        }
+
+    def get_type(self):
+        return ClosedFunctionType(self.argument_type, self.break_types)
+
+    def invoke(self, argument, frame_manager):
+        # Builtins never restart, so they need no frame
+        return ("value", self.wrapped(argument, frame_manager), None, None)
+
+    def __repr__(self):
+        return "BuiltinFunction<{}>".format(self.name)
+
+
+def builtin_list(argument, frame_manager):
+    """
+    Collects the values yielded by a generator function, restarting it after each one.
+    """
+    generator = get_bound_value(argument, 0)
+    results = []
+
+    def enter_generator():
+        return generator.invoke(NO_VALUE, frame_manager)
+
+    restart = enter_generator
+    while True:
+        with frame_manager.capture() as capture_result:
+            capture_result.attempt_capture_or_raise(*restart())
+
+        if capture_result.caught_break_mode != "yield":
+            break
+
+        results.append(capture_result.value)
+        continuation = capture_result.create_continuation(enter_generator, generator.break_types)
+        restart = lambda: continuation.invoke(NO_VALUE, frame_manager)
+
+    return RDHList(results)
+
+def builtin_sum(argument, frame_manager):
+    return sum(get_bound_values(argument))
+
+def builtin_min(argument, frame_manager):
+    return min(get_bound_values(argument))
+
+def builtin_max(argument, frame_manager):
+    return max(get_bound_values(argument))
+
+def builtin_len(argument, frame_manager):
+    return len(get_bound_value(argument, 0))
+
+def builtin_sorted(argument, frame_manager):
+    return RDHList(sorted(get_bound_values(get_bound_value(argument, 0))))
+
+def builtin_reversed(argument, frame_manager):
+    return RDHList(list(reversed(get_bound_values(get_bound_value(argument, 0)))))
+
+def builtin_str(argument, frame_manager):
+    return unicode(get_bound_value(argument, 0))
+
+def builtin_join(argument, frame_manager):
+    return get_bound_value(argument, 1).join(get_bound_values(get_bound_value(argument, 0)))
+
+
+INTEGER_GENERATOR_TYPE = ClosedFunctionType(NoValueType(), {
+    "yield": [ { "in": NoValueType(), "out": IntegerType() } ],
+    "value": [ { "out": NoValueType() } ]
+})
+
+def integer_list_type():
+    return RDHListType([], IntegerType())
+
+def get_builtins():
+    """
+    The Python implemented functions of the default global context, by name.
+    """
+    return {
+        "list": BuiltinFunction(
+            "list", builtin_list, RDHListType([ Const(INTEGER_GENERATOR_TYPE) ], None), integer_list_type()
+        ),
+        "sum": BuiltinFunction(
+            "sum", builtin_sum, RDHListType([], IntegerType()), IntegerType()
+        ),
+        "min": BuiltinFunction(
+            "min", builtin_min, RDHListType([ IntegerType() ], IntegerType()), IntegerType()
+        ),
+        "max": BuiltinFunction(
+            "max", builtin_max, RDHListType([ IntegerType() ], IntegerType()), IntegerType()
+        ),
+        "len": BuiltinFunction(
+            "len", builtin_len, RDHListType([ Const(OneOfType([ StringType(), READONLY_DEFAULT_LIST_TYPE ])) ], None), IntegerType()
+        ),
+        "sorted": BuiltinFunction(
+            "sorted", builtin_sorted, RDHListType([ Const(RDHListType([], Const(IntegerType()))) ], None), integer_list_type()
+        ),
+        "reversed": BuiltinFunction(
+            "reversed", builtin_reversed, RDHListType([ Const(RDHListType([], Const(IntegerType()))) ], None), integer_list_type()
+        ),
+        "str": BuiltinFunction(
+            "str", builtin_str, RDHListType([ IntegerType() ], None), StringType()
+        ),
+        "join": BuiltinFunction(
+            "join", builtin_join, RDHListType([ Const(RDHListType([], Const(StringType()))), StringType() ], None), StringType()
+        )
+    }
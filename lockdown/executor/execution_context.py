@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import re
+from weakref import WeakKeyDictionary
+
+from lockdown.type_system.composites import CompositeType, \
+    does_value_fit_through_type, is_type_bindable_to_value
+from lockdown.type_system.core_types import unwrap_types
+from lockdown.type_system.list_types import RDHList
+from lockdown.type_system.managers import get_manager
+from lockdown.type_system.object_types import RDHObject
+from lockdown.utils import MISSING, runtime_type_information
+
+
+CONTEXT_SLOTS = frozenset([ "prepare", "outer", "argument", "static", "local", "types" ])
+
+# The slots whose types are bound to their values while a function runs
+TYPED_CONTEXT_SLOTS = ( "outer", "argument", "local" )
+
+
+class ExecutionContext(object):
+    """
+    The context a ClosedFunction runs its local initializer and code in.
+
+    Unlike an RDHObject context, it has no manager and no types bound to it. The verifier has
+    already proven the types of its slots against _context_type, and opcodes only reach it
+    through ContextOp. With runtime type information, the types of outer, argument and local
+    are bound to their values directly by bind_context_types.
+    """
+    __slots__ = [ "prepare", "outer", "argument", "static", "local", "types", "_context_type" ]
+
+    def __init__(self, prepare, outer, argument, static, types, context_type):
+        self.prepare = prepare
+        self.outer = outer
+        self.argument = argument
+        self.static = static
+        self.types = types
+        self._context_type = context_type
+
+    def get(self, slot):
+        if slot not in CONTEXT_SLOTS:
+            return MISSING
+        return getattr(self, slot, MISSING)
+
+    def set(self, slot, value):
+        if slot not in CONTEXT_SLOTS:
+            return False
+
+        slot_type = None
+        if runtime_type_information() and slot in TYPED_CONTEXT_SLOTS:
+            getter = self._context_type.get_micro_op_type(("get", slot))
+            if getter:
+                slot_type = getter.value_type
+
+        if slot_type:
+            old_value = getattr(self, slot, MISSING)
+            if old_value is not MISSING:
+                unbind_type_from_value(old_value, slot_type)
+            bind_type_to_value(value, slot_type)
+
+        setattr(self, slot, value)
+        return True
+
+    def __repr__(self):
+        return "ExecutionContext({})".format(getattr(self._context_type, "name", None))
+
+
+class ObjectRecord(object):
+    """
+    The value of an ObjectTemplateOp passed as the argument to a function that only reads its
+    fields with literal references, see does_argument_escape. Like ExecutionContext, it has no
+    manager. With runtime type information, the types of its fields are bound to their values
+    by bind_record_types.
+    """
+    __slots__ = [ "values" ]
+
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key):
+        return self.values.get(key, MISSING)
+
+    def get_values(self):
+        return self.values.items()
+
+    def to_composite(self):
+        return RDHObject(dict(self.values), debug_reason="object-template")
+
+
+class ListRecord(object):
+    """
+    The value of a ListTemplateOp passed as a non-escaping argument, see ObjectRecord.
+    """
+    __slots__ = [ "values" ]
+
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, index):
+        if type(index) is not int or index < 0 or index >= len(self.values):
+            return MISSING
+        return self.values[index]
+
+    def get_values(self):
+        return enumerate(self.values)
+
+    def to_composite(self):
+        return RDHList(list(self.values))
+
+
+class LocalRecord(object):
+    """
+    The local of a function whose local type is a closed shape, which only has getters and setters
+    for named properties, and whose code only reads and assigns its fields with literal references,
+    see does_local_escape. get_local_record_class builds a subclass for each such type, with a slot
+    for each property, so that it has neither a __dict__ nor a manager. With runtime type
+    information, the types of its fields are bound to their values by bind_record_types, and set
+    moves them from the old value of a field to the new one, as ExecutionContext.set does.
+    """
+    __slots__ = []
+
+    # Set on each subclass by get_local_record_class
+    record_type = None
+    properties = frozenset()
+
+    def __init__(self, values):
+        for key in self.properties:
+            setattr(self, key, values[key])
+
+    def get(self, key):
+        if key not in self.properties:
+            return MISSING
+        return getattr(self, key)
+
+    def set(self, key, value):
+        if key not in self.properties:
+            return False
+
+        if runtime_type_information():
+            getter = self.record_type.get_micro_op_type(("get", key))
+            if getter:
+                unbind_type_from_value(getattr(self, key), getter.value_type)
+                bind_type_to_value(value, getter.value_type)
+
+        setattr(self, key, value)
+        return True
+
+    def get_values(self):
+        return [ (key, getattr(self, key)) for key in self.properties ]
+
+    def to_composite(self):
+        return RDHObject(dict(self.get_values()), debug_reason="local-record")
+
+    def __repr__(self):
+        return "LocalRecord({})".format(getattr(self.record_type, "name", None))
+
+
+# The LocalRecord subclass for each closed shape, or None for other types
+local_record_classes = WeakKeyDictionary()
+
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def get_local_record_class(local_type):
+    """
+    Returns the LocalRecord subclass for locals of local_type, or None if local_type is not a
+    closed shape whose properties can all be slots.
+    """
+    record_class = local_record_classes.get(local_type, MISSING)
+    if record_class is not MISSING:
+        return record_class
+
+    record_class = None
+
+    if isinstance(local_type, CompositeType):
+        properties = set()
+        for tag in local_type.micro_op_types.keys():
+            if len(tag) != 2 or tag[0] not in ("get", "set") or not isinstance(tag[1], basestring):
+                break
+            if not IDENTIFIER.match(tag[1]) or hasattr(LocalRecord, tag[1]):
+                break
+            properties.add(str(tag[1]))
+        else:
+            record_class = type(str("LocalRecord"), (LocalRecord,), {
+                "__slots__": sorted(properties),
+                "record_type": local_type,
+                "properties": frozenset(properties)
+            })
+            UNMANAGED_VALUE_CLASSES.add(record_class)
+
+    local_record_classes[local_type] = record_class
+    return record_class
+
+
+RECORD_CLASSES = ( ObjectRecord, ListRecord, LocalRecord )
+
+# Values that opcodes read with get() rather than through a manager, including each subclass that
+# get_local_record_class builds
+UNMANAGED_VALUE_CLASSES = set([ ExecutionContext, ObjectRecord, ListRecord ])
+
+
+def get_typed_slots(context_type):
+    for slot in TYPED_CONTEXT_SLOTS:
+        getter = context_type.get_micro_op_type(("get", slot))
+        if getter:
+            yield slot, getter.value_type
+
+def bind_type_to_value(value, type):
+    if isinstance(value, ExecutionContext):
+        for sub_type in unwrap_types(type):
+            if isinstance(sub_type, CompositeType):
+                bind_context_types(value, sub_type)
+        return
+    if isinstance(value, RECORD_CLASSES):
+        for sub_type in unwrap_types(type):
+            if isinstance(sub_type, CompositeType):
+                bind_record_types(value, sub_type)
+        return
+
+    manager = get_manager(value)
+    if manager:
+        manager.add_composite_type(type)
+
+def unbind_type_from_value(value, type):
+    if isinstance(value, ExecutionContext):
+        for sub_type in unwrap_types(type):
+            if isinstance(sub_type, CompositeType):
+                unbind_context_types(value, sub_type)
+        return
+    if isinstance(value, RECORD_CLASSES):
+        for sub_type in unwrap_types(type):
+            if isinstance(sub_type, CompositeType):
+                unbind_record_types(value, sub_type)
+        return
+
+    manager = get_manager(value)
+    if manager:
+        manager.remove_composite_type(type)
+
+def bind_context_types(context, context_type):
+    """
+    Binds the types that context_type gives outer, argument and local to the values in those
+    slots, as binding context_type to an RDHObject context would.
+    """
+    for slot, slot_type in get_typed_slots(context_type):
+        bind_type_to_value(getattr(context, slot), slot_type)
+
+def unbind_context_types(context, context_type):
+    for slot, slot_type in get_typed_slots(context_type):
+        unbind_type_from_value(getattr(context, slot), slot_type)
+
+def get_record_field_types(record, record_type):
+    wildcard_getter = record_type.get_micro_op_type(("get-wildcard",))
+    for key, value in record.get_values():
+        getter = record_type.get_micro_op_type(("get", key)) or wildcard_getter
+        if getter:
+            yield value, getter.value_type
+
+def bind_record_types(record, record_type):
+    """
+    Binds the types that record_type gives each field to the values of those fields, as binding
+    record_type to the equivalent RDHObject or RDHList would.
+    """
+    for value, field_type in get_record_field_types(record, record_type):
+        bind_type_to_value(value, field_type)
+
+def unbind_record_types(record, record_type):
+    for value, field_type in get_record_field_types(record, record_type):
+        unbind_type_from_value(value, field_type)
+
+def does_value_or_context_fit_through_type(value, type):
+    if isinstance(value, ExecutionContext):
+        return type.is_copyable_from(value._context_type)
+    if isinstance(value, RECORD_CLASSES):
+        value = value.to_composite()
+    return does_value_fit_through_type(value, type)
+
+def is_type_bindable_to_value_or_context(value, type):
+    if isinstance(value, ExecutionContext):
+        return type.is_copyable_from(value._context_type)
+    if isinstance(value, RECORD_CLASSES):
+        value = value.to_composite()
+    return is_type_bindable_to_value(value, type)
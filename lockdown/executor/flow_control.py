@@ -4,8 +4,10 @@ from __future__ import unicode_literals
 from __builtin__ import True
 from _collections import defaultdict
 
+from lockdown.executor.execution_context import \
+    does_value_or_context_fit_through_type
 from lockdown.type_system.composites import is_type_bindable_to_value, \
-    CompositeType, does_value_fit_through_type
+    CompositeType
 from lockdown.type_system.core_types import Type
 from lockdown.type_system.exceptions import FatalError
 from lockdown.utils import MISSING, InternalMarker, is_debug
@@ -310,7 +312,7 @@ class Frame(object):
                 allowed_out = allowed_break_type["out"]
                 allowed_in = allowed_break_type.get("in", None)
 
-                out_is_compatible = does_value_fit_through_type(exc_value.value, allowed_out)
+                out_is_compatible = does_value_or_context_fit_through_type(exc_value.value, allowed_out)
                 in_is_compatible = allowed_in is None or (
                     exc_value.restart_type is not None and exc_value.restart_type.is_copyable_from(allowed_in)
                 )
@@ -2,25 +2,32 @@
 from __future__ import unicode_literals
 
 import ast
+import linecache
+from weakref import WeakValueDictionary
 
 from log import logger
 from lockdown.executor.ast_utils import unwrap_expr, \
     build_and_compile_ast_function, compile_module, compile_statement, \
     DependencyBuilder, compile_function, compile_ast_function_def, \
-    get_dependency_key
+    get_dependency_key, set_location, get_transpiled_filename
 from lockdown.executor.exceptions import PreparationException
+from lockdown.executor.execution_context import ExecutionContext, \
+    bind_context_types, unbind_context_types, bind_type_to_value, \
+    is_type_bindable_to_value_or_context, get_local_record_class
 from lockdown.executor.flow_control import BreakTypesFactory, FrameManager, \
-    is_restartable
+    is_restartable, BreakException
 from lockdown.executor.function_type import enrich_break_type, OpenFunctionType, \
     ClosedFunctionType
 from lockdown.executor.opcodes import enrich_opcode, get_context_type, evaluate, \
-    get_expression_break_types, flatten_out_types, TransformOp
+    get_expression_break_types, flatten_out_types, TransformOp, \
+    does_argument_escape, does_context_escape, does_local_escape, ObjectTemplateOp
+from lockdown.executor.raw_code import RawCode
 from lockdown.executor.raw_code_factories import dynamic_dereference_op, \
     static_op, match_op, prepared_function, inferred_type
 from lockdown.executor.type_factories import enrich_type
 from lockdown.type_system.composites import prepare_lhs_type, \
     check_dangling_inferred_types, CompositeType, InferredType, \
-    is_type_bindable_to_value
+    is_type_bindable_to_value, get_bound_value
 from lockdown.type_system.core_types import Type, NoValueType, IntegerType, \
     AnyType
 from lockdown.type_system.default_composite_types import DEFAULT_OBJECT_TYPE, \
@@ -61,9 +68,11 @@ def prepare_piece_of_context(declared_type, suggested_type):
     return final_type
 
 def prepare(data, outer_context, frame_manager, immediate_context=None):
-    if not isinstance(data, RDHObject):
+    # RawCode is immutable, so only function data built at run time needs to be made readonly
+    if isinstance(data, RDHObject):
+        get_manager(data).add_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
+    elif not isinstance(data, RawCode):
         raise FatalError()
-    get_manager(data).add_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
 
     if not hasattr(data, "code"):
         raise PreparationException("Code missing from function")
@@ -74,13 +83,17 @@ def prepare(data, outer_context, frame_manager, immediate_context=None):
         "prepare": outer_context
     }, bind=READONLY_DEFAULT_OBJECT_TYPE, debug_reason="static-prepare-context")
 
-    static = evaluate(
-        enrich_opcode(
-            data.static,
-            combine(type_conditional_converter, UnboundDereferenceBinder(context))
-        ),
-        context, frame_manager
-    )
+    try:
+        static = evaluate(
+            enrich_opcode(
+                data.static,
+                combine(type_conditional_converter, UnboundDereferenceBinder(context))
+            ),
+            context, frame_manager
+        )
+    finally:
+        # The readonly type is also bound through context to outer_context, which outlives it
+        get_manager(context).remove_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
 
     get_manager(static).add_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
 
@@ -127,17 +140,18 @@ def prepare(data, outer_context, frame_manager, immediate_context=None):
 #        "local": local_type
     }, wildcard_value_type=AnyType(), name="local-prepare-context-type")
 
-    local_initializer = enrich_opcode(
-        data.local_initializer,
-        combine(type_conditional_converter, UnboundDereferenceBinder(context))
-    )
-    actual_local_type, local_other_break_types = get_expression_break_types(
-        local_initializer,
-        context,
-        frame_manager
-    )
-
-    get_manager(context).remove_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
+    try:
+        local_initializer = enrich_opcode(
+            data.local_initializer,
+            combine(type_conditional_converter, UnboundDereferenceBinder(context))
+        )
+        actual_local_type, local_other_break_types = get_expression_break_types(
+            local_initializer,
+            context,
+            frame_manager
+        )
+    finally:
+        get_manager(context).remove_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
 
     if actual_local_type is MISSING:
         raise PreparationException("Actual local type missing")
@@ -158,7 +172,9 @@ def prepare(data, outer_context, frame_manager, immediate_context=None):
     actual_break_types_factory.merge(local_other_break_types)
 
     declared_break_types = RDHDict({
-        mode: RDHList([enrich_break_type(break_type) for break_type in break_types]) for mode, break_types in static.break_types.__dict__.items()
+        mode: RDHList([
+            enrich_break_type(break_type) for break_type in get_bound_value(static.break_types, mode)
+        ]) for mode in static.break_types._keys()
     })
 
     get_manager(declared_break_types).add_composite_type(DEFAULT_DICT_TYPE)
@@ -182,14 +198,15 @@ def prepare(data, outer_context, frame_manager, immediate_context=None):
         "local": local_type
     }, wildcard_value_type=AnyType(), name="code-prepare-context-type")
 
-    code = enrich_opcode(
-        data.code,
-        combine(type_conditional_converter, UnboundDereferenceBinder(context))
-    )
-
-    code_break_types = code.get_break_types(context, frame_manager)
+    try:
+        code = enrich_opcode(
+            data.code,
+            combine(type_conditional_converter, UnboundDereferenceBinder(context))
+        )
 
-    get_manager(context).remove_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
+        code_break_types = code.get_break_types(context, frame_manager)
+    finally:
+        get_manager(context).remove_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
 
     actual_break_types_factory.merge(code_break_types)
 
@@ -324,11 +341,9 @@ class UnboundDereferenceBinder(object):
                 new_dereference = dereference_op(bound_countext_op, literal_op(reference), True, **debug_info)
                 if is_static:
                     new_dereference = static_op(new_dereference)
-                get_manager(new_dereference).add_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
                 return new_dereference
             else:
                 new_dereference = dynamic_dereference_op(reference, **debug_info)
-                get_manager(new_dereference).add_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
                 return new_dereference
 
         if getattr(expression, "opcode", None) == "unbound_assignment":
@@ -337,7 +352,6 @@ class UnboundDereferenceBinder(object):
 
             if bound_countext_op:
                 new_assignment = assignment_op(bound_countext_op, literal_op(reference), expression.rvalue, **debug_info)
-                get_manager(new_assignment).add_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
                 return new_assignment
             else:
                 raise FatalError()  # TODO, dynamic assignment
@@ -367,7 +381,6 @@ def type_conditional_converter(expression):
             )
         ]
     )
-    get_manager(new_match).add_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
     return new_match
 
 def combine(*funcs):
@@ -421,12 +434,37 @@ class OpenFunction(object):
             raise FatalError()
 
         self.compiled_ast = None
+        self._argument_escapes = None
+        self._context_escapes = None
+        self._local_escapes = None
+
+    @property
+    def argument_escapes(self):
+        if self._argument_escapes is None:
+            self._argument_escapes = is_restartable(self) or does_argument_escape(self.local_initializer, self.code)
+        return self._argument_escapes
+
+    @property
+    def context_escapes(self):
+        if self._context_escapes is None:
+            self._context_escapes = does_context_escape(self.local_initializer, self.code)
+        return self._context_escapes
+
+    @property
+    def local_escapes(self):
+        if self._local_escapes is None:
+            self._local_escapes = (
+                self.context_escapes
+                or not isinstance(self.local_initializer, ObjectTemplateOp)
+                or does_local_escape(self.code)
+            )
+        return self._local_escapes
 
     def get_type(self):
         return OpenFunctionType(self.argument_type, self.outer_type, self.break_types)
 
     def close(self, outer_context):
-        if is_debug() and not is_type_bindable_to_value(outer_context, self.outer_type):
+        if is_debug() and not is_type_bindable_to_value_or_context(outer_context, self.outer_type):
             raise FatalError()
 
         return ClosedFunction(self, outer_context)
@@ -516,7 +554,7 @@ class {open_function_id}(object):
             will_ignore_return_value=will_ignore_return_value
         )
 
-        return compile_module("""
+        inline_ast = compile_module("""
 {context_name} = RDHObject({{
     "prepare": {prepare_context},
     "outer": {outer_context},
@@ -536,14 +574,25 @@ class {open_function_id}(object):
             local_initializer=local_initializer_ast,
             function_code=code_ast
         )
-
-    def transpile(self):
+        line = getattr(self.data, "line", None)
+        if line is not None:
+            set_location(inline_ast, line, getattr(self.data, "column", None))
+        return inline_ast
+
+    def to_module_ast(self):
+        """
+        Builds the python module that defines a class for this function and for each function it
+        contains. Returns the module, the name of the class for this function, the objects that
+        the module refers to by name, and the OpenFunction of each class by name.
+        """
         dependency_builder = DependencyBuilder()
 
         our_ast = self.to_ast(dependency_builder)
         open_function_id = our_ast.name
 
         combined_ast = [ our_ast ]
+        # The OpenFunctions transpiled into this module, by the name of their class
+        open_functions = { open_function_id: self }
 
         while True:
             for key, dependency in dependency_builder.dependencies.items():
@@ -551,6 +600,7 @@ class {open_function_id}(object):
                     open_function_ast = dependency.to_ast(dependency_builder)
                     if open_function_ast:
                         dependency_builder.replace(key, open_function_ast)
+                        open_functions[open_function_ast.name] = dependency
                     break
             else:
                 break
@@ -564,9 +614,40 @@ class {open_function_id}(object):
             if not isinstance(dependency, ast.stmt)
         }
 
-        combined_ast = ast.Module(body=combined_ast)
+        return ast.Module(body=combined_ast), open_function_id, dependencies, open_functions
+
+    def transpile(self, source_name=None):
+        """
+        Compiles this function, and the functions it contains, into python. The python is compiled
+        with the lines of the Lockdown code that it was built from, under a filename for
+        source_name, so that tracebacks and profilers point at the Lockdown source.
+        """
+        combined_ast, open_function_id, dependencies, open_functions = self.to_module_ast()
+
+        filename = get_transpiled_filename(source_name)
+        source = getattr(self.data, "raw_code", None)
+        if source:
+            # As if the source had been loaded by an import hook, so that tracebacks quote it
+            linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+
+        transpiled = compile_ast_function_def(combined_ast, open_function_id, dependencies, filename)
+
+        # The classes are all defined in the namespace that the module ran in
+        namespace = transpiled.invoke.__func__.__globals__
+        for name, open_function in open_functions.items():
+            transpiled_class = namespace[name]
+            # Keeps the OpenFunction in TRANSPILED_CODE for as long as its code is alive
+            transpiled_class.source_open_function = open_function
+            TRANSPILED_CODE[transpiled_class.invoke.__func__.__code__] = open_function
+
+        return transpiled
 
-        return compile_ast_function_def(combined_ast, open_function_id, dependencies)
+# The OpenFunction that each code object built by OpenFunction.transpile runs, for profilers and
+# debuggers
+TRANSPILED_CODE = WeakValueDictionary()
+
+def get_transpiled_open_function(code):
+    return TRANSPILED_CODE.get(code, None)
 
 class ClosedFunction(RDHFunction):
     def __init__(self, open_function, outer_context):
@@ -582,70 +663,141 @@ class ClosedFunction(RDHFunction):
     def break_types(self):
         return self.open_function.break_types
 
-    def transpile(self):
-        open_function_transpile = self.open_function.transpile()
+    def transpile(self, source_name=None):
+        open_function_transpile = self.open_function.transpile(source_name)
 
         return open_function_transpile.close(self.outer_context)
 
     def invoke(self, argument, frame_manager):
         logger.debug("ClosedFunction")
-        if is_debug() and not is_type_bindable_to_value(argument, self.open_function.argument_type):
+        if is_debug() and not is_type_bindable_to_value_or_context(argument, self.open_function.argument_type):
             raise FatalError()
         logger.debug("ClosedFunction:argument_check")
 
+        open_function = self.open_function
+
+        if open_function.context_escapes:
+            return self.invoke_in_composite_context(argument, frame_manager)
+
+        with frame_manager.get_next_frame(self) as frame:
+            new_context = frame.step("local_initialization_context", lambda: ExecutionContext(
+                open_function.prepare_context,
+                self.outer_context,
+                argument,
+                open_function.static,
+                open_function.types_context,
+                open_function.local_initialization_context_type
+            ))
+
+            if runtime_type_information():
+                try:
+                    frame.step("bind_local_initialization_context_types", lambda: bind_context_types(new_context, open_function.local_initialization_context_type))
+                except Exception as e:
+                    raise_from(FatalError, e)
+
+            local_context = None
+            if not open_function.local_escapes:
+                # The local is only read and assigned field by field, so it can be a record
+                local_context = { "record_class": get_local_record_class(open_function.local_type) }
+
+            try:
+                logger.debug("ClosedFunction:local_initializer")
+                local = frame.step("local", lambda: evaluate(open_function.local_initializer, new_context, frame_manager, local_context))
+
+                logger.debug("ClosedFunction:local_check")
+                if is_debug() and not is_type_bindable_to_value_or_context(local, open_function.local_type):
+                    raise FatalError()
+
+                logger.debug("ClosedFunction:code_context")
+                new_context.local = local
+                # In conjunction with get_context_type, for performance
+                new_context._context_type = open_function.execution_context_type
+
+                if runtime_type_information():
+                    try:
+                        frame.step("bind_local_type", lambda: bind_type_to_value(local, open_function.local_type))
+                    except Exception as e:
+                        raise_from(FatalError, e)
+
+                logger.debug("ClosedFunction:code_execute")
+                result = frame.step("code", lambda: evaluate(open_function.code, new_context, frame_manager))
+            except BreakException as e:
+                # Unless the function can be restarted, it is finished with its context
+                if runtime_type_information() and e.restart_type is None:
+                    unbind_context_types(new_context, new_context._context_type)
+                raise
+
+            if runtime_type_information():
+                frame.step("unbind_code_execution_context_types", lambda: unbind_context_types(new_context, open_function.execution_context_type))
+
+            return frame.value(result)
+
+    def invoke_in_composite_context(self, argument, frame_manager):
+        """
+        Runs the function in RDHObject contexts, for functions whose code can keep a reference to
+        the context, see does_context_escape. These are managed like any other value, and match
+        the contexts of transpiled functions.
+        """
+        open_function = self.open_function
+
         with frame_manager.get_next_frame(self) as frame:
             try:
                 new_context = frame.step("local_initialization_context", lambda: RDHObject({
-                        "prepare": self.open_function.prepare_context,
+                        "prepare": open_function.prepare_context,
                         "outer": self.outer_context,
                         "argument": argument,
-                        "static": self.open_function.static,
-                        "types": self.open_function.types_context
+                        "static": open_function.static,
+                        "types": open_function.types_context
                     },
-                        bind=self.open_function.local_initialization_context_type if runtime_type_information() else None,
+                        bind=open_function.local_initialization_context_type if runtime_type_information() else None,
                         debug_reason="local-initialization-context"
                     )
                 )
             except Exception as e:
                 raise_from(FatalError, e)
 
-            get_manager(new_context)._context_type = self.open_function.local_initialization_context_type
+            get_manager(new_context)._context_type = open_function.local_initialization_context_type
 
             logger.debug("ClosedFunction:local_initializer")
-            local = frame.step("local", lambda: evaluate(self.open_function.local_initializer, new_context, frame_manager))
+            local = frame.step("local", lambda: evaluate(open_function.local_initializer, new_context, frame_manager))
 
             if runtime_type_information():
-                frame.step("remove_local_initialization_context_type", lambda: get_manager(new_context).remove_composite_type(self.open_function.local_initialization_context_type))
+                frame.step("remove_local_initialization_context_type", lambda: get_manager(new_context).remove_composite_type(open_function.local_initialization_context_type))
 
             logger.debug("ClosedFunction:local_check")
-            if is_debug() and not is_type_bindable_to_value(local, self.open_function.local_type):
+            if is_debug() and not is_type_bindable_to_value(local, open_function.local_type):
                 raise FatalError()
 
             logger.debug("ClosedFunction:code_context")
             try:
                 new_context = frame.step("code_execution_context", lambda: RDHObject({
-                        "prepare": self.open_function.prepare_context,
+                        "prepare": open_function.prepare_context,
                         "outer": self.outer_context,
                         "argument": argument,
-                        "static": self.open_function.static,
+                        "static": open_function.static,
                         "local": local,
-                        "types": self.open_function.types_context
+                        "types": open_function.types_context
                     },
-                        bind=self.open_function.execution_context_type if runtime_type_information() else None,
+                        bind=open_function.execution_context_type if runtime_type_information() else None,
                         debug_reason="code-execution-context"
                     )
                 )
             except Exception as e:
-                raise raise_from(FatalError, e)
+                raise_from(FatalError, e)
 
             # In conjunction with get_context_type, for performance
-            get_manager(new_context)._context_type = self.open_function.execution_context_type
+            get_manager(new_context)._context_type = open_function.execution_context_type
 
             logger.debug("ClosedFunction:code_execute")
-            result = frame.step("code", lambda: evaluate(self.open_function.code, new_context, frame_manager))
+            try:
+                result = frame.step("code", lambda: evaluate(open_function.code, new_context, frame_manager))
+            except BreakException as e:
+                if runtime_type_information() and e.restart_type is None:
+                    get_manager(new_context).remove_composite_type(open_function.execution_context_type)
+                raise
 
             if runtime_type_information():
-                frame.step("remove_code_execution_context_type", lambda: get_manager(new_context).remove_composite_type(self.open_function.execution_context_type))
+                frame.step("remove_code_execution_context_type", lambda: get_manager(new_context).remove_composite_type(open_function.execution_context_type))
 
             return frame.value(result)
 
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from lockdown.executor.bootstrap import get_default_global_context, \
+    prepare_function
+from lockdown.executor.raw_code import RawCode
+from lockdown.type_system.default_composite_types import READONLY_DEFAULT_OBJECT_TYPE
+from lockdown.type_system.managers import get_manager
+from lockdown.type_system.object_types import RDHObject
+
+
+class IncrementalVerifier(object):
+    """
+    Prepares successive versions of one document, as bootstrap_function does before it runs a
+    function, but only prepares the top level functions that have changed since the last version.
+
+    A document is a function literal, or an object of them as a module would be. Each top level
+    function is prepared against the same global context, so its argument, outer and local types
+    only depend on its own code. IncrementalParser returns the same RawCode for a function whose
+    source is unchanged, even if it has moved to other lines, so an OpenFunction prepared for that
+    RawCode before, with its enriched opcodes and break types, is still correct and is reused.
+    """
+    def __init__(self, context=None, check_safe_exit=False):
+        if context is None:
+            context = get_default_global_context()
+        else:
+            get_manager(context).add_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
+        self.context = context
+        self.check_safe_exit = check_safe_exit
+        # The code and OpenFunction of each top level function of the last version, by id of the code
+        self.open_functions = {}
+        # How many functions the last call to verify prepared, for tests and benchmarks
+        self.functions_prepared = 0
+
+    def verify(self, code):
+        """
+        Returns the OpenFunction for code, or a dict of them for an object of functions. Raises
+        PreparationException or BootstrapException as bootstrap_function would.
+        """
+        open_functions = {}
+        self.functions_prepared = 0
+
+        def get_open_function(data):
+            cached = self.open_functions.get(id(data), None)
+            if cached and cached[0] is data:
+                open_function = cached[1]
+            else:
+                open_function = prepare_function(data, self.context, self.check_safe_exit)
+                self.functions_prepared += 1
+            open_functions[id(data)] = (data, open_function)
+            return open_function
+
+        try:
+            if isinstance(code, RDHObject):
+                return {
+                    key: get_open_function(code._get(key))
+                    for key in code._keys() if is_function_literal(code._get(key))
+                }
+            return get_open_function(code)
+        finally:
+            # Functions that are no longer in the document are dropped
+            self.open_functions = open_functions
+
+
+def is_function_literal(value):
+    return isinstance(value, RawCode) and value._contains("code")
@@ -3,20 +3,26 @@ from __future__ import unicode_literals
 
 from abc import abstractmethod
 import ast
+from functools import wraps
 
 from log import logger
 from lockdown.executor.ast_utils import compile_expression, compile_statement, \
-    unwrap_modules, wrap_as_statement
+    unwrap_modules, wrap_as_statement, set_location
 from lockdown.executor.exceptions import PreparationException
-from lockdown.executor.flow_control import BreakTypesFactory, BreakException
+from lockdown.executor.execution_context import ExecutionContext, \
+    does_value_or_context_fit_through_type, ObjectRecord, ListRecord, \
+    LocalRecord, UNMANAGED_VALUE_CLASSES
+from lockdown.executor.flow_control import BreakTypesFactory, BreakException, \
+    is_restartable
 from lockdown.executor.function_type import OpenFunctionType, ClosedFunctionType
+from lockdown.executor.raw_code import RawCodeList
 from lockdown.executor.type_factories import enrich_type
 from lockdown.type_system.composites import CompositeType, temporary_bind, \
     does_value_fit_through_type, is_type_bindable_to_value, Composite, \
-    create_reasonable_composite_type
+    create_reasonable_composite_type, get_bound_value
 from lockdown.type_system.core_types import AnyType, Type, merge_types, Const, \
     UnitType, NoValueType, AllowedValuesNotAvailable, unwrap_types, IntegerType, \
-    BooleanType, remove_type
+    BooleanType, StringType, remove_type
 from lockdown.type_system.default_composite_types import rich_composite_type, \
     readonly_rich_composite_type, \
     READONLY_DEFAULT_OBJECT_TYPE
@@ -27,8 +33,9 @@ from lockdown.type_system.exceptions import FatalError, InvalidDereferenceType,
 from lockdown.type_system.list_types import RDHList, ListGetterType, \
     ListSetterType, ListWildcardGetterType, ListWildcardSetterType, \
     ListWildcardDeletterType, ListInsertType, ListWildcardInsertType, \
-    RDHListType
-from lockdown.type_system.managers import get_type_of_value, get_manager
+    RDHListType, is_list_type
+from lockdown.type_system.managers import get_type_of_value, get_manager, \
+    UnmanagedValue
 from lockdown.type_system.object_types import RDHObject, RDHObjectType, \
     ObjectGetterType, ObjectSetterType, ObjectWildcardGetterType, \
     ObjectWildcardSetterType
@@ -36,6 +43,23 @@ from lockdown.utils import MISSING, NO_VALUE, is_debug, \
     runtime_type_information
 
 
+def with_source_location(to_ast):
+    """
+    Gives the python AST that to_ast builds for an opcode the line and column of the opcode, so
+    that tracebacks and profilers of transpiled code point at the Lockdown source.
+    """
+    @wraps(to_ast)
+    def to_ast_with_source_location(self, *args, **kwargs):
+        result = to_ast(self, *args, **kwargs)
+        # Not every opcode keeps its data, or has a position
+        data = getattr(self, "data", None)
+        line = getattr(data, "line", None)
+        if result is not None and line is not None:
+            set_location(result, line, getattr(data, "column", None))
+        return result
+    return to_ast_with_source_location
+
+
 class Opcode(object):
     """
     Base class for all Opcodes used in Lockdown. 
@@ -85,6 +109,7 @@ class Opcode(object):
     def return_value_jump(self, context, frame_manager, immediate_context=None):
         return evaluate(self, context, frame_manager, immediate_context)
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         return compile_expression(
             "{return_value_jump}({context_name}, _frame_manager)",
@@ -150,22 +175,34 @@ def flatten_out_types(break_types):
 class TypeErrorFactory(object):
     def __init__(self, message):
         self.message = message
+        # Built on first use, and shared by every error, including those with messages formatted
+        # at runtime, which is why the message is typed as a string rather than a unit
+        self.type = None
+        self.kwargs_type = None
 
     def __call__(self, message=None, **kwargs):
-        data = {
+        type = self.get_type()
+        kwargs = RDHDict(kwargs, debug_reason="type-error-kwargs")
+        error = RDHObject({
             "type": "TypeError",
             "message": message or self.message,
             "kwargs": kwargs
-        }
-        return RDHObject(data, bind=self.get_type(message), debug_reason="type-error")
-
-    def get_type(self, message=None):
-        properties = {
-            "type": Const(UnitType("TypeError")),
-            "message": Const(UnitType(message or self.message)),
-            "kwargs": Const(RDHDictType(AnyType()))
-        }
-        return RDHObjectType(properties, wildcard_value_type=AnyType(), name="TypeError")
+        }, debug_reason="type-error")
+        # The walk that bind= does would only reach the error and kwargs, whose elements are
+        # Any, so their types are attached directly
+        get_manager(error).attach_type(type)
+        get_manager(kwargs).attach_type(self.kwargs_type)
+        return error
+
+    def get_type(self):
+        if self.type is None:
+            self.kwargs_type = RDHDictType(AnyType())
+            self.type = RDHObjectType({
+                "type": Const(UnitType("TypeError")),
+                "message": Const(StringType()),
+                "kwargs": Const(self.kwargs_type)
+            }, wildcard_value_type=AnyType(), name="TypeError")
+        return self.type
 
 
 class Nop(Opcode):
@@ -178,6 +215,7 @@ class Nop(Opcode):
         with frame_manager.get_next_frame(self) as frame:
             return frame.value(NO_VALUE)
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         return compile_expression("NoValue", context_name, dependency_builder)
 
@@ -197,6 +235,7 @@ class LiteralOp(Opcode):
         with frame_manager.get_next_frame(self) as frame:
             return frame.value(self.value)
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         if isinstance(self.value, int):
             return ast.Num(n=self.value)
@@ -213,7 +252,7 @@ class ObjectTemplateOp(Opcode):
 
     def __init__(self, data, visitor):
         super(ObjectTemplateOp, self).__init__(data, visitor)
-        if not isinstance(data.opcodes, RDHList):
+        if not isinstance(data.opcodes, (RDHList, RawCodeList)):
             raise FatalError()
         for e in data.opcodes:
             if not isinstance(e, tuple) and len(e) != 2:
@@ -290,8 +329,16 @@ class ObjectTemplateOp(Opcode):
                 if result[key] is NO_VALUE:
                     frame.exception(self.NO_VALUE_ASSIGNMENT())
 
+            if immediate_context and not immediate_context.get("escapes", True):
+                return frame.value(ObjectRecord(result))
+
+            record_class = immediate_context and immediate_context.get("record_class", None)
+            if record_class and record_class.properties.issubset(result):
+                return frame.value(record_class(result))
+
             return frame.value(RDHObject(result, debug_reason="object-template"))
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         parameters = {}
         parameters.update({
@@ -302,7 +349,7 @@ class ObjectTemplateOp(Opcode):
             "value_ast{}".format(id(key)): opcode.to_ast(context_name, dependency_builder)
             for key, opcode in self.opcodes
         })
-        parameter_template = ",".join("{{key_ast{}}}: {{value_ast{}}}".format(id(key), id(key)) for key in self.opcodes)
+        parameter_template = ",".join("{{key_ast{}}}: {{value_ast{}}}".format(id(key), id(key)) for key, _ in self.opcodes)
         return compile_expression(
             "RDHObject({{ " + parameter_template + " }})",
             context_name, dependency_builder, **parameters
@@ -399,12 +446,29 @@ class ListTemplateOp(Opcode):
                 new_value = frame.step(index, lambda: evaluate(opcode, context, frame_manager))
                 result.append(new_value)
 
+            if immediate_context and not immediate_context.get("escapes", True):
+                return frame.value(ListRecord(result))
+
             return frame.value(RDHList(result))
 
 
+def get_static_open_function(opcode):
+    """
+    Returns the OpenFunction that opcode closes, if it was prepared statically, otherwise None.
+    """
+    from lockdown.executor.function import OpenFunction
+    if (isinstance(opcode, CloseOp)
+        and isinstance(opcode.function, StaticOp)
+        and isinstance(opcode.function.value, OpenFunction)
+    ):
+        return opcode.function.value
+    return None
+
 def get_context_type(context):
     if context is None:
         return NoValueType()
+    if context.__class__ is ExecutionContext:
+        return context._context_type
     context_manager = get_manager(context)
     if not hasattr(context_manager, "_context_type"):
         value_type = {}
@@ -421,6 +485,9 @@ def get_context_type(context):
             value_type["prepare"] = readonly_rich_composite_type
         if hasattr(context, "static"):
             value_type["static"] = readonly_rich_composite_type
+        if context_manager.frozen:
+            # Code can only read frozen contexts, so they have no setters to verify against
+            value_type = { key: Const(type) for key, type in value_type.items() }
         context_manager._context_type = RDHObjectType(value_type, name="context-type-{}".format(context_manager.debug_reason))
 
     return context_manager._context_type
@@ -436,6 +503,7 @@ class ContextOp(Opcode):
         with frame_manager.get_next_frame(self) as frame:
             return frame.value(context)
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         return compile_expression(context_name, context_name, dependency_builder)
 
@@ -507,11 +575,7 @@ class DereferenceOp(Opcode):
         self.invalid_dereference_error = len(list(invalid_dereferences)) > 0 or invalid_unknown_dereference
 
         exception_break_mode = "exception" if self.safe else "value"
-        for invalid_dereference in invalid_dereferences:
-            break_types.add(exception_break_mode, self.INVALID_DEREFERENCE.get_type(
-                message="DereferenceOp: invalid_dereference {}".format(invalid_dereference)
-            ), opcode=self)
-        if invalid_unknown_dereference:
+        if self.invalid_dereference_error:
             break_types.add(exception_break_mode, self.INVALID_DEREFERENCE.get_type(), opcode=self)
 
         return break_types.build()
@@ -523,11 +587,24 @@ class DereferenceOp(Opcode):
 
 #            print "{}".format(reference)
 
-            manager = get_manager(of)
-
             exception_break_mode = "exception" if self.safe else "value"
 
+            if of.__class__ in UNMANAGED_VALUE_CLASSES:
+                value = of.get(reference)
+                if value is MISSING:
+                    return frame.unwind(exception_break_mode, self.INVALID_DEREFERENCE(
+                        message="DereferenceOp: invalid_dereference {}".format(reference)
+                    ), None, None)
+                return frame.value(value)
+
+            manager = get_manager(of)
+
             if manager is None:
+                # Immutable values, such as RawCode, are read directly
+                if isinstance(of, UnmanagedValue):
+                    value = of.get(reference)
+                    if value is not MISSING:
+                        return frame.value(value)
                 return frame.unwind(exception_break_mode, self.INVALID_DEREFERENCE(reference=reference), None, None)
 
             try:
@@ -558,6 +635,7 @@ class DereferenceOp(Opcode):
                     message="DereferenceOp: invalid_dereference {}".format(reference)
                 ), None, None)
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         micro_op_to_compile = None
         direct = None
@@ -609,7 +687,7 @@ class DynamicDereferenceOp(Opcode):
 
         break_types.add(
             "exception",
-            self.INVALID_DEREFERENCE.get_type(message="DynamicDereferenceOp: invalid_dereference {}".format(self.reference)),
+            self.INVALID_DEREFERENCE.get_type(),
             opcode=self
         )
 
@@ -716,6 +794,11 @@ class AssignmentOp(Opcode):
                 if (is_debug() or self.invalid_rvalue_error) and not is_type_bindable_to_value(rvalue, micro_op_type.value_type):
                     return frame.exception(self.INVALID_RVALUE())
 
+                if of.__class__ is ExecutionContext or isinstance(of, LocalRecord):
+                    if not of.set(reference, rvalue):
+                        return frame.exception(self.INVALID_ASSIGNMENT())
+                    return frame.value(None)
+
                 if direct:
                     return frame.value(micro_op_type.invoke(manager, rvalue, shortcut_checks=True))
                 else:
@@ -725,6 +808,7 @@ class AssignmentOp(Opcode):
             except InvalidAssignmentKey:
                 return frame.exception(self.INVALID_ASSIGNMENT())
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         micro_op_to_compile = None
         direct = None
@@ -883,6 +967,30 @@ class InsertOp(Opcode):
             except InvalidAssignmentKey:
                 return frame.exception(self.INVALID_ASSIGNMENT())
 
+def get_mapped_list_type(composite_type, continue_type, can_skip_elements, name):
+    """
+    The type of the list of values a loop body continues with, for each element of composite_type.
+    If the body continues for every element, the list has the same integer keys as composite_type.
+    """
+    micro_ops = {}
+
+    keys = [getattr(micro_op, "key", None) for micro_op in composite_type.micro_op_types.values()]
+    integer_keys = [k for k in keys if isinstance(k, int)]
+
+    if not can_skip_elements:
+        for index in integer_keys:
+            micro_ops[("get", index)] = ListGetterType(index, continue_type, False, False)
+            micro_ops[("set", index)] = ListSetterType(index, continue_type, False, False)
+
+    micro_ops[("get-wildcard",)] = ListWildcardGetterType(continue_type, True, False)
+    micro_ops[("set-wildcard",)] = ListWildcardSetterType(continue_type, True, True)
+    micro_ops[("insert", 0)] = ListInsertType(0, continue_type, False, False)
+    micro_ops[("delete-wildcard",)] = ListWildcardDeletterType(True)
+    micro_ops[("insert-wildcard",)] = ListWildcardInsertType(continue_type, True, False)
+
+    return CompositeType(micro_ops, name=name)
+
+
 class MapOp(Opcode):
     MISSING_COMPOSITE_TYPE = TypeErrorFactory("{}: missing_integers")
     MISSING_MAPPER_FUNCTION = TypeErrorFactory("{}: missing_mapper_function")
@@ -935,24 +1043,9 @@ class MapOp(Opcode):
 
                 if mapper_continue_type is not MISSING:
                     mapper_continue_type = flatten_out_types(mapper_continue_type)
-                    micro_ops = {}
-
-                    keys = [getattr(micro_op, "key", None) for micro_op in composite_type.micro_op_types.values()]
-                    integer_keys = [k for k in keys if isinstance(k, int)]
-
-                    if not ends and not skips:
-                        for index in integer_keys:
-                            micro_ops[("get", index)] = ListGetterType(index, mapper_continue_type, False, False)
-                            micro_ops[("set", index)] = ListSetterType(index, AnyType(), False, False)
-
-                    micro_ops[("get-wildcard",)] = ListWildcardGetterType(mapper_continue_type, True, False)
-                    micro_ops[("set-wildcard",)] = ListWildcardSetterType(AnyType(), False, False)
-                    micro_ops[("insert", 0)] = ListInsertType(0, AnyType(), False, False)
-                    micro_ops[("delete-wildcard",)] = ListWildcardDeletterType(True)
-                    micro_ops[("insert-wildcard",)] = ListWildcardInsertType(AnyType(), True, False)
-
-                    result = CompositeType(micro_ops, name="MapOp")
-                    break_types.add("value", result)
+                    break_types.add("value", get_mapped_list_type(
+                        composite_type, mapper_continue_type, ends or skips, "MapOp"
+                    ))
 
                 break_types.merge(mapper_break_types)
 
@@ -969,7 +1062,10 @@ class MapOp(Opcode):
             with frame_manager.get_next_frame(self) as frame:
                 with frame_manager.capture("break") as breaker:
                     results = []
-                    for v in composite:
+                    index = 0
+                    while composite._contains(index):
+                        v = get_bound_value(composite, index)
+                        index += 1
                         with frame_manager.capture("end") as ender:
                             with frame_manager.capture("continue") as capturer:
                                 mapper.invoke(v, frame_manager)
@@ -983,6 +1079,281 @@ class MapOp(Opcode):
 
             raise FatalError()
 
+class ForEachOp(Opcode):
+    """
+    for(var x in composite) { ... }
+
+    Invokes the loop body once for each element of composite, passing the element as the body's
+    argument. The loop's value is the list of values the body continues with, unless the loop is
+    a statement whose value is ignored, in which case they are not collected.
+    """
+    MISSING_COMPOSITE_TYPE = TypeErrorFactory("ForEachOp: missing_composite")
+    MISSING_BODY_FUNCTION = TypeErrorFactory("ForEachOp: missing_body_function")
+
+    def __init__(self, data, visitor):
+        super(ForEachOp, self).__init__(data, visitor)
+        self.composite = enrich_opcode(data.composite, visitor)
+        self.iterator = data.iterator
+        self.body = enrich_opcode(data.body, visitor)
+        # Set by CommaOp when this loop is a statement followed by others
+        self.value_is_ignored = False
+
+    def get_break_types(self, context, frame_manager, immediate_context=None):
+        break_types = BreakTypesFactory(self)
+
+        composite_type, composite_other_break_types = get_expression_break_types(self.composite, context, frame_manager)
+        if composite_type is not MISSING:
+            composite_type = flatten_out_types(composite_type)
+        break_types.merge(composite_other_break_types)
+
+        body_immediate_context = {}
+
+        if isinstance(composite_type, CompositeType):
+            getter_value_types = [micro_op.value_type for key, micro_op in composite_type.micro_op_types.items() if key[0] == "get"]
+            wildcard_getter = composite_type.get_micro_op_type(("get-wildcard", ))
+            if wildcard_getter:
+                getter_value_types.append(wildcard_getter.value_type)
+
+            if getter_value_types:
+                body_immediate_context["suggested_argument_type"] = RDHObjectType({
+                    self.iterator: merge_types(getter_value_types, "sub")
+                }, name="ForEachOp")
+
+        # Only lists are iterated, see jump
+        if not is_list_type(composite_type):
+            break_types.add("exception", self.MISSING_COMPOSITE_TYPE.get_type(), opcode=self)
+
+        body_type, body_other_break_types = get_expression_break_types(self.body, context, frame_manager, body_immediate_context)
+        break_types.merge(body_other_break_types)
+        if body_type is not MISSING:
+            body_type = flatten_out_types(body_type)
+
+        if not isinstance(body_type, ClosedFunctionType):
+            break_types.add("exception", self.MISSING_BODY_FUNCTION.get_type(), opcode=self)
+            return break_types.build()
+
+        body_break_types = dict(body_type.break_types)
+
+        break_value_type = body_break_types.pop("break", MISSING)
+        if break_value_type is not MISSING:
+            break_types.add("value", flatten_out_types(break_value_type))
+
+        continue_type = body_break_types.pop("continue", MISSING)
+        ends = body_break_types.pop("end", MISSING) is not MISSING
+        skips = body_break_types.pop("value", MISSING) is not MISSING
+
+        if continue_type is MISSING:
+            break_types.add("value", RDHListType([], None))
+        elif isinstance(composite_type, CompositeType):
+            break_types.add("value", get_mapped_list_type(
+                composite_type, flatten_out_types(continue_type), ends or skips, "ForEachOp"
+            ))
+
+        break_types.merge(body_break_types)
+
+        return break_types.build()
+
+    def jump(self, context, frame_manager, immediate_context=None):
+        from lockdown.executor.function import RDHFunction, ClosedFunction
+
+        with frame_manager.get_next_frame(self) as frame:
+            composite = frame.step("composite", lambda: evaluate(self.composite, context, frame_manager))
+            body = frame.step("body", lambda: evaluate(self.body, context, frame_manager))
+
+            if not isinstance(composite, RDHList):
+                return frame.exception(self.MISSING_COMPOSITE_TYPE())
+            if not isinstance(body, RDHFunction):
+                return frame.exception(self.MISSING_BODY_FUNCTION())
+
+            argument_escapes = body.__class__ is not ClosedFunction or body.open_function.argument_escapes
+            results = None if self.value_is_ignored else []
+
+            with frame_manager.capture("break") as breaker:
+                index = 0
+                while composite._contains(index):
+                    value = get_bound_value(composite, index)
+                    index += 1
+                    if argument_escapes:
+                        argument = RDHObject({ self.iterator: value }, debug_reason="object-template")
+                    else:
+                        argument = ObjectRecord({ self.iterator: value })
+                    with frame_manager.capture("end") as ender:
+                        with frame_manager.capture("continue") as capturer:
+                            # In debug mode, the body's value is raised rather than returned
+                            with frame_manager.capture("value"):
+                                body.invoke(argument, frame_manager)
+                        if capturer.value is not MISSING and results is not None:
+                            results.append(capturer.value)
+                    if ender.value is not MISSING:
+                        break
+                return frame.value(RDHList(results or []))
+            if breaker.value is not MISSING:
+                return frame.value(breaker.value)
+
+        raise FatalError()
+
+    @with_source_location
+    def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
+        element_name = "element_{}".format(id(self))
+        argument_ast = compile_expression(
+            "RDHObject({{ \"{iterator}\": {element_name} }})",
+            context_name, dependency_builder, iterator=self.iterator, element_name=element_name
+        )
+
+        body_ast = None
+        open_function = get_static_open_function(self.body)
+        if open_function:
+            # to_inline_ast can return None if it's not possible to inline the open function
+            body_ast = open_function.to_inline_ast(
+                dependency_builder,
+                self.body.outer_context.to_ast(context_name, dependency_builder),
+                argument_ast
+            )
+        if body_ast is None:
+            body_ast = compile_expression(
+                "{body}.invoke({argument}, _frame_manager)",
+                context_name, dependency_builder,
+                body=self.body.to_ast(context_name, dependency_builder),
+                argument=argument_ast
+            )
+
+        collect_results = not (will_ignore_return_value or self.value_is_ignored)
+
+        for_each_function = compile_statement("""
+def ForEachOp{opcode_id}({context_name}, _frame_manager):
+    composite = {composite}
+    results = []
+    index = 0
+    try:
+        while composite._contains(index):
+            {element_name} = {get_bound_value}(composite, index)
+            index += 1
+            try:
+                {body}
+            except BreakException as b:
+                if b.mode == "continue":
+                    """ + ("results.append(b.value)" if collect_results else "pass") + """
+                elif b.mode == "end":
+                    break
+                else:
+                    raise
+    except BreakException as b:
+        if b.mode == "break":
+            return b.value
+        raise
+    return {RDHList}(results)
+            """, context_name, dependency_builder,
+            opcode_id=id(self),
+            element_name=element_name,
+            composite=self.composite.to_ast(context_name, dependency_builder),
+            body=body_ast,
+            RDHList=RDHList,
+            get_bound_value=get_bound_value
+        )
+
+        return compile_expression(
+            "{for_each_function}({context_name}, _frame_manager)",
+            context_name, dependency_builder,
+            for_each_function=for_each_function
+        )
+
+
+class RangeLoopOp(Opcode):
+    """
+    for(var i from range(start, end)) { ... }
+
+    The parser keeps the generic lowering of the loop, which resets the range generator for every
+    value it yields. If range is the builtin, start and end are integers and the body can not be
+    restarted, the body is instead invoked natively for every integer, like MapOp does for the
+    elements of a list. Either way, the break types are those of the generic lowering.
+
+    Which of the two is run is decided when the loop is prepared, and does not change after.
+    """
+    def __init__(self, data, visitor):
+        super(RangeLoopOp, self).__init__(data, visitor)
+        self.range_function = enrich_opcode(data.range_function, visitor)
+        self.start = enrich_opcode(data.start, visitor)
+        self.end = enrich_opcode(data.end, visitor)
+        self.iterator = data.iterator
+        self.body = enrich_opcode(data.body, visitor)
+        self.generic = enrich_opcode(data.generic, visitor)
+        # Set once by get_break_types, None until the loop has been prepared
+        self.is_native = None
+        # Set by CommaOp when this loop is a statement followed by others
+        self.value_is_ignored = False
+
+    def get_break_types(self, context, frame_manager, immediate_context=None):
+        break_types = BreakTypesFactory(self)
+        break_types.merge(self.generic.get_break_types(context, frame_manager))
+
+        range_function_type, _ = get_expression_break_types(self.range_function, context, frame_manager)
+        start_type, _ = get_expression_break_types(self.start, context, frame_manager)
+        end_type, _ = get_expression_break_types(self.end, context, frame_manager)
+        body_type, _ = get_expression_break_types(self.body, context, frame_manager, immediate_context={
+            "suggested_argument_type": self.get_iterator_argument_type()
+        })
+
+        is_native = not any(t is MISSING for t in (range_function_type, start_type, end_type, body_type))
+
+        if is_native:
+            body_type = flatten_out_types(body_type)
+
+            is_native = (
+                isinstance(self.range_function, StaticOp)
+                and getattr(self.range_function.value, "is_builtin_range", False)
+                and IntegerType().is_copyable_from(flatten_out_types(start_type))
+                and IntegerType().is_copyable_from(flatten_out_types(end_type))
+                and isinstance(body_type, ClosedFunctionType)
+                and not is_restartable(body_type)
+                and body_type.argument_type.is_copyable_from(self.get_iterator_argument_type())
+            )
+
+        if self.is_native is None:
+            self.is_native = is_native
+        elif self.is_native != is_native:
+            raise FatalError()
+
+        return break_types.build()
+
+    def get_iterator_argument_type(self):
+        return RDHObjectType({ self.iterator: IntegerType() }, name="RangeLoopOp")
+
+    def jump(self, context, frame_manager, immediate_context=None):
+        if self.is_native is None:
+            raise FatalError()
+        if not self.is_native:
+            return self.generic.jump(context, frame_manager, immediate_context)
+
+        with frame_manager.get_next_frame(self) as frame:
+            start = frame.step("start", lambda: evaluate(self.start, context, frame_manager))
+            end = frame.step("end", lambda: evaluate(self.end, context, frame_manager))
+            body = frame.step("body", lambda: evaluate(self.body, context, frame_manager))
+
+            argument_escapes = body.open_function.argument_escapes
+            results = None if self.value_is_ignored else []
+
+            with frame_manager.capture("break") as breaker:
+                for value in xrange(start, end):
+                    if argument_escapes:
+                        argument = RDHObject({ self.iterator: value }, debug_reason="object-template")
+                    else:
+                        argument = ObjectRecord({ self.iterator: value })
+                    with frame_manager.capture("end") as ender:
+                        with frame_manager.capture("continue") as capturer:
+                            # In debug mode, the body's value is raised rather than returned
+                            with frame_manager.capture("value"):
+                                body.invoke(argument, frame_manager)
+                        if capturer.value is not MISSING and results is not None:
+                            results.append(capturer.value)
+                    if ender.value is not MISSING:
+                        break
+                return frame.value(RDHList(results or []))
+            if breaker.value is not MISSING:
+                return frame.value(breaker.value)
+
+        raise FatalError()
+
+
 def BinaryOp(name, symbol, func, argument_type, result_type, number_op=None, cmp_op=None):
     class _BinaryOp(Opcode):
         MISSING_OPERANDS = TypeErrorFactory("{}: missing_integers".format(name))
@@ -1033,6 +1404,7 @@ def BinaryOp(name, symbol, func, argument_type, result_type, number_op=None, cmp
 
                 return frame.value(func(get_lvalue, get_rvalue))
 
+        @with_source_location
         def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
             if not self.missing_operands_exception:
                 if number_op:
@@ -1091,6 +1463,7 @@ class TransformOp(Opcode):
                 return frame.unwind(self.output, NO_VALUE, None, None)
         raise FatalError()
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         if self.expression is None:
             return compile_statement("""
@@ -1306,6 +1679,9 @@ class CommaOp(Opcode):
     def __init__(self, data, visitor):
         super(CommaOp, self).__init__(data, visitor)
         self.opcodes = [ enrich_opcode(o, visitor) for o in data.opcodes ]
+        for opcode in self.opcodes[:-1]:
+            if isinstance(opcode, (ForEachOp, RangeLoopOp)):
+                opcode.value_is_ignored = True
 
     def get_break_types(self, context, frame_manager, immediate_context=None):
         break_types = BreakTypesFactory(self)
@@ -1330,6 +1706,7 @@ class CommaOp(Opcode):
 
             return frame.value(value)
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         asts = [
             e.to_ast(context_name, dependency_builder, will_ignore_return_value if i == len(self.opcodes) - 1 else True)
@@ -1400,6 +1777,7 @@ class LoopOp(Opcode):
 
         raise FatalError()
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         return compile_statement("""
 while(True):
@@ -1459,6 +1837,7 @@ class ConditionalOp(Opcode):
 
             return frame.value(result)
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         if will_ignore_return_value:
             return compile_statement("""
@@ -1570,11 +1949,12 @@ class CloseOp(Opcode):
             if not isinstance(open_function, OpenFunction):
                 return frame.exception(self.INVALID_FUNCTION())
 
-            if (is_debug() or self.outer_context_type_error) and not does_value_fit_through_type(outer_context, open_function.outer_type):
+            if (is_debug() or self.outer_context_type_error) and not does_value_or_context_fit_through_type(outer_context, open_function.outer_type):
                 return frame.exception(self.INVALID_OUTER_CONTEXT())
 
             return frame.value(open_function.close(outer_context))
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
         return compile_expression("""
 {open_function}.close({outer_context})
@@ -1611,8 +1991,9 @@ class StaticOp(Opcode):
             self.lazy_initialize(context, frame_manager, immediate_context)
             return frame.unwind("value", self.value, None, None)
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
-        if self.mode == "value":
+        if self.value is not MISSING:
             return compile_expression(
                 "{static_value}",
                 context_name,
@@ -1631,6 +2012,7 @@ class InvokeOp(Opcode):
         super(InvokeOp, self).__init__(data, visitor)
         self.function = enrich_opcode(data.function, visitor)
         self.argument = enrich_opcode(data.argument, visitor)
+        self.argument_is_template = isinstance(self.argument, (ObjectTemplateOp, ListTemplateOp))
         self.invalid_argument_type_exception_is_possible = True
 
     def get_break_types(self, context, frame_manager, immediate_context=None):
@@ -1665,11 +2047,21 @@ class InvokeOp(Opcode):
 
     def jump(self, context, frame_manager, immediate_context=None):
         logger.debug("Invoke:jump")
-        from lockdown.executor.function import RDHFunction
+        from lockdown.executor.function import RDHFunction, ClosedFunction
 
         with frame_manager.get_next_frame(self) as frame:
             function = frame.step("function", lambda: evaluate(self.function, context, frame_manager))
-            argument = frame.step("argument", lambda: evaluate(self.argument, context, frame_manager))
+
+            argument_context = None
+            if (self.argument_is_template
+                and not self.invalid_argument_type_exception_is_possible
+                and function.__class__ is ClosedFunction
+                and not function.open_function.argument_escapes
+            ):
+                # The template can be built without a manager, see does_argument_escape
+                argument_context = { "escapes": False }
+
+            argument = frame.step("argument", lambda: evaluate(self.argument, context, frame_manager, argument_context))
 
             if not isinstance(function, RDHFunction):
                 return frame.exception(self.INVALID_FUNCTION_TYPE(), self)
@@ -1680,14 +2072,24 @@ class InvokeOp(Opcode):
 
         raise FatalError()
 
+    @with_source_location
     def to_ast(self, context_name, dependency_builder, will_ignore_return_value=False):
-        from lockdown.executor.function import OpenFunction
-        if (isinstance(self.function, CloseOp)
-            and isinstance(self.function.function, StaticOp)
-            and isinstance(self.function.function.value, OpenFunction)
-            and self.function.function.mode == "value"
+        from lockdown.executor.builtins import BuiltinFunction
+
+        if (isinstance(self.function, StaticOp)
+            and isinstance(self.function.value, BuiltinFunction)
+            and not self.invalid_argument_type_exception_is_possible
         ):
-            open_function = self.function.function.value
+            # Builtins never restart, so their Python implementation can be called directly
+            return compile_expression(
+                "{wrapped}({argument}, _frame_manager)",
+                context_name, dependency_builder,
+                wrapped=self.function.value.wrapped,
+                argument=self.argument.to_ast(context_name, dependency_builder)
+            )
+
+        open_function = get_static_open_function(self.function)
+        if open_function:
             if will_ignore_return_value:
                 # to_inline_ast can return None if it's not possible to inline the open function
                 inline_ast = open_function.to_inline_ast(
@@ -1808,6 +2210,109 @@ class MatchOp(Opcode):
 #         flow_manager.value(value)
 
 
+# Opcodes that can hand the context, or values read from it, to code we can not see
+ARGUMENT_ESCAPING_OPCODES = ( ShiftOp, PrepareOp, DynamicDereferenceOp )
+
+
+def get_child_opcodes(opcode):
+    for value in vars(opcode).values():
+        for child in get_opcodes(value):
+            yield child
+
+def get_opcodes(value):
+    if isinstance(value, Opcode):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            for opcode in get_opcodes(v):
+                yield opcode
+
+def is_literal_dereference(opcode):
+    return isinstance(opcode, DereferenceOp) and isinstance(opcode.reference, LiteralOp)
+
+def does_argument_escape(*opcodes):
+    """
+    Returns False if the only use these opcodes make of the argument is to read its fields with
+    literal references, such as argument.foo or argument.0. A function with such opcodes can be
+    given an ObjectRecord or ListRecord for its argument, since nothing can keep a reference to
+    it, or bind types to it, after the function returns.
+    """
+    stack = [ (opcode, None) for opcode in opcodes ]
+    while stack:
+        opcode, parent = stack.pop()
+
+        if isinstance(opcode, ARGUMENT_ESCAPING_OPCODES):
+            return True
+        if isinstance(opcode, ContextOp):
+            # Only reached when the context is used as a whole, rather than dereferenced
+            return True
+
+        children = list(get_child_opcodes(opcode))
+
+        if isinstance(opcode, DereferenceOp) and isinstance(opcode.of, ContextOp):
+            if not isinstance(opcode.reference, LiteralOp):
+                return True
+            if opcode.reference.value == "argument" and not (is_literal_dereference(parent) and parent.of is opcode):
+                return True
+            children.remove(opcode.of)
+
+        stack.extend((child, opcode) for child in children)
+
+    return False
+
+def is_literal_field_access(opcode):
+    return isinstance(opcode, (DereferenceOp, AssignmentOp)) and isinstance(opcode.reference, LiteralOp)
+
+def does_local_escape(*opcodes):
+    """
+    Returns False if the only use these opcodes make of the local is to read or assign its fields
+    with literal references, such as local.foo or local.foo = 3. If the context does not escape
+    either, see does_context_escape, the local can be a LocalRecord, since nothing else can reach it.
+    """
+    stack = [ (opcode, None) for opcode in opcodes ]
+    while stack:
+        opcode, parent = stack.pop()
+
+        if (isinstance(opcode, DereferenceOp) and isinstance(opcode.of, ContextOp)
+            and isinstance(opcode.reference, LiteralOp) and opcode.reference.value == "local"
+        ):
+            if not (is_literal_field_access(parent) and parent.of is opcode):
+                return True
+
+        stack.extend((child, opcode) for child in get_child_opcodes(opcode))
+
+    return False
+
+def does_context_escape(*opcodes):
+    """
+    Returns False if the only use these opcodes make of the context is to read or assign its
+    slots with literal references, such as local.foo or argument. A function with such opcodes
+    can run in an ExecutionContext, since nothing can keep a reference to the context itself.
+    Everything else, such as returning the context or closing a function over it, needs an
+    RDHObject context that can be managed and transpiled.
+    """
+    stack = list(opcodes)
+    while stack:
+        opcode = stack.pop()
+
+        if isinstance(opcode, ARGUMENT_ESCAPING_OPCODES):
+            return True
+        if isinstance(opcode, ContextOp):
+            # Only reached when the context is used as a whole, rather than dereferenced
+            return True
+
+        children = list(get_child_opcodes(opcode))
+
+        if isinstance(opcode, (DereferenceOp, AssignmentOp)) and isinstance(opcode.of, ContextOp):
+            if not isinstance(opcode.reference, LiteralOp):
+                return True
+            children.remove(opcode.of)
+
+        stack.extend(children)
+
+    return False
+
+
 OPCODES = {
     "nop": Nop,
     "transform": TransformOp,
@@ -1865,6 +2370,8 @@ OPCODES = {
     "assignment": AssignmentOp,
     "insert": InsertOp,
     "map": MapOp,
+    "for_each": ForEachOp,
+    "range_loop": RangeLoopOp,
     "context": ContextOp,
     "comma": CommaOp,
     "loop": LoopOp,
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+from contextlib import contextmanager
+import marshal
+import signal
+from timeit import default_timer
+
+from lockdown.executor.ast_utils import is_transpiled_filename
+from lockdown.executor.function import ClosedFunction, \
+    get_transpiled_open_function
+from lockdown.executor.opcodes import Opcode
+from lockdown.type_system.exceptions import FatalError
+
+
+class ProfileEntry(object):
+    """
+    What an OpcodeProfiler measured for one opcode, or one Lockdown function, in the source.
+
+    cumulative_time only counts the outermost of any recursive invocations, as cProfile does.
+    callers holds the calls and time spent for each key that invoked this one.
+    """
+    __slots__ = [ "key", "calls", "primitive_calls", "self_time", "cumulative_time", "callers" ]
+
+    def __init__(self, key):
+        self.key = key
+        self.calls = 0
+        self.primitive_calls = 0
+        self.self_time = 0.0
+        self.cumulative_time = 0.0
+        self.callers = {}
+
+
+def get_opcode_classes(opcode_class=Opcode):
+    # Includes the classes that BinaryOp builds for OPCODES
+    for subclass in opcode_class.__subclasses__():
+        yield subclass
+        for descendant in get_opcode_classes(subclass):
+            yield descendant
+
+def get_opcode_key(opcode):
+    # Not every opcode keeps its data
+    data = getattr(opcode, "data", None)
+    return (
+        getattr(data, "opcode", type(opcode).__name__),
+        getattr(data, "line", None),
+        getattr(data, "column", None)
+    )
+
+def get_function_key(closed_function):
+    return get_open_function_key(closed_function.open_function)
+
+def get_open_function_key(open_function):
+    data = open_function.data
+    return ("function", getattr(data, "line", None), getattr(data, "column", None))
+
+def format_key(key):
+    name, line, column = key
+    if line is None:
+        return name
+    if column is None:
+        return "{}@{}".format(name, line)
+    return "{}@{}:{}".format(name, line, column)
+
+def format_collapsed_stacks(weights):
+    # The collapsed format that flamegraph.pl and speedscope read
+    return "".join(
+        "{} {}\n".format(";".join(format_key(key) for key in stack), weight)
+        for stack, weight in sorted(weights)
+    )
+
+def get_source_line(source_lines, line):
+    return source_lines[line - 1].strip() if 0 < line <= len(source_lines) else ""
+
+def write_text(output_file, text):
+    with open(output_file, "wb") as output:
+        output.write(text.encode("utf-8"))
+
+
+ACTIVE_PROFILER = None
+
+
+class OpcodeProfiler(object):
+    """
+    Counts the invocations of, and the time spent in, each opcode and each Lockdown function that
+    the interpreter runs, keyed by (opcode name or "function", line, column).
+
+    Opcodes without a line or column of their own take them from the opcode or function that
+    invoked them.
+
+    enable() replaces Opcode.jump on every opcode class, and ClosedFunction.invoke, with timed
+    versions, and disable() puts the originals back, so there is no cost at all while no profiler
+    is enabled. Transpiled code only reaches jump for the opcodes that it could not transpile, so
+    the interpreted mode gives the complete picture.
+    """
+    def __init__(self, filename="<lockdown>"):
+        self.filename = filename
+        self.entries = {}
+        # The self time of each stack of keys, for flamegraphs
+        self.stacks = defaultdict(float)
+        # The self and cumulative time and invocations of each line
+        self.lines = defaultdict(lambda: [ 0, 0.0, 0.0 ])
+        self.stack = []
+        self.active_keys = defaultdict(int)
+        self.active_lines = defaultdict(int)
+        self.originals = []
+
+    def enable(self):
+        global ACTIVE_PROFILER
+        if ACTIVE_PROFILER is not None:
+            raise FatalError()
+        ACTIVE_PROFILER = self
+
+        for opcode_class in get_opcode_classes():
+            if "jump" in opcode_class.__dict__:
+                self.replace(opcode_class, "jump", get_opcode_key)
+        self.replace(ClosedFunction, "invoke", get_function_key)
+
+    def disable(self):
+        global ACTIVE_PROFILER
+        if ACTIVE_PROFILER is not self:
+            raise FatalError()
+        ACTIVE_PROFILER = None
+
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+
+    def replace(self, owner, name, get_key):
+        original = owner.__dict__[name]
+        self.originals.append((owner, name, original))
+
+        enter, leave = self.enter, self.leave
+
+        def profiled(target, *args, **kwargs):
+            frame = enter(get_key(target))
+            try:
+                return original(target, *args, **kwargs)
+            finally:
+                leave(frame, default_timer() - frame[2])
+
+        profiled.__name__ = original.__name__
+        setattr(owner, name, profiled)
+
+    def enter(self, key):
+        if key[1] is None and self.stack:
+            # Not every opcode that the parser builds has a position, so those are attributed to
+            # the position of the nearest opcode around them that has one
+            key = (key[0], ) + self.stack[-1][0][1:]
+        self.active_keys[key] += 1
+        self.active_lines[key[1]] += 1
+        # key, time spent in callees, start time
+        frame = [ key, 0.0, None ]
+        self.stack.append(frame)
+        frame[2] = default_timer()
+        return frame
+
+    def leave(self, frame, elapsed):
+        stack = self.stack
+        key, child_time, _ = frame
+        stack.pop()
+        self_time = elapsed - child_time
+
+        self.active_keys[key] -= 1
+        self.active_lines[key[1]] -= 1
+        outermost = self.active_keys[key] == 0
+
+        entry = self.entries.get(key, None)
+        if entry is None:
+            entry = self.entries[key] = ProfileEntry(key)
+        entry.calls += 1
+        entry.self_time += self_time
+        if outermost:
+            entry.primitive_calls += 1
+            entry.cumulative_time += elapsed
+
+        line = self.lines[key[1]]
+        line[0] += 1
+        line[1] += self_time
+        if self.active_lines[key[1]] == 0:
+            line[2] += elapsed
+
+        self.stacks[tuple(parent[0] for parent in stack) + (key, )] += self_time
+
+        if stack:
+            parent = stack[-1]
+            parent[1] += elapsed
+            caller = entry.callers.get(parent[0], None)
+            if caller is None:
+                caller = entry.callers[parent[0]] = [ 0, 0, 0.0, 0.0 ]
+            caller[0] += 1
+            caller[1] += 1 if outermost else 0
+            caller[2] += self_time
+            caller[3] += elapsed if outermost else 0.0
+
+    def get_line_totals(self):
+        """
+        Returns a dict of (invocations, self time, cumulative time) for each line that ran
+        """
+        return { line: tuple(totals) for line, totals in self.lines.items() }
+
+    def get_stats(self):
+        """
+        Returns the stats in the form that pstats.Stats loads from a file: a dict of
+        (cc, nc, tt, ct, callers) for each (filename, line, name).
+        """
+        def get_function(key):
+            name, line, column = key
+            return (self.filename, line or 0, name if column is None else "{}:{}".format(name, column))
+
+        stats = {}
+        for key, entry in self.entries.items():
+            callers = {
+                get_function(caller_key): (primitive_calls, calls, self_time, cumulative_time)
+                for caller_key, (calls, primitive_calls, self_time, cumulative_time) in entry.callers.items()
+            }
+            stats[get_function(key)] = (entry.primitive_calls, entry.calls, entry.self_time, entry.cumulative_time, callers)
+        return stats
+
+    def dump_stats(self, output_file):
+        with open(output_file, "wb") as output:
+            marshal.dump(self.get_stats(), output)
+
+    def get_collapsed_stacks(self):
+        """
+        Returns the stacks in the collapsed format that flamegraph.pl and speedscope read, one
+        "frame;frame;frame microseconds" line per stack.
+        """
+        return format_collapsed_stacks(
+            (stack, int(round(self_time * 1000000))) for stack, self_time in self.stacks.items()
+        )
+
+    def dump_collapsed_stacks(self, output_file):
+        write_text(output_file, self.get_collapsed_stacks())
+
+    def format_lines(self, source=None, limit=20):
+        """
+        Returns a report of the lines with the most self time, quoting them from source if given.
+        """
+        source_lines = source.splitlines() if source else []
+        lines = sorted(
+            ((line, totals) for line, totals in self.lines.items() if line is not None),
+            key=lambda item: item[1][1], reverse=True
+        )[:limit]
+
+        report = [ "{:>6} {:>10} {:>10} {:>10}  {}".format("line", "calls", "self ms", "cumul ms", "source") ]
+        for line, (calls, self_time, cumulative_time) in lines:
+            report.append("{:>6} {:>10} {:>10.2f} {:>10.2f}  {}".format(
+                line, calls, self_time * 1000, cumulative_time * 1000, get_source_line(source_lines, line)
+            ))
+        return "\n".join(report) + "\n"
+
+
+@contextmanager
+def profile_opcodes(profiler=None):
+    if profiler is None:
+        profiler = OpcodeProfiler()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+
+
+class SamplingProfiler(object):
+    """
+    Samples the python stack every interval seconds of CPU time, with signal.setitimer, and maps
+    each sample to the Lockdown stack that was running: the opcodes in Opcode.jump frames, the
+    functions in ClosedFunction.invoke frames, and the lines and functions of transpiled code.
+
+    Nothing is replaced, so the program runs as it would without the profiler between samples.
+    It relies on SIGPROF, so only profiles the main thread, on unix.
+    """
+    def __init__(self, interval=0.001, filename="<lockdown>"):
+        self.interval = interval
+        self.filename = filename
+        self.samples = 0
+        # The samples of each stack of keys, for flamegraphs
+        self.stacks = defaultdict(int)
+        # The samples that were in each line, and that were in a line below it
+        self.lines = defaultdict(lambda: [ 0, 0 ])
+        self.opcode_codes = None
+        self.previous_handler = None
+
+    def start(self):
+        self.opcode_codes = set(
+            opcode_class.__dict__["jump"].__code__ for opcode_class in get_opcode_classes()
+            if "jump" in opcode_class.__dict__
+        )
+        self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous_handler)
+
+    def get_lockdown_stack(self, frame):
+        """
+        Returns the keys of the Lockdown stack that frame is running in, outermost first
+        """
+        stack = []
+        opcode_codes = self.opcode_codes
+        invoke_code = ClosedFunction.__dict__["invoke"].__code__
+        while frame:
+            code = frame.f_code
+            if code in opcode_codes:
+                stack.append(get_opcode_key(frame.f_locals["self"]))
+            elif code is invoke_code:
+                stack.append(get_function_key(frame.f_locals["self"]))
+            elif is_transpiled_filename(code.co_filename):
+                # Transpiled code is compiled with the lines of the Lockdown code it was built from
+                stack.append(("line", frame.f_lineno, None))
+                open_function = get_transpiled_open_function(code)
+                if open_function:
+                    stack.append(get_open_function_key(open_function))
+            frame = frame.f_back
+        stack.reverse()
+        # Such as the wrapper that a transpiled ClosedFunction invokes its OpenFunction through
+        while stack and stack[0][0] == "line":
+            stack.pop(0)
+
+        # As OpcodeProfiler does, opcodes without a position take that of the opcode around them
+        for index, key in enumerate(stack):
+            if key[1] is None and index > 0:
+                stack[index] = (key[0], ) + stack[index - 1][1:]
+        return tuple(stack)
+
+    def sample(self, signum, frame):
+        stack = self.get_lockdown_stack(frame)
+        if not stack:
+            return
+        self.samples += 1
+        self.stacks[stack] += 1
+        self.lines[stack[-1][1]][0] += 1
+        for line in set(key[1] for key in stack):
+            self.lines[line][1] += 1
+
+    def get_collapsed_stacks(self):
+        return format_collapsed_stacks(self.stacks.items())
+
+    def dump_collapsed_stacks(self, output_file):
+        write_text(output_file, self.get_collapsed_stacks())
+
+    def format_lines(self, source=None, limit=20):
+        """
+        Returns a report of the lines that were running in the most samples, quoting them from
+        source if given.
+        """
+        source_lines = source.splitlines() if source else []
+        lines = sorted(
+            ((line, totals) for line, totals in self.lines.items() if line is not None),
+            key=lambda item: item[1][0], reverse=True
+        )[:limit]
+        total = max(self.samples, 1)
+
+        report = [ "{:>6} {:>10} {:>7} {:>10} {:>7}  {}".format("line", "samples", "%", "cumul", "%", "source") ]
+        for line, (samples, cumulative_samples) in lines:
+            report.append("{:>6} {:>10} {:>7.1f} {:>10} {:>7.1f}  {}".format(
+                line, samples, samples * 100.0 / total, cumulative_samples, cumulative_samples * 100.0 / total,
+                get_source_line(source_lines, line)
+            ))
+        return "\n".join(report) + "\n"
+
+
+@contextmanager
+def sample_lockdown(profiler=None):
+    if profiler is None:
+        profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from lockdown.type_system.default_composite_types import \
+    READONLY_DEFAULT_OBJECT_TYPE, READONLY_DEFAULT_LIST_TYPE
+from lockdown.type_system.exceptions import FatalError
+from lockdown.type_system.managers import UnmanagedValue
+from lockdown.utils import MISSING
+
+
+# The RawCode subclass for each set of fields, so that nodes of the same shape share one class
+raw_code_classes_by_fields = {}
+# The same, for nodes whose line is kept relative to a LineOrigin
+anchored_raw_code_classes_by_fields = {}
+
+
+class RawCode(UnmanagedValue):
+    """
+    An immutable node of the code that the parser and raw_code_factories build, such as an opcode
+    or a function literal.
+
+    Each set of fields gets its own subclass with those fields as __slots__, so that opcodes read
+    them as plain attributes. Nodes have no manager and have no types bound to them: lockdown
+    code sees every node through READONLY_DEFAULT_OBJECT_TYPE, and every RawCodeList through
+    READONLY_DEFAULT_LIST_TYPE.
+    """
+    __slots__ = []
+
+    _fields = ()
+
+    def __new__(cls, values):
+        fields = tuple(sorted(values.keys()))
+        node_class = raw_code_classes_by_fields.get(fields, None)
+        if node_class is None:
+            node_class = type(str("RawCode"), (RawCode,), {
+                "__slots__": [ str(field) for field in fields ],
+                "_fields": fields
+            })
+            raw_code_classes_by_fields[fields] = node_class
+
+        node = object.__new__(node_class)
+        for field, value in values.items():
+            object.__setattr__(node, field, value)
+        return node
+
+    def __init__(self, values):
+        pass
+
+    def __setattr__(self, key, value):
+        raise FatalError("RawCode is immutable")
+
+    def __delattr__(self, key):
+        raise FatalError("RawCode is immutable")
+
+    def get_view_type(self):
+        return READONLY_DEFAULT_OBJECT_TYPE
+
+    def get(self, key):
+        if key not in self._fields:
+            return MISSING
+        return getattr(self, key)
+
+    def _get(self, key):
+        if key not in self._fields:
+            raise AttributeError()
+        return getattr(self, key)
+
+    def _contains(self, key):
+        return key in self._fields
+
+    def _keys(self):
+        return list(self._fields)
+
+    def _values(self):
+        return [ getattr(self, field) for field in self._fields ]
+
+    def _to_dict(self):
+        return { field: getattr(self, field) for field in self._fields }
+
+    def extend(self, **values):
+        """
+        A copy of this node with values added to or replacing its fields.
+        """
+        return RawCode(dict(self._to_dict(), **values))
+
+    def __repr__(self):
+        return "RawCode<{}>".format(", ".join("{}: {}".format(field, repr(getattr(self, field))) for field in self._fields))
+
+
+class RawCodeList(UnmanagedValue, tuple):
+    """
+    An immutable list in RawCode, such as the opcodes of a comma or a template.
+    """
+    __slots__ = ()
+
+    def get_view_type(self):
+        return READONLY_DEFAULT_LIST_TYPE
+
+    def get(self, index):
+        if type(index) is not int or index < 0 or index >= len(self):
+            return MISSING
+        return self[index]
+
+    def _get(self, index):
+        if type(index) is not int or index < 0 or index >= len(self):
+            raise IndexError()
+        return self[index]
+
+    def _contains(self, index):
+        return type(index) is int and 0 <= index < len(self)
+
+    def _keys(self):
+        return range(len(self))
+
+    def _values(self):
+        return list(self)
+
+    def _to_list(self):
+        return list(self)
+
+    def __repr__(self):
+        return "RawCodeList{}".format(tuple.__repr__(self))
+
+
+class LineOrigin(object):
+    """
+    The line that a function literal starts on, in a document that is parsed incrementally. The
+    nodes anchored to it keep their lines relative to it, so that the function literal is moved
+    to other lines by changing this one, rather than by copying its code.
+    """
+    __slots__ = [ "line" ]
+
+    def __init__(self, line):
+        self.line = line
+
+
+def get_anchored_line(node):
+    return node._line_origin.line + node._line_offset
+
+def anchor_raw_code(values, origin):
+    """
+    A RawCode for values, as RawCode(values) would build, whose line follows origin when it moves.
+    """
+    fields = tuple(sorted(values.keys()))
+    node_class = anchored_raw_code_classes_by_fields.get(fields, None)
+    if node_class is None:
+        node_class = type(str("RawCode"), (RawCode,), {
+            "__slots__": [ str(field) for field in fields if field != "line" ] + [ str("_line_origin"), str("_line_offset") ],
+            "_fields": fields,
+            "line": property(get_anchored_line)
+        })
+        anchored_raw_code_classes_by_fields[fields] = node_class
+
+    node = object.__new__(node_class)
+    for field, value in values.items():
+        if field == "line":
+            object.__setattr__(node, "_line_origin", origin)
+            object.__setattr__(node, "_line_offset", value - origin.line)
+        else:
+            object.__setattr__(node, field, value)
+    return node
+
+
+def is_raw_code(value):
+    return isinstance(value, (RawCode, RawCodeList))
@@ -1,14 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from lockdown.type_system.dict_types import RDHDict
+from lockdown.executor.raw_code import RawCode, RawCodeList
 from lockdown.type_system.exceptions import FatalError
-from lockdown.type_system.list_types import RDHList
 from lockdown.type_system.object_types import RDHObject
 from lockdown.utils import spread_dict
 
 
 def is_opcode(data):
+    if isinstance(data, RawCode):
+        return data._contains("opcode")
     if not isinstance(data, RDHObject):
         raise FatalError()
     return "opcode" in data.__dict__
@@ -22,21 +23,21 @@ def check_is_opcode(data):
 def type_lit(name):
     return object_template_op({
         "type": literal_op(name)
-    }, debug_reason="type-literal")
+    })
 
 
 def unit_type(value):
     return object_template_op({
         "type": literal_op("Unit"),
         "value": literal_op(value)
-    }, debug_reason="type-literal")
+    })
 
 
 def one_of_type(types):
     return object_template_op({
         "type": literal_op("OneOf"),
         "types": list_template_op(types)
-    }, debug_reason="type-literal")
+    })
 
 
 def object_type(properties, wildcard_value_type=None, wildcard_key_type=None):
@@ -47,7 +48,7 @@ def object_type(properties, wildcard_value_type=None, wildcard_key_type=None):
     if wildcard_value_type:
         type["wildcard_value_type"] = wildcard_value_type
         type["wildcard_key_type"] = wildcard_key_type
-    return object_template_op(type, debug_reason="type-literal")
+    return object_template_op(type)
 
 
 def list_type(entry_types, wildcard_type):
@@ -57,7 +58,7 @@ def list_type(entry_types, wildcard_type):
     }
     if wildcard_type:
         type["wildcard_type"] = wildcard_type
-    return object_template_op(type, debug_reason="type-literal")
+    return object_template_op(type)
 
 
 def composite_type(properties, python_type):
@@ -75,7 +76,7 @@ def function_type(argument_type, break_types):
         "type": literal_op("Function"),
         "argument": argument_type,
         "break_types": dict_template_op(break_types)
-    }, debug_reason="type-literal")
+    })
 
 
 def build_break_types(return_type=None, exception_type=None, yield_types=None, value_type=None):
@@ -145,17 +146,17 @@ def function_lit(*args, **kwargs):
         "local_initializer": local_initializer
     }, **kwargs)
 
-    return RDHObject(func)
+    return RawCode(func)
 
 
 def literal_op(value):
-    return RDHObject({
+    return RawCode({
         "opcode": "literal",
         "value": value
-    }, debug_reason="code")
+    })
 
 
-def object_template_op(values, debug_reason="code", **kwargs):
+def object_template_op(values, **kwargs):
     values_list = []
 
     for k, v in values.items():
@@ -163,12 +164,12 @@ def object_template_op(values, debug_reason="code", **kwargs):
         if isinstance(k, basestring):
             k = literal_op(k)
 
-        values_list.append(RDHList([ k, v ]))
+        values_list.append(RawCodeList([ k, v ]))
 
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "object_template",
-        "opcodes": RDHList(values_list, debug_reason=debug_reason)
-    }, **kwargs), debug_reason=debug_reason)
+        "opcodes": RawCodeList(values_list)
+    }, **kwargs))
 
 
 def dict_template_op(values):
@@ -176,31 +177,31 @@ def dict_template_op(values):
 
     for k, v in values.items():
         check_is_opcode(v)
-        values_list.append(RDHList([ k, v ]))
+        values_list.append(RawCodeList([ k, v ]))
 
-    return RDHObject({
+    return RawCode({
         "opcode": "dict_template",
-        "opcodes": RDHList(values_list, debug_reason="code")
-    }, debug_reason="code")
+        "opcodes": RawCodeList(values_list)
+    })
 
 
 def list_template_op(values):
     for v in values:
         check_is_opcode(v)
-    return RDHObject({
+    return RawCode({
         "opcode": "list_template",
-        "opcodes": RDHList(values)
-    }, debug_reason="code")
+        "opcodes": RawCodeList(values)
+    })
 
 
 def binary_integer_op(name, lvalue, rvalue):
     check_is_opcode(lvalue)
     check_is_opcode(rvalue)
-    return RDHObject({
+    return RawCode({
         "opcode": name,
         "lvalue": lvalue,
         "rvalue": rvalue
-    }, debug_reason="code")
+    })
 
 
 def multiplication_op(lvalue, rvalue):
@@ -226,18 +227,18 @@ def equality_op(lvalue, rvalue):
 def comma_op(*opcodes):
     for v in opcodes:
         check_is_opcode(v)
-    return RDHObject({
+    return RawCode({
         "opcode": "comma",
-        "opcodes": RDHList(opcodes)
-    }, debug_reason="code")
+        "opcodes": RawCodeList(opcodes)
+    })
 
 
 def loop_op(opcode, **kwargs):
     check_is_opcode(opcode)
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "loop",
         "code": opcode
-    }, **kwargs), debug_reason="code")
+    }, **kwargs))
 
 
 def transform(*args, **kwargs):
@@ -269,17 +270,17 @@ def transform_op(*args, **kwargs):
     if input:
         op["input"] = input
         op["code"] = code
-    return RDHObject(spread_dict(op, **kwargs), debug_reason="code")
+    return RawCode(spread_dict(op, **kwargs))
 
 
 def shift_op(code, restart_type, **kwargs):
     check_is_opcode(code)
     check_is_opcode(restart_type)
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "shift",
         "code": code,
         "restart_type": restart_type
-    }, **kwargs), debug_reason="code")
+    }, **kwargs))
 
 
 def reset_op(*args, **kwargs):
@@ -303,7 +304,7 @@ def reset_op(*args, **kwargs):
         result["function"] = function
         result["argument"] = argument
 
-    return RDHObject(spread_dict(result, **kwargs), debug_reason="code")
+    return RawCode(spread_dict(result, **kwargs))
 
 
 def return_op(code):
@@ -357,111 +358,139 @@ def continue_op(code):
 
 
 def context_op(**kwargs):
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "context",
-    }, **kwargs), debug_reason="code")
+    }, **kwargs))
 
 
 def is_op(expression, type, **kwargs):
     check_is_opcode(expression)
     check_is_opcode(type)
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "is",
         "expression": expression,
         "type": type
-    }, **kwargs), debug_reason="code")
+    }, **kwargs))
 
 
 def dereference_op(of, reference, safe, **kwargs):
     check_is_opcode(of)
     check_is_opcode(reference)
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "dereference",
         "of": of,
         "reference": reference,
         "safe": safe
-    }, **kwargs), debug_reason="code")
+    }, **kwargs))
 
 
 def dynamic_dereference_op(reference, **kwargs):
     if not isinstance(reference, basestring):
         raise FatalError()
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "dynamic_dereference",
         "reference": reference
-    }, **kwargs), debug_reason="code")
+    }, **kwargs))
 
 
 def assignment_op(of, reference, rvalue, **kwargs):
     check_is_opcode(of)
     check_is_opcode(reference)
     check_is_opcode(rvalue)
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "assignment",
         "of": of,
         "reference": reference,
         "rvalue": rvalue
-    }, **kwargs), debug_reason="code")
+    }, **kwargs))
 
 
 def insert_op(of, reference, rvalue):
     check_is_opcode(of)
     check_is_opcode(reference)
     check_is_opcode(rvalue)
-    return RDHObject({
+    return RawCode({
         "opcode": "insert",
         "of": of,
         "reference": reference,
         "rvalue": rvalue
-    }, debug_reason="code")
+    })
 
 
 def map_op(composite, mapper):
     check_is_opcode(composite)
     check_is_opcode(mapper)
-    return RDHObject({
+    return RawCode({
         "opcode": "map",
         "composite": composite,
         "mapper": mapper
-    }, debug_reason="code")
+    })
+
+
+def for_each_op(composite, iterator, body, **kwargs):
+    check_is_opcode(composite)
+    check_is_opcode(body)
+    return RawCode(spread_dict({
+        "opcode": "for_each",
+        "composite": composite,
+        "iterator": iterator,
+        "body": body
+    }, kwargs))
+
+
+def range_loop_op(range_function, start, end, iterator, body, generic, **kwargs):
+    check_is_opcode(range_function)
+    check_is_opcode(start)
+    check_is_opcode(end)
+    check_is_opcode(body)
+    check_is_opcode(generic)
+    return RawCode(spread_dict({
+        "opcode": "range_loop",
+        "range_function": range_function,
+        "start": start,
+        "end": end,
+        "iterator": iterator,
+        "body": body,
+        "generic": generic
+    }, kwargs))
 
 
 def condition_op(condition, when_true, when_false):
     check_is_opcode(condition)
     check_is_opcode(when_true)
     check_is_opcode(when_false)
-    return RDHObject({
+    return RawCode({
         "opcode": "conditional",
         "condition": condition,
         "when_true": when_true,
         "when_false": when_false
-    }, debug_reason="code")
+    })
 
 
 def prepare_op(function_expression, **kwargs):
     check_is_opcode(function_expression)
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "prepare",
         "code": function_expression
-    }, **kwargs), debug_reason="code")
+    }, **kwargs))
 
 
 def close_op(function, context, **kwargs):
     check_is_opcode(function)
     check_is_opcode(context)
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "close",
         "function": function,
         "outer_context": context
-    }, **kwargs), debug_reason="code")
+    }, **kwargs))
 
 
 def static_op(expression, **kwargs):
     check_is_opcode(expression)
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "static",
         "code": expression
-    }, **kwargs), debug_reason="code")
+    }, **kwargs))
 
 
 def invoke_op(function_expression, argument_expression=None, **kwargs):
@@ -471,26 +500,26 @@ def invoke_op(function_expression, argument_expression=None, **kwargs):
         argument_expression = nop()
     check_is_opcode(function_expression)
     check_is_opcode(argument_expression)
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "invoke",
         "function": function_expression,
         "argument": argument_expression
-    }, kwargs), debug_reason="code")
+    }, kwargs))
 
 
 def match_op(value_expression, matchers):
     check_is_opcode(value_expression)
     for matcher in matchers:
         check_is_opcode(matcher)
-    return RDHObject({
+    return RawCode({
         "opcode": "match",
         "value": value_expression,
-        "matchers": RDHList(matchers)
-    }, debug_reason="code")
+        "matchers": RawCodeList(matchers)
+    })
 
 
 def nop():
-    return RDHObject({ "opcode": "nop" }, debug_reason="code")
+    return RawCode({ "opcode": "nop" })
 
 
 def no_value_type():
@@ -522,7 +551,7 @@ def combine_opcodes(opcodes):
     for opcode in opcodes:
         check_is_opcode(opcode)
     for opcode in opcodes:
-        if opcode.__dict__["opcode"] == "comma":
+        if opcode.opcode == "comma":
             flattened_opcodes.extend(opcode.opcodes)
         else:
             flattened_opcodes.append(opcode)
@@ -545,21 +574,21 @@ def const_string_type():
 def unbound_dereference(name, **kwargs):
     if not isinstance(name, basestring):
         raise FatalError()
-    return RDHObject(spread_dict({
+    return RawCode(spread_dict({
         "opcode": "unbound_dereference",
         "reference": name
-    }, **kwargs), debug_reason="code")
+    }, **kwargs))
 
 
 def unbound_assignment(name, rvalue):
     if not isinstance(name, basestring):
         raise FatalError()
     check_is_opcode(rvalue)
-    return RDHObject({
+    return RawCode({
         "opcode": "unbound_assignment",
         "reference": name,
         "rvalue": rvalue
-    }, debug_reason="code")
+    })
 
 
 def prepare_function_lit(function_lit, **kwargs):
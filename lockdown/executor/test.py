@@ -4,8 +4,14 @@ from __future__ import unicode_literals
 from unittest import main
 from unittest.case import TestCase
 
-from lockdown.executor.bootstrap import bootstrap_function
+from lockdown.executor.bootstrap import bootstrap_function, prepare_function, \
+    get_default_global_context
+from lockdown.executor.execution_context import LocalRecord, \
+    get_local_record_class, bind_type_to_value
 from lockdown.executor.function import prepare
+from lockdown.executor.opcodes import TypeErrorFactory, get_mapped_list_type, OPCODES, \
+    evaluate
+from lockdown.executor.raw_code import RawCode, RawCodeList
 from lockdown.executor.raw_code_factories import function_lit, no_value_type, \
     build_break_types, int_type, literal_op, return_op, addition_op, \
     dereference_op, context_op, comma_op, any_type, object_type, \
@@ -13,14 +19,16 @@ from lockdown.executor.raw_code_factories import function_lit, no_value_type, \
     equality_op, nop, inferred_type, infer_all, invoke_op, static_op, prepare_op, \
     unbound_dereference, match_op, dereference, prepared_function, one_of_type, \
     string_type, bool_type, try_catch_op, throw_op, const_string_type, \
-    function_type, close_op, shift_op
-from lockdown.type_system.core_types import IntegerType, StringType
+    function_type, close_op, shift_op, map_op, list_template_op, continue_op
+from lockdown.type_system.composites import does_value_fit_through_type
+from lockdown.type_system.core_types import IntegerType, StringType, AnyType
 from lockdown.type_system.default_composite_types import DEFAULT_OBJECT_TYPE, \
-    rich_composite_type
+    rich_composite_type, READONLY_DEFAULT_OBJECT_TYPE, readonly_rich_composite_type
+from lockdown.type_system.exceptions import FatalError
 from lockdown.type_system.list_types import RDHList, RDHListType
-from lockdown.type_system.managers import get_manager
+from lockdown.type_system.managers import get_manager, get_type_of_value
 from lockdown.type_system.object_types import RDHObject, RDHObjectType
-from lockdown.utils import NO_VALUE, set_debug
+from lockdown.utils import NO_VALUE, MISSING, set_debug, runtime_type_information
 from lockdown.executor.flow_control import FrameManager
 
 
@@ -680,6 +688,295 @@ class TestUnboundReference(TestCase):
         self.assertEquals(result.value, 42)
 
 
+class TestExecutionContext(TestCase):
+    def test_argument_from_context(self):
+        argument = RDHObject({ "foo": 39 })
+        result = bootstrap_function(
+            function_lit(
+                object_type({ "foo": int_type() }), infer_all(),
+                return_op(dereference_op(context_op(), literal_op("argument"), True))
+            ), check_safe_exit=True, argument=argument
+        )
+
+        self.assertEquals(result.caught_break_mode, "return")
+        self.assertIs(result.value, argument)
+
+    def test_local_types_unbound_after_invocation(self):
+        result = bootstrap_function(
+            function_lit(
+                no_value_type(), infer_all(),
+                object_type({ "bar": int_type() }),
+                object_template_op({ "bar": literal_op(3) }),
+                return_op(dereference_op(context_op(), literal_op("local"), True))
+            ), check_safe_exit=True
+        )
+
+        self.assertEquals(result.caught_break_mode, "return")
+        self.assertEquals(result.value._get("bar"), 3)
+        self.assertEquals(get_manager(result.value).attached_types, {})
+
+    def test_escaping_context_is_detected(self):
+        def context_escapes(*code):
+            return prepare(
+                function_lit(no_value_type(), infer_all(), *code), RDHObject({}), FrameManager()
+            ).context_escapes
+
+        self.assertFalse(context_escapes(return_op(dereference_op(context_op(), literal_op("argument"), True))))
+        self.assertTrue(context_escapes(return_op(context_op())))
+
+    def test_closed_locals_are_records(self):
+        def build_function():
+            return function_lit(
+                no_value_type(), infer_all(),
+                object_type({ "bar": int_type() }),
+                object_template_op({ "bar": literal_op(3) }),
+                comma_op(
+                    assignment_op(dereference("local"), literal_op("bar"), literal_op(39)),
+                    return_op(addition_op(dereference("local.bar"), literal_op(3)))
+                )
+            )
+
+        open_function = prepare(build_function(), RDHObject({}), FrameManager())
+        self.assertFalse(open_function.local_escapes)
+
+        record_class = get_local_record_class(open_function.local_type)
+        self.assertIs(get_local_record_class(open_function.local_type), record_class)
+        self.assertEquals(record_class.__slots__, [ "bar" ])
+
+        local = evaluate(open_function.local_initializer, None, FrameManager(), { "record_class": record_class })
+        self.assertIsInstance(local, record_class)
+        self.assertFalse(hasattr(local, "__dict__"))
+        self.assertIsNone(get_manager(local))
+        self.assertEquals(local.get("bar"), 3)
+        self.assertTrue(local.set("bar", 5))
+        self.assertEquals(local.bar, 5)
+        self.assertFalse(local.set("baz", 5))
+        self.assertIs(local.get("baz"), MISSING)
+
+        # bootstrap_function prepares the function again, with a local type and record class of its own
+        assignments = []
+        set_field = LocalRecord.set
+        def record_assignment(record, key, value):
+            assignments.append((key, value))
+            return set_field(record, key, value)
+
+        LocalRecord.set = record_assignment
+        try:
+            result = bootstrap_function(build_function(), check_safe_exit=True)
+        finally:
+            LocalRecord.set = set_field
+
+        self.assertEquals(result.caught_break_mode, "return")
+        self.assertEquals(result.value, 42)
+        self.assertEquals(assignments, [ ("bar", 39) ])
+
+    def test_record_fields_are_bound(self):
+        baz_type = object_type({ "bam": int_type() })
+        open_function = prepare(
+            function_lit(
+                no_value_type(), infer_all(),
+                object_type({ "baz": baz_type }),
+                object_template_op({ "baz": object_template_op({ "bam": literal_op(1) }) }),
+                return_op(dereference("local.baz.bam"))
+            ), RDHObject({}), FrameManager()
+        )
+        record_class = get_local_record_class(open_function.local_type)
+        field_type = open_function.local_type.get_micro_op_type(("get", "baz")).value_type
+
+        old_baz, new_baz = RDHObject({ "bam": 1 }), RDHObject({ "bam": 2 })
+        local = record_class({ "baz": old_baz })
+        bind_type_to_value(local, open_function.local_type)
+        local.set("baz", new_baz)
+
+        if runtime_type_information():
+            self.assertNotIn(id(field_type), get_manager(old_baz).attached_types)
+            self.assertIn(id(field_type), get_manager(new_baz).attached_types)
+
+    def test_escaping_locals_are_detected(self):
+        def local_escapes(*code):
+            return prepare(
+                function_lit(
+                    no_value_type(), infer_all(),
+                    object_type({ "bar": int_type() }),
+                    object_template_op({ "bar": literal_op(3) }),
+                    *code
+                ), RDHObject({}), FrameManager()
+            ).local_escapes
+
+        self.assertFalse(local_escapes(return_op(dereference("local.bar"))))
+        self.assertTrue(local_escapes(return_op(dereference_op(context_op(), literal_op("local"), True))))
+        self.assertTrue(local_escapes(return_op(context_op())))
+
+    def test_open_shapes_have_no_record_class(self):
+        self.assertIsNone(get_local_record_class(RDHObjectType({ "foo": IntegerType() }, wildcard_value_type=AnyType())))
+        self.assertIsNone(get_local_record_class(RDHObjectType({ "get": IntegerType() })))
+        self.assertIsNone(get_local_record_class(IntegerType()))
+
+    def test_returned_context_is_managed(self):
+        def build_function():
+            return function_lit(
+                no_value_type(), infer_all(),
+                object_type({ "bar": int_type() }),
+                object_template_op({ "bar": literal_op(3) }),
+                return_op(context_op())
+            )
+
+        for transpile in (False, True):
+            result = bootstrap_function(build_function(), check_safe_exit=True, transpile=transpile)
+
+            self.assertEquals(result.caught_break_mode, "return")
+            self.assertIsInstance(result.value, RDHObject)
+            self.assertEquals(result.value._get("local")._get("bar"), 3)
+            self.assertIsNotNone(get_type_of_value(result.value))
+
+
+class TestRawCode(TestCase):
+    def test_nodes_are_immutable(self):
+        node = literal_op(3)
+        self.assertIsInstance(node, RawCode)
+        with self.assertRaises(FatalError):
+            node.value = 4
+
+    def test_nodes_of_a_shape_share_a_class(self):
+        self.assertIs(type(literal_op(3)), type(literal_op("foo")))
+        self.assertIsNot(type(literal_op(3)), type(nop()))
+        self.assertIsInstance(comma_op(nop(), nop()).opcodes, RawCodeList)
+
+    def test_nodes_have_no_managers(self):
+        func = function_lit(no_value_type(), build_break_types(int_type()), return_op(literal_op(42)))
+        result = bootstrap_function(func, check_safe_exit=True)
+        self.assertEquals(result.value, 42)
+        self.assertIsNone(get_manager(func))
+        self.assertIsNone(get_manager(func.code))
+
+    def test_nodes_are_seen_as_readonly(self):
+        node = literal_op(3)
+        self.assertTrue(does_value_fit_through_type(node, READONLY_DEFAULT_OBJECT_TYPE))
+        self.assertTrue(does_value_fit_through_type(node, readonly_rich_composite_type))
+        # Without runtime type information DEFAULT_OBJECT_TYPE has no setters, so is readonly too
+        if runtime_type_information():
+            self.assertFalse(does_value_fit_through_type(node, DEFAULT_OBJECT_TYPE))
+
+    def test_code_can_read_nodes(self):
+        result = bootstrap_function(
+            function_lit(
+                return_op(dereference_op(literal_op(literal_op(42)), literal_op("value"), True))
+            )
+        )
+        self.assertEquals(result.caught_break_mode, "return")
+        self.assertEquals(result.value, 42)
+
+
+class TestArgumentEscapes(TestCase):
+    def argument_escapes(self, *code):
+        return prepare(
+            function_lit(object_type({ "foo": int_type() }), infer_all(), *code),
+            RDHObject({}), FrameManager()
+        ).argument_escapes
+
+    def test_field_reads_do_not_escape(self):
+        self.assertFalse(self.argument_escapes(
+            return_op(addition_op(dereference("argument.foo"), dereference("argument.foo")))
+        ))
+
+    def test_locals_do_not_escape(self):
+        self.assertFalse(self.argument_escapes(
+            object_type({ "bar": int_type() }),
+            object_template_op({ "bar": dereference("argument.foo") }),
+            return_op(dereference("local.bar"))
+        ))
+
+    def test_returned_argument_escapes(self):
+        self.assertTrue(self.argument_escapes(return_op(dereference("argument"))))
+
+    def test_assigned_argument_escapes(self):
+        self.assertTrue(self.argument_escapes(
+            assignment_op(dereference("argument"), literal_op("foo"), literal_op(3))
+        ))
+
+    def test_context_escapes(self):
+        self.assertTrue(self.argument_escapes(return_op(context_op())))
+
+
+class TestMapOp(TestCase):
+    def build_function(self):
+        return function_lit(
+            no_value_type(), infer_all(),
+            return_op(map_op(
+                list_template_op([ literal_op(1), literal_op(2) ]),
+                prepared_function(
+                    int_type(), infer_all(),
+                    continue_op(addition_op(dereference("argument"), literal_op(1)))
+                )
+            ))
+        )
+
+    def test_values_are_mapped(self):
+        result = bootstrap_function(self.build_function(), check_safe_exit=True)
+
+        self.assertEquals(result.caught_break_mode, "return")
+        self.assertEquals(result.value._to_list(), [ 2, 3 ])
+
+    def test_result_type_holds_the_continue_type(self):
+        break_types = prepare_function(self.build_function(), get_default_global_context(), True).break_types
+        result_type = break_types["return"][0]["out"]
+
+        self.assertTrue(result_type.is_self_consistent())
+        for tag in [ ("get", 0), ("set", 0), ("get", 1), ("set", 1), ("get-wildcard",), ("set-wildcard",) ]:
+            self.assertIsInstance(result_type.get_micro_op_type(tag).value_type, IntegerType)
+
+    def test_skipped_elements_drop_indexes(self):
+        composite_type = RDHListType([ IntegerType(), IntegerType() ], None)
+
+        self.assertIsNotNone(get_mapped_list_type(composite_type, StringType(), False, "test").get_micro_op_type(("set", 1)))
+        self.assertIsNone(get_mapped_list_type(composite_type, StringType(), True, "test").get_micro_op_type(("set", 1)))
+
+
+class TestTypeErrorFactory(TestCase):
+    def test_types_are_shared(self):
+        factory = TypeErrorFactory("Test: error")
+        self.assertIs(factory.get_type(), factory.get_type())
+
+        first = factory(message="Test: error 1")
+        second = factory(message="Test: error 2")
+        self.assertEquals(get_manager(first).attached_types.values(), [ factory.get_type() ])
+        self.assertEquals(get_manager(second).attached_types.values(), [ factory.get_type() ])
+
+    def test_errors_fit_their_types(self):
+        factory = TypeErrorFactory("Test: error")
+        error = factory(reference="foo")
+
+        self.assertEquals(error._get("message"), "Test: error")
+        self.assertEquals(error._get("kwargs"), { "reference": "foo" })
+        self.assertIn(id(factory.get_type()), get_manager(error).attached_types)
+        self.assertTrue(does_value_fit_through_type(error, factory.get_type()))
+
+    def test_error_kwargs_are_bound(self):
+        factory = TypeErrorFactory("Test: error")
+        error = factory(reference="foo")
+
+        kwargs_type = factory.get_type().get_micro_op_type(("get", "kwargs")).value_type
+        self.assertIn(id(kwargs_type), get_manager(error._get("kwargs")).attached_types)
+
+    def test_failed_dereferences_share_their_type(self):
+        def dereference_missing(reference):
+            return function_lit(
+                no_value_type(), infer_all(), dereference_op(context_op(), literal_op(reference), True)
+            )
+
+        error_type = OPCODES["dereference"].INVALID_DEREFERENCE.get_type()
+
+        for reference in [ "foo", "bar" ]:
+            code = dereference_missing(reference)
+            opcode = prepare_function(code, get_default_global_context()).code
+            self.assertEquals([ break_type["out"] for break_type in opcode.break_types["exception"] ], [ error_type ])
+
+            result = bootstrap_function(code)
+            self.assertEquals(result.caught_break_mode, "exception")
+            self.assertEquals(result.value._get("message"), "DereferenceOp: invalid_dereference {}".format(reference))
+            self.assertEquals(get_manager(result.value).attached_types.values(), [ error_type ])
+
+
 class TestMatch(TestCase):
     def test_interesting(self):
         func = function_lit(
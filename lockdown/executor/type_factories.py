@@ -6,7 +6,8 @@ from collections import OrderedDict
 from lockdown.executor.exceptions import PreparationException
 from lockdown.executor.function_type import enrich_break_type, \
     ClosedFunctionType
-from lockdown.type_system.composites import InferredType, CompositeType
+from lockdown.type_system.composites import InferredType, CompositeType, \
+    get_bound_value
 from lockdown.type_system.core_types import UnitType, OneOfType, Const, AnyType, \
     IntegerType, BooleanType, NoValueType, StringType
 from lockdown.type_system.default_composite_types import DEFAULT_DICT_TYPE
@@ -55,7 +56,8 @@ def build_one_of_type(data):
 
 def build_object_type(data):
     properties = {}
-    for name, type in data.properties.__dict__.items():
+    for name in data.properties._keys():
+        type = get_bound_value(data.properties, name)
         properties[name] = enrich_type(type)
         if getattr(type, "const", False):
             properties[name] = Const(properties[name])
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from lockdown.executor.raw_code import RawCode, RawCodeList, LineOrigin, \
+    anchor_raw_code
+from lockdown.parser.parser import RDHLang5Visitor
+from lockdown.parser.pratt import PrattParser, tokenize, tokenize_range
+
+
+class FunctionEntry(object):
+    """
+    A function literal in the last version of a document, and the result of visiting it.
+
+    The literal runs from offset to stop_offset, over token_count tokens, and starts on line. The
+    lines of its code are anchored to origin, which is moved to line before the code is reused.
+    children are the entries of the function literals inside this one.
+    """
+    __slots__ = [ "offset", "stop_offset", "token_count", "line", "name", "code", "origin", "children" ]
+
+    def __init__(self, offset, stop_offset, token_count, line, name, code, origin, children):
+        self.offset = offset
+        self.stop_offset = stop_offset
+        self.token_count = token_count
+        self.line = line
+        self.name = name
+        self.code = code
+        self.origin = origin
+        self.children = children
+
+    def move(self, offset_delta, line_delta):
+        return FunctionEntry(
+            self.offset + offset_delta, self.stop_offset + offset_delta, self.token_count, self.line + line_delta,
+            self.name, self.code, self.origin, [ child.move(offset_delta, line_delta) for child in self.children ]
+        )
+
+    def get_code(self):
+        # Moves this literal, and the ones inside it, to the lines they are on now
+        if self.origin.line != self.line:
+            self.origin.line = self.line
+            for child in self.children:
+                child.get_code()
+        return self.code
+
+
+def anchor_lines(value, origin, anchored=None):
+    """
+    Returns value, a RawCode or RawCodeList, with the line of every node that is not yet anchored
+    anchored to origin. Nodes that are already anchored, those of the function literals inside
+    this one, are shared with value.
+    """
+    if anchored is None:
+        anchored = {}
+
+    if isinstance(value, RawCode):
+        if id(value) in anchored:
+            return anchored[id(value)]
+        if hasattr(value, "_line_origin"):
+            return value
+
+        changed = False
+        values = {}
+        for field in value._fields:
+            child = getattr(value, field)
+            if isinstance(child, (RawCode, RawCodeList)):
+                new_child = anchor_lines(child, origin, anchored)
+                changed = changed or new_child is not child
+                child = new_child
+            values[field] = child
+
+        if values.get("line", None) is not None:
+            result = anchor_raw_code(values, origin)
+        elif changed:
+            result = RawCode(values)
+        else:
+            result = value
+        anchored[id(value)] = result
+        return result
+
+    new_values = [
+        anchor_lines(child, origin, anchored) if isinstance(child, (RawCode, RawCodeList)) else child
+        for child in value
+    ]
+    if all(new is old for new, old in zip(new_values, value)):
+        return value
+    return RawCodeList(new_values)
+
+
+def get_common_prefix_length(a, b):
+    # Compares slices rather than characters, so that the work is done in C
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def get_common_suffix_length(a, b, limit):
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:len(a) - low] == b[len(b) - middle:len(b) - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def get_first_token_at(tokens, offset):
+    low, high = 0, len(tokens)
+    while low < high:
+        middle = (low + high) // 2
+        if tokens[middle].offset < offset:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class ReusedFunctionContext(object):
+    """
+    Stands in for the Context of a function literal whose tokens have not changed, so that
+    visiting it returns the code built for it before.
+    """
+    __slots__ = [ "entry", "start", "stop" ]
+
+    def __init__(self, entry, start, stop):
+        self.entry = entry
+        self.start = start
+        self.stop = stop
+
+    def accept(self, visitor):
+        return visitor.visitReusedFunction(self)
+
+
+class IncrementalPrattParser(PrattParser):
+    def __init__(self, tokens, reusable_entries):
+        super(IncrementalPrattParser, self).__init__(None, tokens=tokens)
+        self.reusable_entries = reusable_entries
+
+    def function(self):
+        start = self.tokens[self.position]
+        entry = self.reusable_entries.get(start.offset, None)
+        if entry:
+            stop_index = self.position + entry.token_count - 1
+            stop = self.tokens[stop_index]
+            if stop.type == "}" and stop.offset + 1 == entry.stop_offset:
+                self.position = stop_index + 1
+                return ReusedFunctionContext(entry, start, stop)
+        return super(IncrementalPrattParser, self).function()
+
+
+class IncrementalVisitor(RDHLang5Visitor):
+    def __init__(self):
+        super(IncrementalVisitor, self).__init__()
+        # The entries of the function literals visited so far, for each enclosing function literal
+        self.entries = [ [] ]
+        self.functions_reused = 0
+
+    def visitFunction(self, ctx):
+        self.entries.append([])
+        name, code = super(IncrementalVisitor, self).visitFunction(ctx)
+        children = self.entries.pop()
+
+        origin = LineOrigin(ctx.start.line)
+        code = anchor_lines(code, origin)
+        self.entries[-1].append(FunctionEntry(
+            ctx.start.offset, ctx.stop.offset + 1, ctx.stop.index - ctx.start.index + 1, ctx.start.line,
+            name, code, origin, children
+        ))
+        return name, code
+
+    def visitReusedFunction(self, ctx):
+        entry = ctx.entry
+        self.entries[-1].append(entry)
+        self.functions_reused += 1
+        return entry.name, entry.get_code()
+
+
+class IncrementalParser(object):
+    """
+    Parses successive versions of one document with the pratt backend, doing as little work for
+    each version as the edit since the last version allows:
+
+    * Only the lines from the first to the last changed line are tokenized again. The tokens
+      after them are reused, with their positions moved.
+    * Function literals whose tokens are unchanged are neither parsed nor visited again. The code
+      built for them before is reused. Its lines are anchored to the line the literal starts on,
+      so if lines were added or removed above it, the same code is moved rather than copied, and
+      the code of earlier versions moves with it.
+
+    Every version parses to the same code that parse(code, backend="pratt") would give.
+    """
+    def __init__(self):
+        self.code = None
+        self.tokens = None
+        self.entries = []
+        # What the last parse did, for tests and benchmarks
+        self.tokens_lexed = 0
+        self.functions_reused = 0
+
+    def parse(self, code):
+        try:
+            if self.code is None:
+                tokens = tokenize(code)
+                self.tokens_lexed = len(tokens)
+                reusable_entries = {}
+            else:
+                tokens, reusable_entries = self.update(code)
+
+            visitor = IncrementalVisitor()
+            ast = visitor.visit(IncrementalPrattParser(tokens, reusable_entries).json())
+        except:
+            # update() moves tokens in place, so the next version is parsed from scratch
+            self.code = self.tokens = None
+            self.entries = []
+            raise
+
+        self.code = code
+        self.tokens = tokens
+        self.entries = visitor.entries[0]
+        self.functions_reused = visitor.functions_reused
+        return ast
+
+    def update(self, code):
+        """
+        Tokenizes code, reusing the tokens of the last version outside the changed lines. Returns
+        the tokens and the entries of the function literals whose tokens are unchanged, by offset.
+        """
+        old_code, old_tokens = self.code, self.tokens
+
+        # old_code[prefix:len(old_code) - suffix] has been replaced with code[prefix:len(code) - suffix]
+        prefix = get_common_prefix_length(old_code, code)
+        suffix = get_common_suffix_length(old_code, code, min(len(old_code), len(code)) - prefix)
+
+        offset_delta = len(code) - len(old_code)
+        line_delta = code.count("\n", prefix, len(code) - suffix) - old_code.count("\n", prefix, len(old_code) - suffix)
+
+        # Tokens never span lines, so the lines from the first changed line up to the first
+        # unchanged line after the change are tokenized again
+        relex_start = code.rfind("\n", 0, prefix) + 1
+        relex_end = code.find("\n", len(code) - suffix)
+        relex_end = len(code) if relex_end == -1 else relex_end + 1
+        old_relex_end = relex_end - offset_delta
+
+        first_relexed = get_first_token_at(old_tokens, relex_start)
+        first_kept = get_first_token_at(old_tokens, old_relex_end)
+
+        relexed = tokenize_range(code, relex_start, relex_end, code.count("\n", 0, relex_start) + 1, first_relexed)
+        index_delta = first_relexed + len(relexed) - first_kept
+
+        kept = old_tokens[first_kept:]
+        for token in kept:
+            token.offset += offset_delta
+            token.line += line_delta
+            token.index += index_delta
+        eof = kept[-1]
+        eof.column = len(code) - code.rfind("\n") - 1
+        tokens = old_tokens[:first_relexed] + relexed + kept
+        self.tokens_lexed = len(relexed)
+
+        # A function literal is reused if it ends before the first changed line, or starts after
+        # the last one, so that the columns of its tokens have not moved either
+        reusable_entries = {}
+        stack = list(self.entries)
+        while stack:
+            entry = stack.pop()
+            if entry.stop_offset <= relex_start:
+                reusable_entries[entry.offset] = entry
+            elif entry.offset >= old_relex_end:
+                entry = entry.move(offset_delta, line_delta)
+                reusable_entries[entry.offset] = entry
+            else:
+                stack.extend(entry.children)
+        return tokens, reusable_entries
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+import hashlib
+import marshal
+import os
+
+from lockdown.executor.raw_code import RawCode, RawCodeList
+from lockdown.type_system.default_composite_types import \
+    READONLY_DEFAULT_OBJECT_TYPE
+from lockdown.type_system.dict_types import RDHDict
+from lockdown.type_system.list_types import RDHList
+from lockdown.type_system.managers import get_manager
+from lockdown.type_system.object_types import RDHObject
+
+
+# Bump whenever the serialised format changes, to invalidate old cache files
+FORMAT_VERSION = 2
+
+# Tags for the tuples that composites and RawCode are serialised as. Python lists and primitives
+# are serialised as themselves.
+OBJECT, LIST, DICT, REFERENCE, RAW_CODE, RAW_CODE_LIST = range(6)
+
+# The files, relative to the lockdown package, whose contents decide what the visitor builds
+# from a piece of source
+GRAMMAR_SOURCES = [
+    os.path.join("parser", "grammar", "lang.g4"),
+    os.path.join("parser", "parser.py"),
+    os.path.join("parser", "pratt.py"),
+    os.path.join("executor", "raw_code_factories.py")
+]
+
+
+class UncacheableValue(Exception):
+    pass
+
+
+_grammar_version = None
+
+def get_grammar_version():
+    """
+    A hash of the grammar and the visitor, so that cached parses are dropped when either changes.
+    """
+    global _grammar_version
+    if _grammar_version is None:
+        digest = hashlib.sha1(str(FORMAT_VERSION))
+        package_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for path in GRAMMAR_SOURCES:
+            with open(os.path.join(package_directory, path), "rb") as source:
+                digest.update(source.read())
+        _grammar_version = digest.hexdigest()
+    return _grammar_version
+
+def get_cache_key(code, backend):
+    digest = hashlib.sha1(get_grammar_version())
+    digest.update(backend.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(code.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def serialize(value):
+    """
+    Converts the output of RDHLang5Visitor into nested tuples, lists and primitives that marshal
+    can store. Composites and RawCode that appear more than once are stored once and referenced by
+    the index at which they were completed, so sharing survives a round trip.
+    """
+    completed = {}
+    in_progress = set()
+
+    def serialize_value(value):
+        if isinstance(value, (RawCode, RawCodeList)):
+            value_id = id(value)
+            if value_id in completed:
+                return (REFERENCE, completed[value_id])
+
+            if isinstance(value, RawCode):
+                contents = []
+                for key, child in value._to_dict().items():
+                    contents.append(key)
+                    contents.append(serialize_value(child))
+                result = (RAW_CODE, contents)
+            else:
+                result = (RAW_CODE_LIST, [ serialize_value(child) for child in value ])
+
+            completed[value_id] = len(completed)
+            return result
+
+        if isinstance(value, (RDHObject, RDHList, RDHDict)):
+            value_id = id(value)
+            if value_id in completed:
+                return (REFERENCE, completed[value_id])
+            if value_id in in_progress:
+                raise UncacheableValue("cycle")
+            in_progress.add(value_id)
+
+            manager = get_manager(value)
+            if manager.default_factory is not None:
+                raise UncacheableValue("default_factory")
+            attached_types = manager.attached_types.values()
+            if attached_types and attached_types != [ READONLY_DEFAULT_OBJECT_TYPE ]:
+                raise UncacheableValue("attached types")
+
+            if isinstance(value, RDHObject):
+                contents = []
+                for key, child in value.__dict__.items():
+                    contents.append(key)
+                    contents.append(serialize_value(child))
+                result = (OBJECT, contents, manager.debug_reason, bool(attached_types))
+            elif isinstance(value, RDHList):
+                if value.is_sparse:
+                    raise UncacheableValue("sparse list")
+                result = (LIST, [ serialize_value(child) for child in value._values() ], manager.debug_reason, bool(attached_types))
+            else:
+                contents = []
+                for key, child in value.wrapped.items():
+                    contents.append(serialize_value(key))
+                    contents.append(serialize_value(child))
+                result = (DICT, contents, manager.debug_reason, bool(attached_types))
+
+            in_progress.discard(value_id)
+            completed[value_id] = len(completed)
+            return result
+
+        if isinstance(value, list):
+            return [ serialize_value(child) for child in value ]
+
+        if value is None or isinstance(value, (basestring, bool, int, long, float)):
+            return value
+
+        raise UncacheableValue(type(value))
+
+    return serialize_value(value)
+
+def deserialize(data):
+    """
+    Rebuilds the RawCode and composites that serialize converted, binding
+    READONLY_DEFAULT_OBJECT_TYPE to the composites that had it.
+    """
+    completed = []
+
+    def deserialize_value(data):
+        if isinstance(data, tuple):
+            tag = data[0]
+            if tag == REFERENCE:
+                return completed[data[1]]
+
+            if tag == RAW_CODE:
+                contents = data[1]
+                result = RawCode({
+                    contents[i]: deserialize_value(contents[i + 1]) for i in range(0, len(contents), 2)
+                })
+                completed.append(result)
+                return result
+            if tag == RAW_CODE_LIST:
+                result = RawCodeList([ deserialize_value(child) for child in data[1] ])
+                completed.append(result)
+                return result
+
+            tag, contents, debug_reason, is_bound = data
+            bind = READONLY_DEFAULT_OBJECT_TYPE if is_bound else None
+
+            if tag == OBJECT:
+                result = RDHObject({
+                    contents[i]: deserialize_value(contents[i + 1]) for i in range(0, len(contents), 2)
+                }, bind=bind, debug_reason=debug_reason)
+            elif tag == LIST:
+                result = RDHList([ deserialize_value(child) for child in contents ], bind=bind, debug_reason=debug_reason)
+            else:
+                # Keys and values are rebuilt in the order they were serialised, for the references
+                wrapped = {}
+                for i in range(0, len(contents), 2):
+                    key = deserialize_value(contents[i])
+                    wrapped[key] = deserialize_value(contents[i + 1])
+                result = RDHDict(wrapped, bind=bind, debug_reason=debug_reason)
+
+            completed.append(result)
+            return result
+
+        if isinstance(data, list):
+            return [ deserialize_value(child) for child in data ]
+
+        return data
+
+    return deserialize_value(data)
+
+
+class ParseCache(object):
+    """
+    Caches the output of RDHLang5Visitor by a hash of the source, the parser backend and the
+    grammar, in memory and, if a directory is given, on disk.
+
+    Entries are kept serialised, and every hit builds fresh values, because bootstrapping binds
+    types to any composites in the code it is given.
+    """
+    def __init__(self, directory=None, max_memory_entries=256):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.memory = OrderedDict()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:] + ".marshal")
+
+    def get(self, code, backend="antlr"):
+        key = get_cache_key(code, backend)
+
+        data = self.memory.pop(key, None)
+        if data is None and self.directory:
+            data = self.read(key)
+        if data is None:
+            return None
+
+        self.remember(key, data)
+
+        try:
+            return deserialize(marshal.loads(data))
+        except (EOFError, ValueError, TypeError, IndexError):
+            self.memory.pop(key, None)
+            return None
+
+    def put(self, code, ast, backend="antlr"):
+        try:
+            data = marshal.dumps(serialize(ast))
+        except (UncacheableValue, ValueError):
+            return
+
+        key = get_cache_key(code, backend)
+        self.remember(key, data)
+        if self.directory:
+            self.write(key, data)
+
+    def remember(self, key, data):
+        self.memory[key] = data
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def read(self, key):
+        try:
+            with open(self.get_path(key), "rb") as cache_file:
+                return cache_file.read()
+        except (IOError, OSError):
+            return None
+
+    def write(self, key, data):
+        # The cache is only an optimization, so failing to write to it is not an error
+        path = self.get_path(key)
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            temporary_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(temporary_path, "wb") as cache_file:
+                cache_file.write(data)
+            os.rename(temporary_path, path)
+        except (IOError, OSError):
+            pass
+
+    def clear(self):
+        self.memory.clear()
+
+
+def get_default_cache_directory():
+    """
+    The directory for the on-disk parse cache of this process: LOCKDOWN_PARSE_CACHE if it is set
+    and not empty, otherwise None, so that parses are only cached in memory unless asked for.
+    """
+    directory = os.environ.get("LOCKDOWN_PARSE_CACHE", None)
+    return os.path.expanduser(directory) if directory else None
+
+PARSE_CACHE = ParseCache(directory=get_default_cache_directory())
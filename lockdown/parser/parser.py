@@ -5,7 +5,10 @@ import json
 
 from antlr4.CommonTokenStream import CommonTokenStream
 from antlr4.InputStream import InputStream
+from antlr4.atn.PredictionMode import PredictionMode
 from antlr4.error.ErrorListener import ConsoleErrorListener
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
 
 from lockdown.executor.raw_code_factories import function_lit, nop, comma_op, \
     literal_op, dereference_op, unbound_dereference, addition_op, \
@@ -16,10 +19,13 @@ from lockdown.executor.raw_code_factories import function_lit, nop, comma_op, \
     loop_op, condition_op, binary_integer_op, equality_op, dereference, \
     local_function, reset_op, inferred_type, prepare_function_lit, transform, \
     continue_op, check_is_opcode, is_op, function_type, dict_template_op, \
-    composite_type, static_op, map_op, insert_op, prepared_function
-from lockdown.parser.grammar.langLexer import langLexer
-from lockdown.parser.grammar.langParser import langParser
+    composite_type, static_op, insert_op, prepared_function, \
+    range_loop_op, for_each_op
+from lockdown.executor.raw_code import RawCode
+from lockdown.parser.exceptions import ParseError
 from lockdown.parser.grammar.langVisitor import langVisitor
+from lockdown.parser.parse_cache import PARSE_CACHE
+from lockdown.parser.pratt import parse_pratt
 from lockdown.type_system.default_composite_types import DEFAULT_OBJECT_TYPE,\
     READONLY_DEFAULT_DICT_TYPE, READONLY_DEFAULT_OBJECT_TYPE
 from lockdown.type_system.dict_types import RDHDict
@@ -53,14 +59,14 @@ class RDHLang5Visitor(langVisitor):
             return self.visit(ctx.obj())
         if ctx.arr():
             return self.visit(ctx.arr())
+        if ctx.function():
+            return self.visit(ctx.function())[1]
         if ctx.getText() == "true":
             return True
         if ctx.getText() == "false":
             return False
         if ctx.getText() == "null":
             return None
-        if ctx.function():
-            return self.visit(ctx.function())[1]
 
     def visitFunction(self, ctx):
         argument_destructuring = ctx.argumentDestructurings()
@@ -497,7 +503,7 @@ class RDHLang5Visitor(langVisitor):
         loop_code = loop_code.create("function", get_debug_info(ctx))
 #        get_manager(loop_code).add_composite_type(READONLY_DEFAULT_OBJECT_TYPE)
 
-        return transform_op(
+        generic_loop = transform_op(
             "break", "value",
             invoke_op(local_function(
                 object_template_op({
@@ -536,6 +542,18 @@ class RDHLang5Visitor(langVisitor):
             ))
         )
 
+        range_arguments = get_range_arguments(generator_expression)
+        if range_arguments:
+            start, end = range_arguments
+            return range_loop_op(
+                generator_expression._get("function"), start, end, iterator_name,
+                prepare_function_lit(loop_code, **get_debug_info(ctx)),
+                generic_loop,
+                **get_debug_info(ctx)
+            )
+
+        return generic_loop
+
     def visitForListLoop(self, ctx):
         iterator_name = ctx.SYMBOL().getText()
         composite_expression = self.visit(ctx.expression())
@@ -549,19 +567,11 @@ class RDHLang5Visitor(langVisitor):
 
         loop_code = loop_code.create("function", get_debug_info(ctx))
 
-        return map_op(
+        return for_each_op(
             composite_expression,
-            prepared_function(
-                inferred_type(),
-                invoke_op(
-                    prepare_function_lit(loop_code, **get_debug_info(ctx)),
-                    object_template_op({
-                        iterator_name: dereference("argument", **get_debug_info(ctx))
-                    }, **get_debug_info(ctx)),
-                    **get_debug_info(ctx)
-                ),
-                **get_debug_info(ctx)
-            )
+            iterator_name,
+            prepare_function_lit(loop_code, **get_debug_info(ctx)),
+            **get_debug_info(ctx)
         )
 
     def visitObjectTemplate(self, ctx):
@@ -786,8 +796,23 @@ def get_debug_info(ctx):
     }
 
 
-class ParseError(Exception):
-    pass
+def get_range_arguments(expression):
+    """
+    Returns the start and end opcodes if expression is range(start, end), otherwise None.
+    Whether range is the builtin is left to RangeLoopOp, once the reference has been bound.
+    """
+    if expression._get("opcode") != "invoke":
+        return None
+    function = expression._get("function")
+    if function._get("opcode") != "unbound_dereference" or function._get("reference") != "range":
+        return None
+    argument = expression._get("argument")
+    if argument._get("opcode") != "list_template":
+        return None
+    opcodes = argument._get("opcodes")._values()
+    if len(opcodes) != 2:
+        return None
+    return opcodes
 
 
 class AlwaysFailErrorListener(ConsoleErrorListener):
@@ -796,17 +821,72 @@ class AlwaysFailErrorListener(ConsoleErrorListener):
         raise ParseError()
 
 
-def parse(code, debug=False):
+def get_grammar():
+    """
+    Imports the generated lexer and parser on first use. Importing them deserialises their ATNs,
+    which a process that only parses cached code never needs.
+    """
+    from lockdown.parser.grammar.langLexer import langLexer
+    from lockdown.parser.grammar.langParser import langParser
+    return langLexer, langParser
+
+def parse_json(code, try_sll=True):
+    """
+    Runs ANTLR over code. SLL prediction is tried first, because it is much faster than full LL
+    and gives the same tree whenever it succeeds. If it fails, the code is parsed again with LL,
+    which reports any real syntax error.
+    """
+    langLexer, langParser = get_grammar()
+
     lexer = langLexer(InputStream(code))
     lexer.addErrorListener(AlwaysFailErrorListener())
     tokens = CommonTokenStream(lexer)
     parser = langParser(tokens)
+
+    if try_sll:
+        parser._interp.predictionMode = PredictionMode.SLL
+        parser.removeErrorListeners()
+        parser._errHandler = BailErrorStrategy()
+        try:
+            return parser.json()
+        except ParseCancellationException:
+            parser._interp.predictionMode = PredictionMode.LL
+            parser._errHandler = DefaultErrorStrategy()
+            parser.addErrorListener(ConsoleErrorListener.INSTANCE)
+            parser.reset()
+
     parser.addErrorListener(AlwaysFailErrorListener())
-    ast = parser.json()
-    visitor = RDHLang5Visitor()
-    ast = visitor.visit(ast)
+    return parser.json()
+
+PARSE_BACKENDS = {
+    "antlr": parse_json,
+    "pratt": parse_pratt
+}
+
+def parse(code, debug=False, use_cache=True, backend="antlr"):
+    """
+    Parses code into the opcodes of a function literal. The backends differ only in how they build
+    the tree that RDHLang5Visitor visits: "antlr" uses the generated parser, "pratt" the
+    hand-written one in pratt.py.
+    """
+    if backend not in PARSE_BACKENDS:
+        raise FatalError("Unknown parser backend {}".format(backend))
+
+    ast = None
+    if use_cache:
+        ast = PARSE_CACHE.get(code, backend)
+
+    if ast is None:
+        visitor = RDHLang5Visitor()
+        ast = visitor.visit(PARSE_BACKENDS[backend](code))
+        if use_cache:
+            PARSE_CACHE.put(code, ast, backend)
+
     if debug:
-        ast._set("raw_code", code)
+        if isinstance(ast, RawCode):
+            ast = ast.extend(raw_code=code)
+        else:
+            ast._set("raw_code", code)
 #        get_manager(ast, "parse-code").add_composite_type(DEFAULT_OBJECT_TYPE)
 #        ast.raw_code = code
     return ast
@@ -0,0 +1,736 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import re
+
+from lockdown.parser.exceptions import ParseError
+
+
+# Token types for the tokens that are not literals. Literals use their text as their type.
+STRING, NUMBER, SYMBOL, EOF = "<STRING>", "<NUMBER>", "<SYMBOL>", "<EOF>"
+
+KEYWORDS = {
+    "true", "false", "null", "function", "static", "typedef", "is", "return", "continue", "break",
+    "Object", "Tuple", "List", "Dictionary", "Function", "if", "else", "while", "for", "from", "in"
+}
+
+# ANTLR lexers take the longest match, so NUMBER comes before '-', and every literal before its prefixes
+TOKEN_PATTERN = re.compile(r"""
+    (?P<whitespace>[ \t\n\r]+)
+    | (?P<string>"(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})|[^"\\\x00-\x1f])*")
+    | (?P<number>-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[Ee][+\-]?(?:0|[1-9][0-9]*))?)
+    | (?P<symbol>[a-zA-Z][a-zA-Z0-9]*)
+    | (?P<literal>\(var|\(\||\|\)|=>|==|!=|<=|>=|<<|\|\||&&|[{},:\[\]()=;<>.?*/+\-%])
+""", re.VERBOSE)
+
+# The tokens that can start an expression, and a codeBlock
+EXPRESSION_START = {
+    STRING, NUMBER, SYMBOL, "{", "[", "(", "<", "return", "continue", "break", "if", "while", "for",
+    "Object", "Tuple", "List", "Dictionary", "Function", "function"
+}
+CODE_BLOCK_START = EXPRESSION_START | { "static", "typedef" }
+
+# The tokens that can follow an expression inside <...>
+ANGLE_BRACKET_CONTENT_END = { ">", ",", ":", "=>" }
+
+# Binary operators, with the precedence that ANTLR gives their alternatives in lang.g4
+BINARY_OPERATORS = {
+    "is": ("visitIs", 35),
+    "*": ("visitMultiplication", 31),
+    "/": ("visitDivision", 30),
+    "+": ("visitAddition", 29),
+    "-": ("visitSubtraction", 28),
+    "%": ("visitMod", 27),
+    "==": ("visitEq", 26),
+    "!=": ("visitNeq", 25),
+    "<": ("visitLt", 24),
+    "<=": ("visitLte", 23),
+    ">": ("visitGt", 22),
+    ">=": ("visitGte", 21),
+    "||": ("visitBoolOr", 20),
+    "&&": ("visitBoolAnd", 19)
+}
+
+# Precedences of the other left recursive alternatives, and of the prefix alternatives
+INVOCATION = 40
+SINGLE_PARAMETER_INVOCATION = 39
+NO_PARAMETER_INVOCATION = 38
+STATIC_DEREFERENCE = 33
+DYNAMIC_DEREFERENCE = 32
+STATIC_ASSIGNMENT = 17
+DYNAMIC_ASSIGNMENT = 16
+DYNAMIC_INSERTION = 15
+TERNARY = 14
+IMMEDIATE_ASSIGNMENT_OPERAND = 18
+RETURN_OPERAND = 13
+CONTINUE_OPERAND = 12
+
+
+class Token(object):
+    __slots__ = [ "type", "text", "line", "column", "index", "offset" ]
+
+    def __init__(self, type, text, line, column, index, offset):
+        self.type = type
+        self.text = text
+        self.line = line
+        self.column = column
+        self.index = index
+        self.offset = offset
+
+    def getText(self):
+        return self.text
+
+    def __repr__(self):
+        return "Token({}, {!r}, {}:{})".format(self.type, self.text, self.line, self.column)
+
+
+def tokenize(code):
+    tokens = tokenize_range(code, 0, len(code), 1, 0)
+    line = code.count("\n") + 1
+    tokens.append(Token(EOF, "<EOF>", line, len(code) - code.rfind("\n") - 1, len(tokens), len(code)))
+    return tokens
+
+def tokenize_range(code, position, end, line, first_index):
+    """
+    Tokenizes code from position, which must be the start of a line, up to end, which must be the
+    start of a line or the end of code. Tokens never span lines, so the tokens of a range of lines
+    do not depend on the rest of the code.
+    """
+    tokens = []
+    line_start = position
+    match = TOKEN_PATTERN.match
+
+    while position < end:
+        token_match = match(code, position, end)
+        if token_match is None:
+            raise ParseError("token recognition error at {}:{}: {!r}".format(line, position - line_start, code[position]))
+        kind = token_match.lastgroup
+        text = token_match.group()
+
+        if kind == "whitespace":
+            newlines = text.count("\n")
+            if newlines:
+                line += newlines
+                line_start = position + text.rindex("\n") + 1
+        else:
+            if kind == "string":
+                type = STRING
+            elif kind == "number":
+                type = NUMBER
+            elif kind == "symbol":
+                type = text if text in KEYWORDS else SYMBOL
+            else:
+                type = text
+            tokens.append(Token(type, text, line, position - line_start, first_index + len(tokens), position))
+
+        position = token_match.end()
+
+    return tokens
+
+
+class Context(object):
+    """
+    Stands in for the ParserRuleContext of an ANTLR rule alternative. The accessors return a single
+    child or a list of children, as the ANTLR context for the same alternative would.
+    """
+    __slots__ = [ "visit_name", "start", "stop", "tokens", "children", "raw_argument", "return_type", "unsafe" ]
+
+    def __init__(self, visit_name, start, stop, tokens, children, raw_argument=None, return_type=None, unsafe=None):
+        self.visit_name = visit_name
+        self.start = start
+        self.stop = stop
+        self.tokens = tokens
+        self.children = children
+        self.raw_argument = raw_argument
+        self.return_type = return_type
+        self.unsafe = unsafe
+
+    def accept(self, visitor):
+        return getattr(visitor, self.visit_name)(self)
+
+    def getText(self):
+        return "".join(t.text for t in self.tokens[self.start.index:self.stop.index + 1])
+
+    def __repr__(self):
+        return "Context({}, {}:{})".format(self.visit_name, self.start.line, self.start.column)
+
+
+def create_accessor(name):
+    def accessor(self):
+        return self.children.get(name, None)
+    accessor.__name__ = str(name)
+    return accessor
+
+for accessor_name in [
+    "STRING", "NUMBER", "SYMBOL", "pair", "value", "obj", "arr", "function", "codeBlock", "expression",
+    "argumentDestructurings", "argumentDestructuring", "symbolInitialization",
+    "assignmentOrInitializationLvalue", "objectPropertyPair", "objectTypePropertyPair"
+]:
+    setattr(Context, accessor_name, create_accessor(accessor_name))
+
+
+class PrattParser(object):
+    """
+    A recursive descent parser for lang.g4, with precedence climbing for expressions.
+
+    It builds Contexts rather than code, so that RDHLang5Visitor runs over them unchanged and both
+    backends produce the same code. The choices that ANTLR makes with adaptive prediction are made
+    here with a token or two of lookahead, or with a speculative parse where the grammar needs more.
+    """
+    def __init__(self, code, tokens=None):
+        self.tokens = tokens if tokens is not None else tokenize(code)
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = min(self.position + offset, len(self.tokens) - 1)
+        return self.tokens[index].type
+
+    def advance(self):
+        token = self.tokens[self.position]
+        if token.type != EOF:
+            self.position += 1
+        return token
+
+    def expect(self, type):
+        token = self.tokens[self.position]
+        if token.type != type:
+            raise ParseError("{}:{} expected {} but found {!r}".format(token.line, token.column, type, token.text))
+        self.position += 1
+        return token
+
+    def unexpected(self):
+        token = self.tokens[self.position]
+        return ParseError("{}:{} unexpected {!r}".format(token.line, token.column, token.text))
+
+    def context(self, visit_name, start, children, **kwargs):
+        return Context(visit_name, start, self.tokens[self.position - 1], self.tokens, children, **kwargs)
+
+    def json(self):
+        # As in lang.g4, anything after the value is ignored
+        return self.value()
+
+    def value(self):
+        start = self.tokens[self.position]
+        type = start.type
+        if type == STRING:
+            return self.context("visitValue", start, { "STRING": self.advance() })
+        if type == NUMBER:
+            return self.context("visitValue", start, { "NUMBER": self.advance() })
+        if type == "{":
+            return self.context("visitValue", start, { "obj": self.obj() })
+        if type == "[":
+            return self.context("visitValue", start, { "arr": self.arr() })
+        if type in ("true", "false", "null"):
+            self.advance()
+            return self.context("visitValue", start, {})
+        if type == "function":
+            return self.context("visitValue", start, { "function": self.function() })
+        raise self.unexpected()
+
+    def obj(self):
+        start = self.expect("{")
+        pairs = []
+        if self.peek() != "}":
+            pairs.append(self.pair())
+            while self.peek() == ",":
+                self.advance()
+                pairs.append(self.pair())
+        self.expect("}")
+        return self.context("visitObj", start, { "pair": pairs })
+
+    def pair(self):
+        start = self.expect(STRING)
+        self.expect(":")
+        return self.context("visitPair", start, { "STRING": start, "value": self.value() })
+
+    def arr(self):
+        start = self.expect("[")
+        values = []
+        if self.peek() != "]":
+            values.append(self.value())
+            while self.peek() == ",":
+                self.advance()
+                values.append(self.value())
+        self.expect("]")
+        return self.context("visitArr", start, { "value": values })
+
+    def function(self):
+        start = self.expect("function")
+        name = None
+        if self.peek() == SYMBOL:
+            name = self.advance()
+
+        argument_destructurings = raw_argument = return_type = None
+        if self.peek() == "(|":
+            self.advance()
+            raw_argument = self.expression(0)
+            self.expect("|)")
+        else:
+            self.expect("(")
+            if self.peek() in EXPRESSION_START:
+                argument_destructurings = self.argument_destructurings()
+            self.expect(")")
+
+        if self.peek() == "=>":
+            self.advance()
+            return_type = self.expression(0)
+
+        code_block = self.braced_code_block()
+
+        return self.context("visitFunction", start, {
+            "SYMBOL": name,
+            "argumentDestructurings": argument_destructurings,
+            "codeBlock": code_block
+        }, raw_argument=raw_argument, return_type=return_type)
+
+    def argument_destructurings(self):
+        start = self.tokens[self.position]
+        destructurings = [ self.argument_destructuring() ]
+        while self.peek() == ",":
+            self.advance()
+            destructurings.append(self.argument_destructuring())
+        return self.context("visitArgumentDestructurings", start, { "argumentDestructuring": destructurings })
+
+    def argument_destructuring(self):
+        start = self.tokens[self.position]
+        type = self.expression(0)
+        return self.context("visitArgumentDestructuring", start, { "expression": type, "SYMBOL": self.expect(SYMBOL) })
+
+    def symbol_initialization(self):
+        start = self.expect(SYMBOL)
+        self.expect("=")
+        return self.context("visitSymbolInitialization", start, { "SYMBOL": start, "expression": self.expression(0) })
+
+    def braced_code_block(self):
+        self.expect("{")
+        code_block = self.code_block()
+        self.expect("}")
+        return code_block
+
+    def optional_code_block(self):
+        if self.peek() in CODE_BLOCK_START:
+            return self.code_block()
+        return None
+
+    def code_block(self):
+        start = self.tokens[self.position]
+        type = start.type
+
+        if type == "static":
+            self.advance()
+            symbol_initialization = self.symbol_initialization()
+            self.expect(";")
+            return self.context("visitStaticValueDeclaration", start, {
+                "symbolInitialization": symbol_initialization, "codeBlock": self.optional_code_block()
+            })
+
+        if type == "typedef":
+            self.advance()
+            value = self.expression(0)
+            name = self.expect(SYMBOL)
+            self.expect(";")
+            return self.context("visitTypedef", start, {
+                "expression": value, "SYMBOL": name, "codeBlock": self.optional_code_block()
+            })
+
+        if type in ("{", "["):
+            destructuring = self.destructuring()
+            if destructuring:
+                return destructuring
+
+        if type == "function":
+            function = self.function()
+            if self.peek() == ";":
+                # Also a valid expression statement, but ANTLR prefers the earlier alternative
+                self.advance()
+                return self.context("visitToFunctionStatement", start, {
+                    "function": function, "codeBlock": self.optional_code_block()
+                })
+            expression = self.expression(0, left=self.context("visitToFunctionExpression", start, { "function": function }))
+        elif type in EXPRESSION_START:
+            expression = self.expression(0)
+        else:
+            raise self.unexpected()
+
+        if self.peek() == SYMBOL:
+            symbol_initializations = [ self.symbol_initialization() ]
+            while self.peek() == ",":
+                self.advance()
+                symbol_initializations.append(self.symbol_initialization())
+            self.expect(";")
+            return self.context("visitLocalVariableDeclaration", start, {
+                "expression": expression,
+                "symbolInitialization": symbol_initializations,
+                "codeBlock": self.optional_code_block()
+            })
+
+        self.expect(";")
+        expressions = [ expression ]
+        # (expression ';')+ is greedy, so it takes every following statement that is an expression
+        while self.peek() in EXPRESSION_START:
+            mark = self.position
+            try:
+                expression = self.expression(0)
+            except ParseError:
+                self.position = mark
+                break
+            if self.peek() != ";":
+                self.position = mark
+                break
+            self.advance()
+            expressions.append(expression)
+
+        return self.context("visitToExpression", start, {
+            "expression": expressions, "codeBlock": self.optional_code_block()
+        })
+
+    def destructuring(self):
+        """
+        Returns None, having consumed nothing, if the code block does not start with a destructuring.
+        """
+        mark = self.position
+        start = self.advance()
+        if start.type == "{":
+            visit_name, close = "visitToObjectDestructuring", "}"
+        else:
+            visit_name, close = "visitToListDestructuring", "]"
+
+        try:
+            lvalues = [ self.lvalue(close) ]
+            while self.peek() == ",":
+                self.advance()
+                lvalues.append(self.lvalue(close))
+            self.expect(close)
+            self.expect("=")
+        except ParseError:
+            self.position = mark
+            return None
+
+        rvalue = self.expression(0)
+        self.expect(";")
+        return self.context(visit_name, start, {
+            "assignmentOrInitializationLvalue": lvalues,
+            "expression": rvalue,
+            "codeBlock": self.optional_code_block()
+        })
+
+    def lvalue(self, close):
+        start = self.tokens[self.position]
+        if start.type == SYMBOL and self.peek(1) in (",", close):
+            self.advance()
+            return self.context("visitAssignmentOrInitializationLvalue", start, { "SYMBOL": start })
+        type = self.expression(0)
+        return self.context("visitAssignmentOrInitializationLvalue", start, {
+            "expression": type, "SYMBOL": self.expect(SYMBOL)
+        })
+
+    def expression(self, precedence, closing_angle=False, left=None):
+        """
+        Parses an expression whose operators all bind at least as tightly as precedence. If
+        closing_angle is set, the expression is inside <...> and a '>' only continues it when
+        the expression after it is still inside the brackets.
+        """
+        if left is None:
+            left = self.primary(closing_angle)
+        start = left.start
+
+        while True:
+            type = self.tokens[self.position].type
+
+            if type in BINARY_OPERATORS:
+                visit_name, operator_precedence = BINARY_OPERATORS[type]
+                if operator_precedence < precedence:
+                    break
+                mark = self.position
+                self.advance()
+                if type == ">" and closing_angle:
+                    try:
+                        right = self.expression(operator_precedence + 1, closing_angle)
+                    except ParseError:
+                        right = None
+                    if right is None or self.peek() not in ANGLE_BRACKET_CONTENT_END:
+                        self.position = mark
+                        break
+                else:
+                    right = self.expression(operator_precedence + 1, closing_angle)
+                left = self.context(visit_name, start, { "expression": [ left, right ] })
+
+            elif type == "(":
+                if self.peek(1) == ")":
+                    if NO_PARAMETER_INVOCATION < precedence:
+                        break
+                    self.advance()
+                    self.advance()
+                    left = self.context("visitNoParameterInvocation", start, { "expression": left })
+                else:
+                    if INVOCATION < precedence:
+                        break
+                    self.advance()
+                    expressions = [ left, self.expression(0) ]
+                    while self.peek() == ",":
+                        self.advance()
+                        expressions.append(self.expression(0))
+                    self.expect(")")
+                    left = self.context("visitInvocation", start, { "expression": expressions })
+
+            elif type == "(|":
+                if SINGLE_PARAMETER_INVOCATION < precedence:
+                    break
+                self.advance()
+                argument = self.expression(0)
+                self.expect("|)")
+                left = self.context("visitSingleParameterInvocation", start, { "expression": [ left, argument ] })
+
+            elif type == ".":
+                if self.peek(1) == SYMBOL and self.peek(2) == "=":
+                    # Nothing could follow a dereference with '=', so an outer expression must take the assignment
+                    if STATIC_ASSIGNMENT < precedence:
+                        break
+                    self.advance()
+                    name = self.advance()
+                    self.advance()
+                    rvalue = self.expression(STATIC_ASSIGNMENT + 1, closing_angle)
+                    left = self.context("visitStaticAssignment", start, { "expression": [ left, rvalue ], "SYMBOL": name })
+                elif STATIC_DEREFERENCE >= precedence:
+                    self.advance()
+                    name = self.expect(SYMBOL)
+                    left = self.context("visitStaticDereference", start, { "expression": left, "SYMBOL": name })
+                else:
+                    break
+
+            elif type == "[":
+                if DYNAMIC_DEREFERENCE < precedence:
+                    break
+                mark = self.position
+                self.advance()
+                reference = self.expression(0)
+                self.expect("]")
+                following = self.peek()
+                if (following == "=" and DYNAMIC_ASSIGNMENT < precedence) or (following == "<<" and DYNAMIC_INSERTION < precedence):
+                    # As for static assignments, leave the whole assignment to an outer expression
+                    self.position = mark
+                    break
+                if following == "=":
+                    self.advance()
+                    rvalue = self.expression(DYNAMIC_ASSIGNMENT + 1, closing_angle)
+                    left = self.context("visitDynamicAssignment", start, { "expression": [ left, reference, rvalue ] })
+                elif following == "<<":
+                    self.advance()
+                    rvalue = self.expression(DYNAMIC_INSERTION + 1, closing_angle)
+                    left = self.context("visitDynamicInsertion", start, { "expression": [ left, reference, rvalue ] })
+                else:
+                    unsafe = None
+                    if following == "?" and not self.starts_ternary_tail():
+                        unsafe = self.advance()
+                    left = self.context("visitDynamicDereference", start, { "expression": [ left, reference ] }, unsafe=unsafe)
+
+            elif type == "?":
+                if TERNARY < precedence:
+                    break
+                self.advance()
+                when_true = self.expression(0)
+                self.expect(":")
+                when_false = self.expression(TERNARY + 1, closing_angle)
+                left = self.context("visitTernary", start, { "expression": [ left, when_true, when_false ] })
+
+            else:
+                break
+
+        return left
+
+    def starts_ternary_tail(self):
+        """
+        Whether the '?' after a dynamic dereference starts a ternary, rather than marking the
+        dereference unsafe.
+        """
+        if self.peek(1) not in EXPRESSION_START:
+            return False
+        mark = self.position
+        self.advance()
+        try:
+            self.expression(0)
+            return self.peek() == ":"
+        except ParseError:
+            return False
+        finally:
+            self.position = mark
+
+    def primary(self, closing_angle):
+        start = self.tokens[self.position]
+        type = start.type
+
+        if type == STRING:
+            self.advance()
+            return self.context("visitStringExpression", start, { "STRING": start })
+        if type == NUMBER:
+            self.advance()
+            return self.context("visitNumberExpression", start, { "NUMBER": start })
+        if type == SYMBOL:
+            self.advance()
+            if self.peek() == "=":
+                self.advance()
+                value = self.expression(IMMEDIATE_ASSIGNMENT_OPERAND, closing_angle)
+                return self.context("visitImmediateAssignment", start, { "SYMBOL": start, "expression": value })
+            return self.context("visitImmediateDereference", start, { "SYMBOL": start })
+        if type == "(":
+            self.advance()
+            expression = self.expression(0)
+            self.expect(")")
+            return self.context("visitParenthesis", start, { "expression": expression })
+        if type == "<":
+            self.advance()
+            expression = self.expression(0, True)
+            self.expect(">")
+            return self.context("visitStaticExpression", start, { "expression": expression })
+        if type == "{":
+            return self.object_template()
+        if type == "[":
+            return self.list_template()
+        if type == "return":
+            self.advance()
+            value = self.expression(RETURN_OPERAND, closing_angle)
+            return self.context("visitReturnStatement", start, { "expression": value })
+        if type == "continue":
+            self.advance()
+            value = self.expression(CONTINUE_OPERAND, closing_angle)
+            return self.context("visitContinueStatement", start, { "expression": value })
+        if type == "break":
+            self.advance()
+            return self.context("visitBreakStatement", start, {})
+        if type == "if":
+            return self.if_statement()
+        if type == "while":
+            self.advance()
+            condition = self.parenthesized_expression()
+            return self.context("visitWhileLoop", start, { "expression": condition, "codeBlock": self.braced_code_block() })
+        if type == "for":
+            return self.for_loop()
+        if type == "Object":
+            return self.object_type()
+        if type == "List":
+            self.advance()
+            self.expect("<")
+            value_type = self.expression(0, True)
+            self.expect(">")
+            return self.context("visitListType", start, { "expression": value_type })
+        if type == "Tuple":
+            self.advance()
+            self.expect("<")
+            types = [ self.expression(0, True) ]
+            while self.peek() == ",":
+                self.advance()
+                types.append(self.expression(0, True))
+            self.expect(">")
+            return self.context("visitTupleType", start, { "expression": types })
+        if type == "Dictionary":
+            self.advance()
+            self.expect("<")
+            key_type = self.expression(0, True)
+            self.expect(":")
+            value_type = self.expression(0, True)
+            self.expect(">")
+            return self.context("visitDictionaryType", start, { "expression": [ key_type, value_type ] })
+        if type == "Function":
+            self.advance()
+            self.expect("<")
+            argument_type = self.expression(0, True)
+            self.expect("=>")
+            return_type = self.expression(0, True)
+            self.expect(">")
+            return self.context("visitFunctionType", start, { "expression": [ argument_type, return_type ] })
+        if type == "function":
+            function = self.function()
+            return self.context("visitToFunctionExpression", start, { "function": function })
+
+        raise self.unexpected()
+
+    def parenthesized_expression(self):
+        self.expect("(")
+        expression = self.expression(0)
+        self.expect(")")
+        return expression
+
+    def if_statement(self):
+        start = self.expect("if")
+        condition = self.parenthesized_expression()
+        code_blocks = [ self.braced_code_block() ]
+        if self.peek() == "else":
+            self.advance()
+            code_blocks.append(self.braced_code_block())
+        return self.context("visitIfStatement", start, { "expression": condition, "codeBlock": code_blocks })
+
+    def for_loop(self):
+        start = self.expect("for")
+        self.expect("(var")
+        name = self.expect(SYMBOL)
+        if self.peek() == "from":
+            visit_name = "visitForGeneratorLoop"
+        elif self.peek() == "in":
+            visit_name = "visitForListLoop"
+        else:
+            raise self.unexpected()
+        self.advance()
+        iterable = self.expression(0)
+        self.expect(")")
+        return self.context(visit_name, start, {
+            "SYMBOL": name, "expression": iterable, "codeBlock": self.braced_code_block()
+        })
+
+    def object_template(self):
+        start = self.expect("{")
+        pairs = []
+        if self.peek() in (SYMBOL, NUMBER, "["):
+            pairs.append(self.object_property_pair())
+        while self.peek() == ",":
+            self.advance()
+            pairs.append(self.object_property_pair())
+        self.expect("}")
+        return self.context("visitObjectTemplate", start, { "objectPropertyPair": pairs })
+
+    def object_property_pair(self):
+        start = self.tokens[self.position]
+        if start.type in (SYMBOL, NUMBER):
+            self.advance()
+            self.expect(":")
+            key = "SYMBOL" if start.type == SYMBOL else "NUMBER"
+            return self.context("visitObjectPropertyPair", start, { key: start, "expression": [ self.expression(0) ] })
+        self.expect("[")
+        key = self.expression(0)
+        self.expect("]")
+        self.expect(":")
+        return self.context("visitObjectPropertyPair", start, { "expression": [ key, self.expression(0) ] })
+
+    def object_type(self):
+        start = self.expect("Object")
+        self.expect("{")
+        pairs = []
+        if self.peek() == SYMBOL:
+            pairs.append(self.object_type_property_pair())
+        while self.peek() == ";":
+            self.advance()
+            pairs.append(self.object_type_property_pair())
+        self.expect("}")
+        return self.context("visitObjectType", start, { "objectTypePropertyPair": pairs })
+
+    def object_type_property_pair(self):
+        start = self.expect(SYMBOL)
+        self.expect(":")
+        return self.context("visitObjectTypePropertyPair", start, { "SYMBOL": start, "expression": self.expression(0) })
+
+    def list_template(self):
+        start = self.expect("[")
+        expressions = []
+        if self.peek() in EXPRESSION_START:
+            expressions.append(self.expression(0))
+        while self.peek() == ",":
+            self.advance()
+            expressions.append(self.expression(0))
+        self.expect("]")
+        return self.context("visitListTemplate", start, { "expression": expressions })
+
+
+def parse_pratt(code):
+    """
+    Parses code into contexts that RDHLang5Visitor can visit, as parse_json does with ANTLR.
+    """
+    return PrattParser(code).json()
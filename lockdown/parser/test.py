@@ -1,17 +1,53 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import ast
+import dis
+import imp
+import inspect
+import io
+import linecache
+import marshal
+import os
+import pstats
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
 from time import time
 from unittest.case import TestCase
 
-from lockdown.executor.bootstrap import bootstrap_function
+from lockdown.executor.aot import compile_program
+from lockdown.executor.bootstrap import bootstrap_function, \
+    get_default_global_context, BootstrapException, prepare_function, \
+    invoke_function
 from lockdown.executor.exceptions import PreparationException
-from lockdown.parser.parser import parse
+from lockdown.executor.flow_control import FrameManager
+from lockdown.executor.incremental import IncrementalVerifier
+from lockdown.executor.opcodes import OPCODES, RangeLoopOp, get_child_opcodes
+from lockdown.executor.ast_utils import make_lines_monotonic
+from lockdown.executor.function import get_transpiled_open_function, \
+    TRANSPILED_CODE
+from lockdown.executor.profiler import OpcodeProfiler, profile_opcodes, \
+    SamplingProfiler, sample_lockdown
+from lockdown.executor.raw_code import RawCode, RawCodeList
+from lockdown.parser.incremental import IncrementalParser
+from lockdown.parser.parse_cache import ParseCache, serialize, deserialize, \
+    get_default_cache_directory
+from lockdown.parser.parser import parse, parse_json, ParseError
+from lockdown.parser.pratt import tokenize
 from lockdown.testing import miss_test
-from lockdown.type_system.default_composite_types import DEFAULT_LIST_TYPE
+from lockdown.type_system.default_composite_types import DEFAULT_LIST_TYPE, \
+    DEFAULT_OBJECT_TYPE
+from lockdown.type_system.exceptions import FatalError, \
+    CompositeTypeIncompatibleWithTarget
+from lockdown.type_system.dict_types import RDHDict
 from lockdown.type_system.list_types import RDHList
 from lockdown.type_system.managers import get_manager
 from lockdown.type_system.object_types import RDHObject
+from lockdown.utils import NO_VALUE
 
 
 class TestJSONParsing(TestCase):
@@ -312,6 +348,163 @@ class TestBuiltIns(TestCase):
         self.assertEquals(len(result.value), 4)
         self.assertEquals(list(result.value), [ 1, 2, 3, 4 ])
 
+    def test_aggregation(self):
+        code = parse("""
+            function() {
+                List<int> numbers = list(range(1, 5));
+                return sum(|numbers|) * 100 + max(3, 7) * 10 + min(3, 7);
+            }
+        """, debug=True)
+        result = bootstrap_function(code, check_safe_exit=True)
+        self.assertEquals(result.caught_break_mode, "value")
+        self.assertEquals(result.value, 1073)
+
+    def test_len(self):
+        code = parse("""
+            function() {
+                List<int> numbers = list(range(1, 5));
+                return len(numbers) * 10 + len("abc");
+            }
+        """, debug=True)
+        result = bootstrap_function(code, check_safe_exit=True)
+        self.assertEquals(result.caught_break_mode, "value")
+        self.assertEquals(result.value, 43)
+
+    def test_sorted_and_reversed(self):
+        code = parse("""
+            function() {
+                List<int> numbers = reversed(list(range(1, 5)));
+                return numbers[0]? * 10 + sorted(numbers)[0]?;
+            }
+        """, debug=True)
+        result = bootstrap_function(code)
+        self.assertEquals(result.caught_break_mode, "value")
+        self.assertEquals(result.value, 41)
+
+    def test_strings(self):
+        code = parse("""
+            function() {
+                return str(42);
+            }
+        """, debug=True)
+        result = bootstrap_function(code, check_safe_exit=True)
+        self.assertEquals(result.caught_break_mode, "value")
+        self.assertEquals(result.value, "42")
+
+    def test_transpiled(self):
+        code = parse("""
+            function() {
+                List<int> numbers = list(range(1, 5));
+                return sum(|numbers|) + max(3, 7) + len(numbers);
+            }
+        """, debug=True)
+        result = bootstrap_function(code, transpile=True)
+        self.assertEquals(result.caught_break_mode, "value")
+        self.assertEquals(result.value, 10 + 7 + 4)
+
+    def test_shared_global_context(self):
+        code = parse("""
+            function() {
+                return max(3, 7);
+            }
+        """, debug=True)
+        context = get_default_global_context()
+        attached_type_counts = dict(get_manager(context).attached_type_counts)
+
+        for _ in range(3):
+            result = bootstrap_function(code, check_safe_exit=True)
+            self.assertEquals(result.value, 7)
+
+        self.assertIs(get_default_global_context(), context)
+        self.assertEquals(dict(get_manager(context).attached_type_counts), attached_type_counts)
+
+    def test_shared_global_context_is_frozen(self):
+        context = get_default_global_context()
+        static = context._get("static")
+
+        with self.assertRaises(CompositeTypeIncompatibleWithTarget):
+            get_manager(static).add_composite_type(DEFAULT_OBJECT_TYPE)
+        with self.assertRaises(FatalError):
+            static._set("int", 5)
+        self.assertEquals(static._get("int")._get("type"), "Integer")
+
+        code = parse("""
+            function() {
+                return max(3, 7);
+            }
+        """, debug=True)
+        result = bootstrap_function(code, check_safe_exit=True)
+        self.assertEquals(result.value, 7)
+
+
+class TestParseCache(TestCase):
+    code = """
+        function() {
+            int result = 0;
+            for(var i from range(1, 5)) {
+                result = result + i;
+            };
+            return result;
+        }
+    """
+
+    def test_round_trip(self):
+        code = parse(self.code, use_cache=False)
+        rebuilt = deserialize(marshal.loads(marshal.dumps(serialize(code))))
+
+        self.assertIsInstance(rebuilt, RawCode)
+        self.assertEquals(sorted(rebuilt._keys()), sorted(code._keys()))
+        self.assertEquals(bootstrap_function(rebuilt, check_safe_exit=True).value, 10)
+
+    def test_sharing_survives(self):
+        shared = RDHObject({ "foo": 42 })
+        rebuilt = deserialize(serialize(RDHList([ shared, shared ])))
+        self.assertIs(rebuilt._get(0), rebuilt._get(1))
+
+    def test_raw_code_sharing_survives(self):
+        shared = RawCode({ "opcode": "nop" })
+        rebuilt = deserialize(serialize(RawCodeList([ shared, shared ])))
+        self.assertIsInstance(rebuilt, RawCodeList)
+        self.assertIs(rebuilt[0], rebuilt[1])
+
+    def test_memory_cache(self):
+        cache = ParseCache()
+        self.assertIsNone(cache.get(self.code))
+        cache.put(self.code, parse(self.code, use_cache=False))
+
+        first, second = cache.get(self.code), cache.get(self.code)
+        self.assertIsNot(first, second)
+        self.assertEquals(bootstrap_function(first, check_safe_exit=True).value, 10)
+        self.assertEquals(bootstrap_function(second, check_safe_exit=True).value, 10)
+
+    def test_disk_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            ParseCache(directory=directory).put(self.code, parse(self.code, use_cache=False))
+            code = ParseCache(directory=directory).get(self.code)
+            self.assertEquals(bootstrap_function(code, check_safe_exit=True).value, 10)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_backends_are_cached_apart(self):
+        cache = ParseCache()
+        cache.put(self.code, parse(self.code, use_cache=False, backend="antlr"), "antlr")
+        self.assertIsNone(cache.get(self.code, "pratt"))
+        self.assertIsNotNone(cache.get(self.code, "antlr"))
+
+    def test_disk_cache_is_opt_in(self):
+        environment = os.environ.copy()
+        try:
+            os.environ.pop("LOCKDOWN_PARSE_CACHE", None)
+            self.assertIsNone(get_default_cache_directory())
+            os.environ["LOCKDOWN_PARSE_CACHE"] = ""
+            self.assertIsNone(get_default_cache_directory())
+            os.environ["LOCKDOWN_PARSE_CACHE"] = "cache"
+            self.assertEquals(get_default_cache_directory(), "cache")
+        finally:
+            os.environ.clear()
+            os.environ.update(environment)
+
 
 class TestInferredTypes(TestCase):
     def test_inferred_locals(self):
@@ -342,6 +535,19 @@ class TestFunctionDeclaration(TestCase):
         self.assertEquals(result.caught_break_mode, "value")
         self.assertEquals(result.value, 42)
 
+    def test_local_function_with_arguments(self):
+        code = parse("""
+            function() {
+                var x = function(int a, int b) {
+                    return a * b;
+                };
+                return x(6, 7);
+            }
+        """)
+        result = bootstrap_function(code, check_safe_exit=True)
+        self.assertEquals(result.caught_break_mode, "value")
+        self.assertEquals(result.value, 42)
+
     def test_access_outer_context(self):
         code = parse("""
             function() {
@@ -573,6 +779,130 @@ class TestLoops(TestCase):
         self.assertEquals(result.caught_break_mode, "value")
         self.assertEquals(result.value, 1 + 2 + 3 + 4)
 
+    def test_for_range_break(self):
+        code = parse("""
+            function() {
+                int result = 0;
+                for(var i from range(1, 10)) {
+                    if(i == 4) {
+                        break;
+                    };
+                    result = result + i;
+                };
+                return result;
+            }
+        """, debug=True)
+        result = bootstrap_function(code, check_safe_exit=True)
+        self.assertEquals(result.caught_break_mode, "value")
+        self.assertEquals(result.value, 1 + 2 + 3)
+
+    def test_nested_for_range(self):
+        code = parse("""
+            function() {
+                int result = 0, size = 4;
+                for(var i from range(0, size)) {
+                    for(var j from range(i, size)) {
+                        result = result + 1;
+                    };
+                };
+                return result;
+            }
+        """, debug=True)
+        result = bootstrap_function(code, check_safe_exit=True)
+        self.assertEquals(result.caught_break_mode, "value")
+        self.assertEquals(result.value, 4 + 3 + 2 + 1)
+
+    def test_for_range_is_prepared_once(self):
+        code = parse("""
+            function() {
+                int result = 0;
+                for(var i from range(0, 5)) {
+                    result = result + i;
+                };
+                return result;
+            }
+        """)
+        context = get_default_global_context()
+        open_function = prepare_function(code, context, check_safe_exit=True)
+
+        stack = [ open_function.code ]
+        range_loops = []
+        while stack:
+            opcode = stack.pop()
+            if isinstance(opcode, RangeLoopOp):
+                range_loops.append(opcode)
+            stack.extend(get_child_opcodes(opcode))
+        self.assertEquals(len(range_loops), 1)
+        range_loop = range_loops[0]
+
+        self.assertIs(range_loop.is_native, True)
+        # The loop is a statement, so the values it continues with are not collected
+        self.assertTrue(range_loop.value_is_ignored)
+
+        result = invoke_function(open_function.close(context), NO_VALUE)
+        self.assertEquals(result.value, 0 + 1 + 2 + 3 + 4)
+        self.assertIs(range_loop.is_native, True)
+
+    def test_for_list(self):
+        code = parse("""
+            function() {
+                int result = 0;
+                for(var i in <list(range(1, 5))>) {
+                    result = result + i;
+                };
+                return result;
+            }
+        """, debug=True)
+        result = bootstrap_function(code, check_safe_exit=True)
+        self.assertEquals(result.caught_break_mode, "value")
+        self.assertEquals(result.value, 1 + 2 + 3 + 4)
+
+    def test_for_list_break(self):
+        code = parse("""
+            function() {
+                int result = 0;
+                for(var i in <list(range(1, 10))>) {
+                    if(i == 4) {
+                        break;
+                    };
+                    result = result + i;
+                };
+                return result;
+            }
+        """, debug=True)
+        result = bootstrap_function(code, check_safe_exit=True)
+        self.assertEquals(result.caught_break_mode, "value")
+        self.assertEquals(result.value, 1 + 2 + 3)
+
+    def test_for_list_continue(self):
+        code = parse("""
+            function() {
+                List<int> doubled = for(var i in <list(range(1, 4))>) {
+                    continue i * 2;
+                };
+                return doubled[2]?;
+            }
+        """, debug=True)
+        result = bootstrap_function(code, check_safe_exit=True)
+        self.assertEquals(result.caught_break_mode, "value")
+        self.assertEquals(result.value, 6)
+
+    def test_for_object_is_not_safe(self):
+        code = parse("""
+            function() {
+                for(var i in { foo: 3 }) {
+                    continue i;
+                };
+                return 42;
+            }
+        """, debug=True)
+        with self.assertRaises(BootstrapException):
+            bootstrap_function(code, check_safe_exit=True)
+
+        result = bootstrap_function(code)
+        self.assertEquals(result.caught_break_mode, "exception")
+        self.assertEquals(result.value._get("message"), "ForEachOp: missing_composite")
+
 class TestParserMisc(TestCase):
     def test_invalid_list_assignment(self):
         code = parse("""
@@ -584,6 +914,455 @@ class TestParserMisc(TestCase):
         with self.assertRaises(PreparationException):
             bootstrap_function(code)
 
+    def test_sll_matches_ll(self):
+        code = """
+            function() {
+                int i = 0;
+                while(i < 10) {
+                    i = i + 1;
+                };
+                return i;
+            }
+        """
+        self.assertEquals(
+            parse_json(code, try_sll=True).toStringTree(),
+            parse_json(code, try_sll=False).toStringTree()
+        )
+
+    def test_syntax_error(self):
+        with self.assertRaises(ParseError):
+            parse("""
+                function() {
+                    return 42
+            """, use_cache=False)
+
+
+def get_canonical_code(value):
+    """
+    A comparable form of parsed code. Templates are built from dicts whose keys are opcodes, so the
+    order of their entries is arbitrary and is sorted here.
+    """
+    if isinstance(value, (RawCode, RDHObject)):
+        items = sorted((key, get_canonical_code(value._get(key))) for key in value._keys())
+        if value._contains("opcode") and value._get("opcode") in ("object_template", "dict_template"):
+            items = [ (key, sorted(child) if key == "opcodes" else child) for key, child in items ]
+        return items
+    if isinstance(value, (RawCodeList, RDHList)):
+        return [ get_canonical_code(child) for child in value._values() ]
+    if isinstance(value, RDHDict):
+        return sorted((get_canonical_code(key), get_canonical_code(child)) for key, child in value.wrapped.items())
+    if isinstance(value, list):
+        return [ get_canonical_code(child) for child in value ]
+    return value
+
+
+class TestParserBackends(TestCase):
+    # Every program in this file, and some that test how the grammar's ambiguities are resolved
+    corpus = re.findall(r'(?:parse\(|code = )"""(.*?)"""', inspect.getsource(sys.modules[__name__]), re.DOTALL) + [
+        "function() { return a ? b : c = 5; }",
+        "function() { a.b = c.d = 5; a[0] = b[1] << 3; return x is int ? 1 : 2; }",
+        "function() { return a[b]? c : d; }",
+        "function() { return x[0]?[1]?; }",
+        "function() { Tuple<a > b, c> x = y; List<List<int>> z = []; return <a > b>; }",
+        "function() { a; function f() { return 1; }; return f(); }",
+        "function() { function f() { return 1; }; [a, int b] = [1, 2]; { c, var d } = e; [1, 2]; }",
+        "function() { return 1 + 2 * 3 - 4 / 5 % 6 == 7 != 8 < 9 <= 10 > 11 >= 12 || 13 && 14; }",
+        "function() { return a(|b|)(c, d)()[e].f; }",
+        "{ \"a\": [ 1, 2.5e3, \"x\\n\", true, false, null, {} ], \"b\": function() { return 1; } }"
+    ]
+
+    def test_corpus(self):
+        self.assertGreater(len(self.corpus), 80)
+        for code in self.corpus:
+            try:
+                expected = get_canonical_code(parse(code, use_cache=False, backend="antlr"))
+            except ParseError:
+                with self.assertRaises(ParseError):
+                    parse(code, use_cache=False, backend="pratt")
+                continue
+            self.assertEquals(get_canonical_code(parse(code, use_cache=False, backend="pratt")), expected, code)
+
+    def test_execution(self):
+        code = parse("""
+            function() {
+                int result = 0;
+                for(var i from range(1, 5)) {
+                    result = result + i * 2;
+                };
+                return result;
+            }
+        """, use_cache=False, backend="pratt")
+        self.assertEquals(bootstrap_function(code, check_safe_exit=True).value, 20)
+
+    def test_syntax_error(self):
+        with self.assertRaises(ParseError):
+            parse("""
+                function() {
+                    return 42
+            """, use_cache=False, backend="pratt")
+
+    def test_token_error(self):
+        with self.assertRaises(ParseError):
+            parse("function() { return 4 # 2; }", use_cache=False, backend="pratt")
+
+
+class TestIncrementalParsing(TestCase):
+    module = """{
+        "add": function(int x, int y) {
+            return x + y;
+        },
+        "sum": function() {
+            int result = 0;
+            var double = function(int x) {
+                return x * 2;
+            };
+            for(var i from range(1, 5)) {
+                result = result + double(i);
+            };
+            return result;
+        },
+        "three": function() {
+            return 3;
+        }
+    }"""
+
+    edits = [
+        ("return 3;", "return 4;"),
+        ("result + double(i)", "result + double(i) + 1"),
+        ("return x + y;", "return x\n                + y;"),
+        ("int result = 0;", "int result = 0;\n\n            int unused = 1;"),
+        ("\n                + y;", " + y;"),
+        ("return x * 2;", "return x * 3;"),
+        ("\n        \"three\"", "\"three\"")
+    ]
+
+    def test_edits_parse_as_from_scratch(self):
+        parser = IncrementalParser()
+        code = self.module
+        parser.parse(code)
+        for old, new in self.edits:
+            code = code.replace(old, new, 1)
+            self.assertEquals(get_canonical_code(parser.parse(code)), get_canonical_code(parse(code, use_cache=False, backend="pratt")), new)
+            self.assertEquals(
+                [ (t.type, t.text, t.line, t.column, t.index, t.offset) for t in parser.tokens ],
+                [ (t.type, t.text, t.line, t.column, t.index, t.offset) for t in tokenize(code) ]
+            )
+
+    def test_unchanged_functions_are_reused(self):
+        parser = IncrementalParser()
+        first = parser.parse(self.module)
+        second = parser.parse(self.module.replace("return 3;", "return 4;"))
+
+        self.assertIs(second._get("add"), first._get("add"))
+        self.assertIs(second._get("sum"), first._get("sum"))
+        self.assertIsNot(second._get("three"), first._get("three"))
+        self.assertEquals(parser.tokens_lexed, 3)
+
+    def test_moved_functions_are_relocated(self):
+        parser = IncrementalParser()
+        first = parser.parse(self.module)
+        line = first._get("three").line
+        second = parser.parse(self.module.replace("return x + y;", "return x\n                + y;"))
+
+        self.assertEquals(parser.functions_reused, 2)
+        self.assertIs(second._get("three"), first._get("three"))
+        self.assertEquals(second._get("three").line, line + 1)
+        self.assertEquals(second._get("three")._get("code").line, line + 1)
+
+    def test_syntax_errors_are_recovered_from(self):
+        parser = IncrementalParser()
+        parser.parse(self.module)
+        with self.assertRaises(ParseError):
+            parser.parse(self.module.replace("return 3;", "return 3"))
+        code = self.module.replace("return 3;", "return 5;")
+        self.assertEquals(get_canonical_code(parser.parse(code)), get_canonical_code(parse(code, use_cache=False, backend="pratt")))
+
+    def test_verification_reuses_unchanged_functions(self):
+        parser = IncrementalParser()
+        verifier = IncrementalVerifier(check_safe_exit=True)
+
+        first = verifier.verify(parser.parse(self.module))
+        self.assertEquals(verifier.functions_prepared, 3)
+
+        second = verifier.verify(parser.parse(self.module.replace("return 3;", "return 4;")))
+        self.assertEquals(verifier.functions_prepared, 1)
+        self.assertIs(second["sum"], first["sum"])
+
+        frame_manager = FrameManager()
+        with frame_manager.capture() as capture_result:
+            capture_result.attempt_capture_or_raise(*second["three"].close(verifier.context).invoke(NO_VALUE, frame_manager))
+        self.assertEquals(capture_result.value, 4)
+
+    def test_verification_reuses_moved_functions(self):
+        parser = IncrementalParser()
+        verifier = IncrementalVerifier(check_safe_exit=True)
+
+        first = verifier.verify(parser.parse(self.module))
+        second = verifier.verify(parser.parse(self.module.replace("return x + y;", "return x\n                + y;")))
+        self.assertEquals(verifier.functions_prepared, 1)
+        self.assertIs(second["sum"], first["sum"])
+        self.assertIs(second["three"], first["three"])
+
+
+class TestAheadOfTimeCompilation(TestCase):
+    program = """
+        function() {
+            int result = 0;
+            for(var i from range(1, 5)) {
+                result = result + i * 2;
+            };
+            return result;
+        }
+    """
+
+    def compile_to_directory(self, directory, **kwargs):
+        path = os.path.join(directory, "compiled_program.py")
+        with io.open(path, "w", encoding="utf-8") as module:
+            module.write(compile_program(parse(self.program, use_cache=False), "program.ld", **kwargs))
+        return path
+
+    def test_import_and_run(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for transpile in (True, False):
+                module = imp.load_source(str("compiled_program"), self.compile_to_directory(directory, transpile=transpile))
+                self.assertEquals(module.run().value, 20)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_runs_without_parser(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.compile_to_directory(directory)
+            repository = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            output = subprocess.check_output([
+                sys.executable, "-c",
+                "import sys, compiled_program; compiled_program.PROGRAM.main(); print 'antlr4' in sys.modules, 'lockdown.parser.parser' in sys.modules"
+            ], cwd=directory, env=dict(os.environ, PYTHONPATH=os.pathsep.join([ directory, repository ])))
+            self.assertEquals(output.split(), [ "20", "False", "False" ])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_runs_without_preparing(self):
+        directory = tempfile.mkdtemp()
+        try:
+            repository = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            for transpile in (True, False):
+                self.compile_to_directory(directory, transpile=transpile)
+                output = subprocess.check_output([
+                    sys.executable, "-B", "-c", "\n".join([
+                        "from lockdown.utils import set_debug, set_runtime_type_information",
+                        "set_debug(False)",
+                        "set_runtime_type_information(True)",
+                        "from lockdown.executor import bootstrap, function",
+                        "def fail(*args, **kwargs):",
+                        "    raise AssertionError()",
+                        "bootstrap.prepare_function = function.OpenFunction.transpile = fail",
+                        "import compiled_program",
+                        "compiled_program.PROGRAM.main()"
+                    ])
+                ], cwd=directory, env=dict(os.environ, PYTHONPATH=os.pathsep.join([ directory, repository ])))
+                self.assertEquals(output.split(), [ "20" ])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_unsafe_programs_fail_to_compile(self):
+        with self.assertRaises(BootstrapException):
+            compile_program(parse("""
+                function() {
+                    return foo.bar;
+                }
+            """, use_cache=False), "program.ld")
+
+
+class TestCommandLine(TestCase):
+    program = TestAheadOfTimeCompilation.program
+
+    def run_lockdown(self, directory, *arguments):
+        repository = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        process = subprocess.Popen(
+            [ sys.executable, "-m", "lockdown" ] + list(arguments),
+            cwd=directory, env=dict(os.environ, PYTHONPATH=repository), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        output, errors = process.communicate()
+        return process.returncode, output, errors
+
+    def test_run(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with io.open(os.path.join(directory, "program.ld"), "w", encoding="utf-8") as program:
+                program.write(self.program)
+            for mode in ("interpret", "transpile"):
+                returncode, output, errors = self.run_lockdown(
+                    directory, "run", "program.ld", "-s", "-m", mode, "--parse-cache", "cache", "--timings"
+                )
+                self.assertEquals((returncode, output), (0, "20\n"))
+                self.assertIn("execute", errors)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_unsafe_program(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with io.open(os.path.join(directory, "program.ld"), "w", encoding="utf-8") as program:
+                program.write("function() { return foo.bar; }")
+            returncode, output, errors = self.run_lockdown(directory, "run", "program.ld", "-s")
+            self.assertEquals(returncode, 1)
+            self.assertIn("is not safe", errors)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_profile_opcodes(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with io.open(os.path.join(directory, "program.ld"), "w", encoding="utf-8") as program:
+                program.write(self.program)
+            returncode, output, errors = self.run_lockdown(
+                directory, "run", "program.ld", "--profile-opcodes", "opcodes.prof"
+            )
+            self.assertEquals((returncode, output), (0, "20\n"))
+            self.assertIn("cumul ms", errors)
+            self.assertTrue(pstats.Stats(os.path.join(directory, "opcodes.prof")).stats)
+            self.assertTrue(os.path.exists(os.path.join(directory, "opcodes.prof.collapsed")))
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestOpcodeProfiler(TestCase):
+    program = """function() {
+    var double = function(int n) {
+        return n * 2;
+    };
+    int total = 0;
+    for(var i from range(0, 5)) {
+        total = total + double(i);
+    };
+    return total;
+}"""
+
+    def test_profile(self):
+        code = parse(self.program)
+        with profile_opcodes() as profiler:
+            result = bootstrap_function(code)
+        self.assertEquals(result.value, 20)
+
+        double = profiler.entries[("function", 2, 17)]
+        self.assertEquals(double.calls, 5)
+        self.assertEquals(profiler.entries[("dereference", 3, 15)].calls, 10)
+        # Binary opcodes have no position of their own, so take that of the function
+        self.assertEquals(profiler.entries[("multiplication", 2, 17)].calls, 5)
+        self.assertLessEqual(double.self_time, double.cumulative_time)
+
+        calls, self_time, cumulative_time = profiler.get_line_totals()[3]
+        self.assertGreater(calls, 5)
+        self.assertLessEqual(self_time, cumulative_time)
+
+        report = profiler.format_lines(self.program)
+        self.assertIn("return n * 2;", report)
+
+    def test_outputs(self):
+        profiler = OpcodeProfiler(filename="program.ld")
+        with profile_opcodes(profiler):
+            bootstrap_function(parse(self.program))
+
+        directory = tempfile.mkdtemp()
+        try:
+            stats_file = os.path.join(directory, "stats")
+            profiler.dump_stats(stats_file)
+            stats = pstats.Stats(stats_file).stats
+        finally:
+            shutil.rmtree(directory)
+        self.assertEquals(stats[("program.ld", 3, "dereference:15")][1], 10)
+
+        stacks = profiler.get_collapsed_stacks().splitlines()
+        self.assertTrue(any(
+            stack.startswith("function@1:0;") and "function@2:17;" in stack and "dereference@3:15 " in stack
+            for stack in stacks
+        ))
+
+    def test_disabled(self):
+        jump = OPCODES["multiplication"].__dict__["jump"]
+        with profile_opcodes():
+            self.assertIsNot(OPCODES["multiplication"].__dict__["jump"], jump)
+        self.assertIs(OPCODES["multiplication"].__dict__["jump"], jump)
+
+
+class TestSamplingProfiler(TestCase):
+    program = """function() {
+    int i = 0, total = 0;
+    while(i < 3000) {
+        total = total + i * 2;
+        i = i + 1;
+    };
+    return total;
+}"""
+
+    def test_interpreted(self):
+        context = get_default_global_context()
+        closed_function = prepare_function(parse(self.program), context).close(context)
+
+        handler = signal.getsignal(signal.SIGPROF)
+        with sample_lockdown(SamplingProfiler(interval=0.0005)) as profiler:
+            result = invoke_function(closed_function)
+        self.assertEquals(result.value, sum(i * 2 for i in range(3000)))
+        self.assertIs(signal.getsignal(signal.SIGPROF), handler)
+
+        self.assertGreater(profiler.samples, 0)
+        self.assertTrue(all(stack[0] == ("function", 1, 0) for stack in profiler.stacks))
+        self.assertIn("function@1:0;", profiler.get_collapsed_stacks())
+        self.assertIn("while(i < 3000) {", profiler.format_lines(self.program))
+
+    def test_transpiled(self):
+        context = get_default_global_context()
+        code = parse(self.program)
+        open_function = prepare_function(code, context)
+        closed_function = open_function.close(context).transpile()
+        self.assertIs(get_transpiled_open_function(closed_function.open_function.invoke.__func__.__code__), open_function)
+
+        with sample_lockdown(SamplingProfiler(interval=0.0005)) as profiler:
+            invoke_function(closed_function)
+        self.assertGreater(profiler.samples, 0)
+        lines = set(stack[-1][1] for stack in profiler.stacks if stack[-1][0] == "line")
+        self.assertTrue(lines & set([ 3, 4, 5 ]))
+        self.assertTrue(all(stack[0] == ("function", 1, 0) for stack in profiler.stacks))
+
+
+class TestSourceMaps(TestCase):
+    program = TestSamplingProfiler.program
+
+    def test_transpiled_lines(self):
+        context = get_default_global_context()
+        open_function = prepare_function(parse(self.program, debug=True), context)
+        closed_function = open_function.close(context).transpile("program.ld")
+        invoke_code = closed_function.open_function.invoke.__func__.__code__
+
+        self.assertEquals(invoke_code.co_filename, "<lockdown:program.ld>")
+        self.assertEquals(linecache.getline(invoke_code.co_filename, 4).strip(), "total = total + i * 2;")
+
+        # The loop is in the function that the declarations of i and total open
+        loop_code, = [
+            code for code, function in TRANSPILED_CODE.items()
+            if code.co_filename == invoke_code.co_filename and function.data.line == 2
+        ]
+        lines = [ line for _, line in dis.findlinestarts(loop_code) ]
+        self.assertEquals(lines, sorted(lines))
+        self.assertTrue(set([ 3, 4, 5 ]) <= set(lines))
+        self.assertTrue(set(lines) <= set(range(1, 9)))
+
+    def test_monotonic_lines(self):
+        module = ast.parse("def f():\n    a = 1\n    b = 2\n    return a + b\n")
+        function = module.body[0]
+        for statement, line in zip(function.body, [ 10, 5, 12 ]):
+            for node in ast.walk(statement):
+                node.lineno = line
+        ast.fix_missing_locations(module)
+        make_lines_monotonic(module)
+
+        namespace = {}
+        exec(compile(module, "<test>", "exec"), namespace)
+        lines = [ line for _, line in dis.findlinestarts(namespace["f"].__code__) ]
+        self.assertEquals(lines, [ 10, 12 ])
+
 
 class TestSpeed(TestCase):
     def test_loops(self):
@@ -841,3 +1620,19 @@ class TestTranspilation(TestCase):
         result = bootstrap_function(code, transpile=True)
         self.assertEquals(result.value, 42)
 
+
+    def test_for_list(self):
+        code = parse("""
+            function() {
+                int result = 0;
+                for(var i in <list(range(1, 5))>) {
+                    if(i == 4) {
+                        break;
+                    };
+                    result = result + i;
+                };
+                return result;
+            }
+        """)
+        result = bootstrap_function(code, transpile=True)
+        self.assertEquals(result.value, 1 + 2 + 3)
@@ -28,7 +28,14 @@ if __name__ == "__main__":
     from lockdown.type_system.test import *
 
     if args.p:
-        with profile(args.p):
-            unittest.main()
+        from lockdown.type_system.statistics import TypeSystemStatistics
+        statistics = TypeSystemStatistics()
+        statistics.enable()
+        try:
+            with profile(args.p):
+                unittest.main()
+        finally:
+            statistics.disable()
+            sys.stderr.write(statistics.format_statistics())
     else:
         unittest.main()
@@ -8,7 +8,8 @@ from lockdown.type_system.core_types import Type, unwrap_types, OneOfType, \
 from lockdown.type_system.exceptions import FatalError, IsNotCompositeType, \
     CompositeTypeIncompatibleWithTarget, CompositeTypeIsInconsistent, \
     DanglingInferredType
-from lockdown.type_system.managers import get_manager, get_type_of_value
+from lockdown.type_system.managers import get_manager, get_type_of_value, \
+    managers_by_object_id, UnmanagedValue
 from lockdown.type_system.micro_ops import merge_composite_types
 from lockdown.utils import MISSING
 import lockdown
@@ -142,6 +143,10 @@ results_by_target_id = defaultdict(lambda: defaultdict(lambda: None))
 results_by_source_id = defaultdict(lambda: defaultdict(lambda: None))
 strong_links = {}
 
+# Ids of containers holding deferred element types that might not fit their elements, which are
+# only deferred when add_composite_type(defer_elements=True) asks for it
+objects_with_deferred_types = set()
+
 
 def type_cleared(type_weakref):
     type_id = type_ids_for_weakref_id[id(type_weakref)]
@@ -153,7 +158,30 @@ def type_cleared(type_weakref):
 
 
 class Composite(object):
-    pass
+    def _types_attached(self, manager):
+        pass
+
+class DeferredElementType(object):
+    """
+    An element type that binding types to a container would have bound to each element reached
+    through a wildcard getter, held on the container until each element is first read.
+
+    bound_keys are the keys whose elements it has been bound to since, count times. A type that
+    admits any value fits every element, so binding it later can never fail, and the bindings it
+    makes constrain nothing. Only strict types, which do not, can fail when an element is read.
+    """
+    __slots__ = [ "type", "count", "bound_keys", "strict" ]
+
+    def __init__(self, type):
+        self.type = type
+        self.count = 0
+        self.bound_keys = set()
+        self.strict = not admits_any_value(type)
+
+
+def admits_any_value(type):
+    return any(isinstance(sub_type, AnyType) for sub_type in unwrap_types(type))
+
 
 class CompositeObjectManager(object):
     def __init__(self, obj, on_gc_callback):
@@ -161,6 +189,20 @@ class CompositeObjectManager(object):
         self.obj_id = id(obj)
         self.attached_types = {}
         self.attached_type_counts = defaultdict(int)
+        # The element types that binding a type to this container did not bind to each element
+        # reached through its wildcard getter yet, by id
+        self.deferred_element_types = {}
+        # Bumped on every change to this object, or to the types bound to it, that could change
+        # the result of a type check that walks through it
+        self.version = 0
+        # Results of does_value_fit_through_type and is_type_bindable_to_value for this object,
+        # and the managers of the objects that each result walked through
+        self.type_check_cache = {}
+        self.type_check_dependencies = {}
+        # Cached type checks on other objects that walked through this object
+        self.dependent_type_checks = {}
+        # Set by freeze, after which no type that could change this object can be bound to it
+        self.frozen = False
 #         self.child_key_type_references = defaultdict(lambda: defaultdict(list))
 #         self.child_value_type_references = defaultdict(lambda: defaultdict(list))
         self.on_gc_callback = on_gc_callback
@@ -176,8 +218,31 @@ class CompositeObjectManager(object):
         return self.obj_ref()
 
     def obj_gced(self, _):
+        objects_with_deferred_types.discard(self.obj_id)
+        for cache_key in list(self.type_check_cache.keys()):
+            self.drop_type_check(cache_key)
+        self.bump_version()
         self.on_gc_callback(self.obj_id)
 
+    def bump_version(self):
+        self.version += 1
+        if self.dependent_type_checks:
+            dependent_type_checks = self.dependent_type_checks
+            self.dependent_type_checks = {}
+            for (_, cache_key), manager in dependent_type_checks.items():
+                manager.drop_type_check(cache_key)
+
+    def cache_type_check(self, cache_key, type, result, visited_managers):
+        self.type_check_cache[cache_key] = (type, result)
+        self.type_check_dependencies[cache_key] = visited_managers
+        for visited_manager in visited_managers:
+            visited_manager.dependent_type_checks[(self.obj_id, cache_key)] = self
+
+    def drop_type_check(self, cache_key):
+        self.type_check_cache.pop(cache_key, None)
+        for visited_manager in self.type_check_dependencies.pop(cache_key, ()):
+            visited_manager.dependent_type_checks.pop((self.obj_id, cache_key), None)
+
     def get_effective_composite_type(self):
         if not self.cached_effective_composite_type:
             obj = self.get_obj()
@@ -189,10 +254,33 @@ class CompositeObjectManager(object):
 
         if self.attached_type_counts[new_type_id] == 0:
             self.cached_effective_composite_type = None
+            self.bump_version()
 
         self.attached_types[new_type_id] = new_type
         self.attached_type_counts[new_type_id] += multiplier
 
+    def defer_element_type(self, element_type, multiplier=1):
+        deferred_element_type = self.deferred_element_types.get(id(element_type), None)
+        if deferred_element_type is None:
+            deferred_element_type = self.deferred_element_types[id(element_type)] = DeferredElementType(element_type)
+            if deferred_element_type.strict:
+                objects_with_deferred_types.add(self.obj_id)
+        deferred_element_type.count += multiplier
+        self.bump_version()
+
+    def undefer_element_type(self, element_type, multiplier=1):
+        deferred_element_type = self.deferred_element_types.get(id(element_type), None)
+        if deferred_element_type is None:
+            raise FatalError()
+        deferred_element_type.count -= multiplier
+        if deferred_element_type.count < 0:
+            raise FatalError()
+        if deferred_element_type.count == 0:
+            del self.deferred_element_types[id(element_type)]
+            if not any(d.strict for d in self.deferred_element_types.values()):
+                objects_with_deferred_types.discard(self.obj_id)
+        self.bump_version()
+
     def detach_type(self, remove_type, multiplier=1):
         remove_type_id = id(remove_type)
         if remove_type_id not in self.attached_type_counts:
@@ -202,6 +290,7 @@ class CompositeObjectManager(object):
             raise FatalError()
         if self.attached_type_counts[remove_type_id] == 0:
             self.cached_effective_composite_type = None
+            self.bump_version()
             del self.attached_types[remove_type_id]
             del self.attached_type_counts[remove_type_id]
 
@@ -209,9 +298,9 @@ class CompositeObjectManager(object):
         effective_composite_type = self.get_effective_composite_type()
         return effective_composite_type.micro_op_types.get(tag, None)
 
-    def add_composite_type(self, new_type):
+    def add_composite_type(self, new_type, defer_elements=False):
         # TODO: remove
-        add_composite_type(self, new_type)
+        add_composite_type(self, new_type, defer_elements=defer_elements)
 
     def remove_composite_type(self, remove_type):
         # TODO: remove
@@ -384,39 +473,174 @@ def prepare_composite_lhs_type(composite_type, guide_type, results_cache=None):
 
     return result
 
-def add_composite_type(target_manager, new_type, key_filter=None, multiplier=1):
+def add_composite_type(target_manager, new_type, key_filter=None, multiplier=1, defer_elements=False):
+    """
+    Binds new_type to the object managed by target_manager, and the types of its micro ops to the
+    objects they reach.
+
+    The element types of wildcard getters that admit any value are not bound to each element here.
+    The container records them, and each is bound to an element when it is first read, so binding
+    a large container costs the same as binding an empty one. With defer_elements, element types
+    that do not admit any value are deferred the same way, without checking the elements, and an
+    element that does not fit raises CompositeTypeIncompatibleWithTarget when it is read.
+    """
     types_to_bind = {}
-    succeeded = build_binding_map_for_type(None, new_type, target_manager.get_obj(), target_manager, key_filter, MISSING, {}, types_to_bind)
+    succeeded = build_binding_map_for_type(
+        None, new_type, target_manager.get_obj(), target_manager, key_filter, MISSING, {}, types_to_bind,
+        defer_elements=defer_elements
+    )
     if len(types_to_bind) > 100:
         pass
     if not succeeded:
         raise CompositeTypeIncompatibleWithTarget()
 
-    for _, type, target in types_to_bind.values():
-        get_manager(target).attach_type(type, multiplier=multiplier)
+    attached_targets = {}
+    for _, type, target, deferred in types_to_bind.values():
+        manager = get_manager(target)
+        if deferred:
+            manager.defer_element_type(type, multiplier=multiplier)
+        else:
+            manager.attach_type(type, multiplier=multiplier)
+            attached_targets[id(target)] = (target, manager)
+
+    for target, manager in attached_targets.values():
+        target._types_attached(manager)
 
 
 def remove_composite_type(target_manager, remove_type, key_filter=None, multiplier=1):
     types_to_bind = {}
-    succeeded = build_binding_map_for_type(None, remove_type, target_manager.get_obj(), target_manager, key_filter, MISSING, {}, types_to_bind)
+    succeeded = build_binding_map_for_type(
+        None, remove_type, target_manager.get_obj(), target_manager, key_filter, MISSING, {}, types_to_bind,
+        unbinding=True
+    )
     if len(types_to_bind) > 100:
         pass
     if not succeeded:
         raise CompositeTypeIncompatibleWithTarget()
 
-    for _, type, target in types_to_bind.values():
-        get_manager(target).detach_type(type, multiplier=multiplier)
+    for _, type, target, deferred in types_to_bind.values():
+        if deferred:
+            get_manager(target).undefer_element_type(type, multiplier=multiplier)
+        else:
+            get_manager(target).detach_type(type, multiplier=multiplier)
+
+def bind_deferred_element(manager, key, value):
+    """
+    Binds the deferred element types of the container managed by manager to value, its element at key,
+    unless they have been already
+    """
+    for deferred_element_type in manager.deferred_element_types.values():
+        if key in deferred_element_type.bound_keys:
+            continue
+        if isinstance(value, Composite):
+            add_composite_type(
+                get_manager(value), deferred_element_type.type,
+                multiplier=deferred_element_type.count, defer_elements=deferred_element_type.strict
+            )
+        elif deferred_element_type.strict and not does_value_fit_through_type(value, deferred_element_type.type):
+            raise CompositeTypeIncompatibleWithTarget()
+        deferred_element_type.bound_keys.add(key)
+
+def bind_deferred_elements(manager):
+    obj = manager.get_obj()
+    for key in obj._keys():
+        bind_deferred_element(manager, key, obj._get(key))
+
+def get_bound_value(obj, key):
+    """
+    Reads the element of obj at key from its storage, binding any deferred element types to it first.
+    Anything that reads elements without a getter micro op should read them through this.
+    """
+    value = obj._get(key)
+    # Without a manager, nothing can be deferred on obj
+    manager = managers_by_object_id.get(id(obj), None)
+    if manager and manager.deferred_element_types:
+        bind_deferred_element(manager, key, value)
+    return value
+
+def storage_changed(obj):
+    """
+    Invalidates the type checks cached against obj. The raw storage primitives call this before
+    they write, as anything that writes to storage directly bypasses the micro ops that would
+    otherwise. Frozen objects can not be written at all.
+    """
+    manager = managers_by_object_id.get(id(obj), None)
+    if manager:
+        if manager.frozen:
+            raise FatalError()
+        manager.bump_version()
+
+def freeze(obj):
+    """
+    Freezes obj and every composite reachable from it, so they can only be read. Types with micro
+    ops other than getters can no longer be bound to them, and their storage can not be written.
+    """
+    stack = [ obj ]
+    seen = set()
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or not isinstance(obj, Composite):
+            continue
+        seen.add(id(obj))
+        get_manager(obj).frozen = True
+        stack.extend(obj._values())
+
+def get_bound_values(obj):
+    manager = managers_by_object_id.get(id(obj), None)
+    if manager and manager.deferred_element_types:
+        bind_deferred_elements(manager)
+    return obj._values()
 
 def can_add_composite_type_with_filter(target, new_type, key_filter, substitute_value):
-    return build_binding_map_for_type(None, new_type, target, get_manager(target), key_filter, substitute_value, {}, {})
+    return build_binding_map_for_type(
+        None, new_type, target, get_manager(target), key_filter, substitute_value, {}, {},
+        reuse_attached_types=not objects_with_deferred_types
+    )
 
 def is_type_bindable_to_value(value, type):
-    return build_binding_map_for_type(None, type, value, get_manager(value), None, MISSING, {}, {})
+    return cached_type_check(value, type, True)
 
 def does_value_fit_through_type(value, type):
-    return build_binding_map_for_type(None, type, value, get_manager(value), None, MISSING, {}, None, build_binding_map=False)
+    return cached_type_check(value, type, False)
+
+def cached_type_check(value, type, build_binding_map):
+    """
+    Runs build_binding_map_for_type as a check, reusing the last result for this value and type.
+
+    A result stays cached until one of the objects the check walked through is changed, or has
+    its bound types changed, which bumps the version on its manager and drops the result.
+    """
+    manager = get_manager(value)
+
+    if not manager:
+        return build_binding_map_for_type(
+            None, type, value, manager, None, MISSING, {}, {} if build_binding_map else None, build_binding_map=build_binding_map
+        )
+
+    cache_key = (id(type), build_binding_map)
+
+    cached_result = manager.type_check_cache.get(cache_key, None)
+    if cached_result and cached_result[0] is type:
+        return cached_result[1]
+
+    cache = {}
+    result = build_binding_map_for_type(
+        None, type, value, manager, None, MISSING, cache, {} if build_binding_map else None, build_binding_map=build_binding_map,
+        reuse_attached_types=not objects_with_deferred_types
+    )
+
+    visited_managers = set()
+    for _, _, target_id in cache.keys():
+        visited_manager = managers_by_object_id.get(target_id, None)
+        if visited_manager:
+            visited_managers.add(visited_manager)
+
+    manager.cache_type_check(cache_key, type, result, visited_managers)
+
+    return result
 
 def bind_key(manager, key_filter):
+    manager.bump_version()
     for attached_type in manager.attached_types.values():
         add_composite_type(
             manager,
@@ -424,9 +648,18 @@ def bind_key(manager, key_filter):
             key_filter=key_filter,
             multiplier=manager.attached_type_counts[id(attached_type)]
         )
+    # Binding by key binds every element type to the new element straight away
+    for deferred_element_type in manager.deferred_element_types.values():
+        deferred_element_type.bound_keys.add(key_filter)
 
 
 def unbind_key(manager, key_filter):
+    manager.bump_version()
+    if manager.deferred_element_types:
+        # So that the element being unbound has every type that is about to be removed from it
+        obj = manager.get_obj()
+        if obj._contains(key_filter):
+            bind_deferred_element(manager, key_filter, obj._get(key_filter))
     for attached_type in manager.attached_types.values():
         remove_composite_type(
             manager,
@@ -434,69 +667,237 @@ def unbind_key(manager, key_filter):
             key_filter=key_filter,
             multiplier=manager.attached_type_counts[id(attached_type)]
         )
+    for deferred_element_type in manager.deferred_element_types.values():
+        deferred_element_type.bound_keys.discard(key_filter)
 
 
-def build_binding_map_for_type(source_micro_op, new_type, target, target_manager, key_filter, substitute_value, cache, types_to_bind, build_binding_map=True):
-    result_key = (id(source_micro_op), id(new_type), id(target))
+# Values that never have managers, which build_binding_map_for_type checks without walking into
+PRIMITIVE_VALUE_CLASSES = frozenset([ int, bool, str, unicode, type(None) ])
 
-    if result_key in cache:
-        return cache[result_key]
+# The micro ops that can be bound to frozen objects, see freeze
+READONLY_MICRO_OP_TAGS = frozenset([ "get", "get-wildcard" ])
 
-#    print "{}:{}:{}".format(id(source_micro_op), id(new_type), id(target))
 
-    cache[result_key] = True
+class BindingMapStatistics(object):
+    def __init__(self):
+        self.reset()
 
-    extra_types_to_bind = {}
+    def reset(self):
+        self.walks = 0
+        self.nodes_visited = 0
+        self.max_nodes_visited = 0
+        self.last_nodes_visited = 0
 
-    target_is_composite = isinstance(target, Composite)
-    target_effective_type = None
-    if target_manager:
-        target_effective_type = target_manager.get_effective_composite_type()
+    def record_walk(self, nodes_visited):
+        self.walks += 1
+        self.nodes_visited += nodes_visited
+        self.max_nodes_visited = max(self.max_nodes_visited, nodes_visited)
+        self.last_nodes_visited = nodes_visited
 
-    atleast_one_sub_type_worked = False
-    for sub_type in unwrap_types(new_type):
-        if isinstance(sub_type, CompositeType) and target_is_composite:
-            if build_binding_map and not sub_type.is_self_consistent():
-                raise CompositeTypeIsInconsistent()
+binding_map_statistics = BindingMapStatistics()
 
-            micro_ops_checks_worked = True
 
-            for key, micro_op in sub_type.micro_op_types.items():
-                if not micro_op.is_bindable_to(target):
-                    micro_ops_checks_worked = False
-                    break
+def build_binding_map_for_type(
+    source_micro_op, new_type, target, target_manager, key_filter, substitute_value, cache, types_to_bind,
+    build_binding_map=True, defer_elements=False, unbinding=False, reuse_attached_types=False
+):
+    """
+    Checks whether new_type can be bound to target, filling types_to_bind with the (source micro op,
+    type, target, deferred) bindings needed to do it if build_binding_map is set.
 
-                if micro_op.conflicts_with(sub_type, target_effective_type):
-                    micro_ops_checks_worked = False
-                    break
+    The object graph is walked depth first with an explicit stack, so deep or cyclic graphs do not
+    hit the recursion limit. Nodes already in cache are not walked again. With reuse_attached_types,
+    which is only safe for checks that do not bind the result and when no container holds strict
+    deferred element types, objects that already have the type attached are not walked into either.
+    """
+    walk = BindingMapWalk(cache, build_binding_map, defer_elements, unbinding, reuse_attached_types)
 
-                next_targets, next_new_type = micro_op.prepare_bind(target, key_filter, substitute_value)
+    try:
+        result_key = (id(source_micro_op), id(new_type), id(target))
 
-                for next_target in next_targets:
-                    if not build_binding_map_for_type(
-                        micro_op, next_new_type, next_target, get_manager(next_target), None, MISSING, cache, extra_types_to_bind, build_binding_map=build_binding_map
-                    ):
-                        micro_ops_checks_worked = False
-                        break
+        if result_key in cache:
+            return cache[result_key]
 
-            if micro_ops_checks_worked:
-                if key_filter is None and build_binding_map:
-                    extra_types_to_bind[result_key] = (source_micro_op, sub_type, target)
-                atleast_one_sub_type_worked = True
+        if key_filter is None and (type(target) in PRIMITIVE_VALUE_CLASSES or isinstance(target, UnmanagedValue)):
+            return walk.visit_value(result_key, new_type, target)
+
+        return walk.run(walk.visit(
+            source_micro_op, new_type, target, target_manager, key_filter, substitute_value, types_to_bind
+        ))
+    finally:
+        binding_map_statistics.record_walk(walk.nodes_visited)
+
+
+class BindingMapWalk(object):
+    def __init__(self, cache, build_binding_map, defer_elements, unbinding, reuse_attached_types):
+        self.cache = cache
+        self.build_binding_map = build_binding_map
+        self.defer_elements = defer_elements
+        self.unbinding = unbinding
+        self.reuse_attached_types = reuse_attached_types
+        self.nodes_visited = 0
+
+    def run(self, root):
+        # Each node is a generator that yields the arguments of the child nodes it needs, is sent their
+        # results, and finally yields its own result as a bool
+        stack = [ root ]
+        result = None
+
+        while True:
+            request = stack[-1].send(result)
+            if request is True or request is False:
+                stack.pop()
+                if not stack:
+                    return request
+                result = request
+            else:
+                stack.append(self.visit(*request))
+                result = None
+
+    def get_deferred_targets(self, element_type, target, target_manager):
+        """
+        Returns the elements of target that binding or unbinding element_type through its wildcard
+        getter has to walk now, if the rest are deferred, or None if every element has to be walked.
+        Those are the elements that deferred types have already been bound to.
+        """
+        deferred_element_type = target_manager.deferred_element_types.get(id(element_type), None)
+
+        if self.unbinding:
+            if deferred_element_type is None:
+                return None
+        else:
+            element_types = unwrap_types(element_type)
+            if not any(isinstance(t, CompositeType) for t in element_types):
+                return None
+            if not (self.defer_elements or admits_any_value(element_type)):
+                return None
+            if deferred_element_type is None:
+                return []
+
+        return [ target._get(key) for key in deferred_element_type.bound_keys ]
+
+    def visit_value(self, result_key, new_type, target):
+        self.cache[result_key] = True
+        self.nodes_visited += 1
+
+        # An UnmanagedValue is immutable, so a composite type fits it if its view type does, and
+        # nothing needs to be bound to it
+        is_unmanaged = isinstance(target, UnmanagedValue)
+
+        for sub_type in unwrap_types(new_type):
+            if isinstance(sub_type, AnyType):
+                return True
+            if (is_unmanaged or not isinstance(sub_type, CompositeType)) and sub_type.is_copyable_from(get_type_of_value(target)):
+                return True
+
+        self.cache[result_key] = False
+        return False
 
-        if isinstance(sub_type, AnyType):
-            atleast_one_sub_type_worked = True
+    def visit(self, source_micro_op, new_type, target, target_manager, key_filter, substitute_value, types_to_bind):
+        cache = self.cache
+        build_binding_map = self.build_binding_map
+        result_key = (id(source_micro_op), id(new_type), id(target))
+
+        if isinstance(target, UnmanagedValue):
+            yield self.visit_value(result_key, new_type, target)
+
+        cache[result_key] = True
+        self.nodes_visited += 1
+
+        if (
+            target_manager and key_filter is None and target_manager.obj_id in objects_with_deferred_types
+            and not (build_binding_map and (self.defer_elements or self.unbinding))
+        ):
+            # Any other walk checks or binds against every element, so the strict deferred element
+            # types have to be bound to them first
+            bind_deferred_elements(target_manager)
+
+        if self.reuse_attached_types and target_manager and key_filter is None:
+            for sub_type in unwrap_types(new_type):
+                if target_manager.attached_type_counts.get(id(sub_type), 0) > 0:
+                    yield True
+
+        extra_types_to_bind = {}
+
+        target_is_composite = isinstance(target, Composite)
+        target_effective_type = None
+        if target_manager:
+            target_effective_type = target_manager.get_effective_composite_type()
+
+        atleast_one_sub_type_worked = False
+        for sub_type in unwrap_types(new_type):
+            if isinstance(sub_type, CompositeType) and target_is_composite:
+                if build_binding_map and not sub_type.is_self_consistent():
+                    raise CompositeTypeIsInconsistent()
+
+                micro_ops_checks_worked = True
+
+                # A type being unbound passed these checks when it was attached, and has protected
+                # the target from changes that would fail them since
+                skip_checks = (
+                    self.unbinding and target_manager is not None
+                    and target_manager.attached_type_counts.get(id(sub_type), 0) > 0
+                )
 
-        if not isinstance(sub_type, CompositeType) and not target_is_composite:
-            if sub_type.is_copyable_from(get_type_of_value(target)):
+                for key, micro_op in sub_type.micro_op_types.items():
+                    if not skip_checks:
+                        if target_manager and target_manager.frozen and key[0] not in READONLY_MICRO_OP_TAGS:
+                            micro_ops_checks_worked = False
+                            break
+
+                        if not micro_op.is_bindable_to(target):
+                            micro_ops_checks_worked = False
+                            break
+
+                        if micro_op.conflicts_with(sub_type, target_effective_type):
+                            micro_ops_checks_worked = False
+                            break
+
+                    if key == ("get-wildcard", ) and key_filter is None and build_binding_map and target_manager:
+                        deferred_targets = self.get_deferred_targets(micro_op.value_type, target, target_manager)
+                    else:
+                        deferred_targets = None
+
+                    if deferred_targets is not None:
+                        next_targets, next_new_type = deferred_targets, micro_op.value_type
+                        extra_types_to_bind[("elements", id(micro_op), id(target))] = (micro_op, next_new_type, target, True)
+                    else:
+                        next_targets, next_new_type = micro_op.prepare_bind(target, key_filter, substitute_value)
+
+                    for next_target in next_targets:
+                        next_result_key = (id(micro_op), id(next_new_type), id(next_target))
+
+                        if next_result_key in cache:
+                            next_target_worked = cache[next_result_key]
+                        elif type(next_target) in PRIMITIVE_VALUE_CLASSES:
+                            next_target_worked = self.visit_value(next_result_key, next_new_type, next_target)
+                        else:
+                            next_target_worked = yield (
+                                micro_op, next_new_type, next_target, get_manager(next_target), None, MISSING, extra_types_to_bind
+                            )
+
+                        if not next_target_worked:
+                            micro_ops_checks_worked = False
+                            break
+
+                if micro_ops_checks_worked:
+                    if key_filter is None and build_binding_map:
+                        extra_types_to_bind[result_key] = (source_micro_op, sub_type, target, False)
+                    atleast_one_sub_type_worked = True
+
+            if isinstance(sub_type, AnyType):
                 atleast_one_sub_type_worked = True
 
-    if atleast_one_sub_type_worked and build_binding_map:
-        types_to_bind.update(extra_types_to_bind)
-    if not atleast_one_sub_type_worked:
-        cache[result_key] = False
+            if not isinstance(sub_type, CompositeType) and not target_is_composite:
+                if sub_type.is_copyable_from(get_type_of_value(target)):
+                    atleast_one_sub_type_worked = True
+
+        if atleast_one_sub_type_worked and build_binding_map:
+            types_to_bind.update(extra_types_to_bind)
+        if not atleast_one_sub_type_worked:
+            cache[result_key] = False
 
-    return atleast_one_sub_type_worked
+        yield atleast_one_sub_type_worked
 
 def create_reasonable_composite_type(obj):
     result = CompositeType({}, name="reasonable list type")
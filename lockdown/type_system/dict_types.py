@@ -1,7 +1,8 @@
 from UserDict import DictMixin
 
 from lockdown.type_system.composites import CompositeType, \
-    Composite, unbind_key, bind_key, does_value_fit_through_type
+    Composite, unbind_key, bind_key, does_value_fit_through_type, \
+    bind_deferred_element, storage_changed
 from lockdown.type_system.core_types import Type, merge_types, StringType
 from lockdown.type_system.exceptions import FatalError, raise_if_safe, \
     InvalidDereferenceKey, InvalidDereferenceType, InvalidAssignmentType, \
@@ -31,6 +32,8 @@ class DictWildcardGetterType(MicroOpType):
 
         if obj._contains(key):
             value = obj._get(key)
+            if target_manager.deferred_element_types:
+                bind_deferred_element(target_manager, key, value)
         else:
             default_factory = target_manager.default_factory
 
@@ -119,6 +122,8 @@ class DictGetterType(MicroOpType):
  
         if obj._contains(self.key):
             value = obj._get(self.key)
+            if target_manager.deferred_element_types:
+                bind_deferred_element(target_manager, self.key, value)
         else:
             default_factory = target_manager.default_factory
  
@@ -478,9 +483,11 @@ class RDHDict(Composite, DictMixin, object):
         raise AttributeError()
 
     def _set(self, key, value):
+        storage_changed(self)
         self.wrapped[key] = value
 
     def _delete(self, key):
+        storage_changed(self)
         del self.wrapped[key]
 
     def _contains(self, key):
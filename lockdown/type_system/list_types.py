@@ -1,11 +1,12 @@
 from _abcoll import MutableSequence
+from array import array
 from collections import OrderedDict
 
 from lockdown.type_system.composites import CompositeType, \
     Composite, unbind_key, bind_key, can_add_composite_type_with_filter,\
-    does_value_fit_through_type
+    does_value_fit_through_type, bind_deferred_element, storage_changed
 from lockdown.type_system.core_types import merge_types, Const, NoValueType, \
-    IntegerType, Type
+    IntegerType, Type, BooleanType
 from lockdown.type_system.exceptions import FatalError, raise_if_safe, \
     InvalidDereferenceKey, InvalidDereferenceType, InvalidAssignmentKey, \
     InvalidAssignmentType, MissingMicroOp
@@ -34,6 +35,8 @@ class ListWildcardGetterType(ListMicroOpType):
  
         if obj._contains(key):
             value = obj._get(key)
+            if target_manager.deferred_element_types:
+                bind_deferred_element(target_manager, key, value)
         else:
             default_factory = target_manager.default_factory
  
@@ -139,6 +142,8 @@ class ListGetterType(ListMicroOpType):
 
         if obj._contains(self.key):
             value = obj._get(self.key)
+            if target_manager.deferred_element_types:
+                bind_deferred_element(target_manager, self.key, value)
         else:
             default_factory = target_manager.default_factory
 
@@ -175,7 +180,7 @@ class ListGetterType(ListMicroOpType):
             return True
 
         wildcard_inserter = other_type.get_micro_op_type(("insert-wildcard",))
-        if wildcard_inserter and self.key > 0 and not wildcard_inserter.type_error and not wildcard_inserter.type.is_copyable_from(self.value_type):
+        if wildcard_inserter and self.key > 0 and not wildcard_inserter.type_error and not wildcard_inserter.value_type.is_copyable_from(self.value_type):
             return True
 
         detail_setter = other_type.get_micro_op_type(("set", self.key))
@@ -242,6 +247,11 @@ class ListWildcardSetterType(ListMicroOpType):
         self.type_error = type_error
 
     def invoke(self, target_manager, key, new_value, shortcut_checks=False, allow_failure=False, **kwargs):
+        obj = target_manager.get_obj()
+        if obj.typed_array is not None and type(new_value) is obj.typed_array_class and 0 <= key < obj.length and obj._is_pinned_by(target_manager):
+            obj._set(key, new_value)
+            return
+
         if is_debug() or not shortcut_checks or self.key_error or self.type_error:
             self.raise_micro_op_invocation_conflicts(target_manager, key, new_value, allow_failure)
 
@@ -321,6 +331,11 @@ class ListSetterType(ListMicroOpType):
         self.type_error = type_error
 
     def invoke(self, target_manager, new_value, shortcut_checks=False, allow_failure=False, **kwargs):
+        obj = target_manager.get_obj()
+        if obj.typed_array is not None and type(new_value) is obj.typed_array_class and 0 <= self.key < obj.length and obj._is_pinned_by(target_manager):
+            obj._set(self.key, new_value)
+            return
+
         if is_debug() or not shortcut_checks or self.key_error or self.type_error:
             self.raise_micro_op_invocation_conflicts(target_manager, new_value, allow_failure)
 
@@ -399,7 +414,7 @@ class ListWildcardDeletterType(ListMicroOpType):
         for after_key in range(key, len(target_manager.get_obj())):
             unbind_key(target_manager, after_key)
 
-        target_manager.get_obj().__delitem__(key, raw=True)
+        target_manager.get_obj()._delete(key)
 
         for after_key in range(key, len(target_manager.get_obj())):
             bind_key(target_manager, after_key)
@@ -411,7 +426,7 @@ class ListWildcardDeletterType(ListMicroOpType):
         if wildcard_getter and not wildcard_getter.key_error:
             raise_if_safe(InvalidAssignmentType, self.key_error)
 
-        detail_getter = target_type.get_micro_op_type(("get", self.key))
+        detail_getter = target_type.get_micro_op_type(("get", key))
         if detail_getter and not detail_getter.key_error:
             raise_if_safe(InvalidAssignmentType, self.key_error)
 
@@ -454,7 +469,7 @@ class ListDeletterType(ListMicroOpType):
         for after_key in range(self.key, len(target_manager.get_obj())):
             unbind_key(target_manager, after_key)
 
-        target_manager.get_obj().__delitem__(self.key, raw=True)
+        target_manager.get_obj()._delete(self.key)
 
         for after_key in range(self.key, len(target_manager.get_obj())):
             bind_key(target_manager, after_key)
@@ -504,6 +519,11 @@ class ListWildcardInsertType(ListMicroOpType):
         self.type_error = type_error
 
     def invoke(self, target_manager, key, new_value, shortcut_checks=False, allow_failure=False, **kwargs):
+        obj = target_manager.get_obj()
+        if obj.typed_array is not None and type(new_value) is obj.typed_array_class and 0 <= key <= obj.length and obj._is_pinned_by(target_manager):
+            obj._insert(key, new_value)
+            return
+
         if is_debug() or not shortcut_checks or self.key_error or self.type_error:
             self.raise_micro_op_invocation_conflicts(target_manager, key, new_value, allow_failure)
  
@@ -583,6 +603,11 @@ class ListInsertType(ListMicroOpType):
         self.type_error = type_error
 
     def invoke(self, target_manager, new_value, shortcut_checks=False, allow_failure=False, **kwargs):
+        obj = target_manager.get_obj()
+        if obj.typed_array is not None and type(new_value) is obj.typed_array_class and 0 <= self.key <= obj.length and obj._is_pinned_by(target_manager):
+            obj._insert(self.key, new_value)
+            return
+
         if is_debug() or not shortcut_checks or self.key_error or self.type_error:
             self.raise_micro_op_invocation_conflicts(target_manager, new_value, allow_failure)
 
@@ -665,6 +690,8 @@ class ListRangeGetterType(ListMicroOpType):
 
         if obj._contains(key):
             value = obj._get(key)
+            if target_manager.deferred_element_types:
+                bind_deferred_element(target_manager, key, value)
         else:
             default_factory = target_manager.default_factory
 
@@ -706,7 +733,7 @@ class ListRangeGetterType(ListMicroOpType):
             return True
 
         wildcard_inserter = other_type.get_micro_op_type(("insert-wildcard",))
-        if wildcard_inserter and not self.type_error and not wildcard_setter.type_error and not wildcard_inserter.type.is_copyable_from(self.value_type):
+        if wildcard_inserter and not self.type_error and not wildcard_setter.type_error and not wildcard_inserter.value_type.is_copyable_from(self.value_type):
             return True
 
         for tag, other in other_type.micro_op_types.items():
@@ -861,12 +888,89 @@ def RDHListType(element_types, wildcard_type, allow_push=True, allow_wildcard_in
 
 SPARSE_ELEMENT = object()
 
+# Typecodes for the arrays that back lists whose elements are pinned to one primitive type
+PRIMITIVE_ARRAY_TYPECODES = {
+    int: "l",
+    bool: "b"
+}
+
+PRIMITIVE_ELEMENT_CLASSES = {
+    IntegerType: int,
+    BooleanType: bool
+}
+
+def is_list_type(composite_type):
+    """
+    Returns True if only RDHLists can have composite_type bound to them, as every list micro op
+    can only be bound to an RDHList.
+    """
+    return isinstance(composite_type, CompositeType) and any(
+        isinstance(micro_op, ListMicroOpType) for micro_op in composite_type.micro_op_types.values()
+    )
+
+def get_pinned_element_class(composite_type):
+    """
+    Returns int or bool if every value that can be read from or written to a list through
+    composite_type is of exactly that class, otherwise None.
+    """
+    pinned_element_class = getattr(composite_type, "_pinned_element_class", MISSING)
+    if pinned_element_class is not MISSING:
+        return pinned_element_class
+
+    pinned_element_class = None
+
+    if composite_type.get_micro_op_type(("get-wildcard", )):
+        for micro_op in composite_type.micro_op_types.values():
+            value_type = getattr(micro_op, "value_type", None)
+            if value_type is None:
+                continue
+            element_class = PRIMITIVE_ELEMENT_CLASSES.get(type(value_type), None)
+            if element_class is None or (pinned_element_class and element_class is not pinned_element_class):
+                pinned_element_class = None
+                break
+            pinned_element_class = element_class
+
+    composite_type._pinned_element_class = pinned_element_class
+
+    return pinned_element_class
+
+
+class PrimitiveArrayView(object):
+    """
+    Stands in for RDHList.wrapped while the list is backed by a typed array, presenting the
+    same index -> value mapping.
+    """
+    def __init__(self, rdh_list):
+        self.rdh_list = rdh_list
+
+    def __contains__(self, key):
+        return isinstance(key, int) and 0 <= key < self.rdh_list.length
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self.rdh_list._get(key)
+
+    def __len__(self):
+        return self.rdh_list.length
+
+    def keys(self):
+        return self.rdh_list._keys()
+
+    def values(self):
+        return self.rdh_list._values()
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
 
 class RDHList(Composite, MutableSequence, object):
     def __init__(self, initial_data, is_sparse=False, bind=None, debug_reason=None):
         self.wrapped = {
             index: value for index, value in enumerate(initial_data)
         }
+        self.typed_array = None
+        self.typed_array_class = None
         manager = get_manager(self, "RDHList")
         self.length = len(initial_data)
         self.is_sparse = is_sparse
@@ -874,7 +978,56 @@ class RDHList(Composite, MutableSequence, object):
         if bind:
             get_manager(self).add_composite_type(bind)
 
+    def _types_attached(self, manager):
+        if self.typed_array is None and not self.is_sparse:
+            element_class = get_pinned_element_class(manager.get_effective_composite_type())
+            if element_class:
+                self._use_typed_array(element_class)
+
+    def _is_pinned_by(self, manager):
+        return get_pinned_element_class(manager.get_effective_composite_type()) is self.typed_array_class
+
+    def _use_typed_array(self, element_class):
+        values = [ self.wrapped.get(index, SPARSE_ELEMENT) for index in range(self.length) ]
+        for value in values:
+            if type(value) is not element_class:
+                return
+        try:
+            self.typed_array = array(PRIMITIVE_ARRAY_TYPECODES[element_class], values)
+        except OverflowError:
+            return
+        self.typed_array_class = element_class
+        self.wrapped = PrimitiveArrayView(self)
+
+    def _use_generic_storage(self):
+        self.wrapped = {
+            index: value for index, value in enumerate(self._values())
+        }
+        self.typed_array = None
+        self.typed_array_class = None
+
+    def _as_buffer(self):
+        """
+        Returns a read only buffer over the typed array backing this list, for handing the
+        elements to Python code without copying them, or None if the list is not backed by one.
+        """
+        if self.typed_array is None:
+            return None
+        return buffer(self.typed_array)
+
     def _set(self, key, value):
+        storage_changed(self)
+        if self.typed_array is not None:
+            if not (0 <= key < self.length):
+                raise IndexError()
+            if type(value) is self.typed_array_class:
+                try:
+                    self.typed_array[key] = value
+                    return
+                except OverflowError:
+                    pass
+            self._use_generic_storage()
+
         if key not in self.wrapped and not self.is_sparse:
             raise IndexError()
 
@@ -882,6 +1035,12 @@ class RDHList(Composite, MutableSequence, object):
         self.length = max(self.length, key + 1)
 
     def _get(self, key):
+        if self.typed_array is not None:
+            if 0 <= key < self.length:
+                if self.typed_array_class is bool:
+                    return bool(self.typed_array[key])
+                return self.typed_array[key]
+            raise IndexError()
         if key in self.wrapped:
             return self.wrapped[key]
         if self.is_sparse and key >= 0 and key < self.length:
@@ -889,6 +1048,14 @@ class RDHList(Composite, MutableSequence, object):
         raise IndexError()
 
     def _delete(self, key):
+        storage_changed(self)
+        if self.typed_array is not None:
+            if not (0 <= key < self.length):
+                raise KeyError(key)
+            del self.typed_array[key]
+            self.length -= 1
+            return
+
         del self.wrapped[key]
         keys_above_key = sorted([k for k in self.wrapped.keys() if k > key])
         for k in keys_above_key:
@@ -903,9 +1070,26 @@ class RDHList(Composite, MutableSequence, object):
         return list(range(self.length))
 
     def _values(self):
+        if self.typed_array is not None:
+            if self.typed_array_class is bool:
+                return [ bool(v) for v in self.typed_array ]
+            return self.typed_array.tolist()
         return [self._get(k) for k in self._keys()]
 
     def _insert(self, key, value):
+        storage_changed(self)
+        if self.typed_array is not None:
+            if not (0 <= key <= self.length):
+                raise IndexError()
+            if type(value) is self.typed_array_class:
+                try:
+                    self.typed_array.insert(key, value)
+                    self.length += 1
+                    return
+                except OverflowError:
+                    pass
+            self._use_generic_storage()
+
         # <= because  we  allow inserts after the last element in the list
         if not (key >= 0 and key <= self.length) and not self.is_sparse:
             raise IndexError()
@@ -8,12 +8,22 @@ from lockdown.utils import InternalMarker, NO_VALUE, is_debug,\
 
 managers_by_object_id = {}
 
+
+class UnmanagedValue(object):
+    """
+    Base for immutable values that never get a manager. Rather than having types bound to it,
+    every value is seen through the single composite type that its subclass's get_view_type
+    returns.
+    """
+    __slots__ = ()
+
+
 def get_manager(obj, trigger=None):
     manager = managers_by_object_id.get(id(obj), None)
     if manager:
         return manager
 
-    if isinstance(obj, InternalMarker):
+    if isinstance(obj, (InternalMarker, UnmanagedValue)):
         return None
 
     from lockdown.type_system.composites import Composite
@@ -88,6 +98,8 @@ def get_type_of_value(value):
         return NoValueType()
     if isinstance(value, Type):
         return NoValueType()
+    if isinstance(value, UnmanagedValue):
+        return value.get_view_type()
 
     from lockdown.executor.function import RDHFunction, OpenFunction
     if isinstance(value, (RDHFunction, OpenFunction)):
@@ -1,7 +1,7 @@
 from lockdown.executor.ast_utils import compile_statement, compile_expression
 from lockdown.type_system.composites import CompositeType, \
     Composite, unbind_key, bind_key, can_add_composite_type_with_filter,\
-    does_value_fit_through_type
+    does_value_fit_through_type, bind_deferred_element, storage_changed
 from lockdown.type_system.core_types import merge_types, Type, Const, OneOfType, \
     AnyType, StringType, NoValueType
 from lockdown.type_system.exceptions import FatalError, raise_if_safe, \
@@ -39,6 +39,8 @@ class ObjectWildcardGetterType(MicroOpType):
 
         if obj._contains(key):
             value = obj._get(key)
+            if target_manager.deferred_element_types:
+                bind_deferred_element(target_manager, key, value)
         else:
             default_factory = target_manager.default_factory
 
@@ -147,9 +149,11 @@ class ObjectGetterType(MicroOpType):
         if is_debug() or self.key_error or self.type_error:
             self.raise_micro_op_invocation_conflicts(target_manager)
 
-        if self.key in target_manager.get_obj()._keys():
+        try:
             value = target_manager.get_obj()._get(self.key)
-        else:
+            if target_manager.deferred_element_types:
+                bind_deferred_element(target_manager, self.key, value)
+        except AttributeError:
             default_factory = target_manager.default_factory
 
             if not default_factory:
@@ -399,7 +403,7 @@ class ObjectSetterType(MicroOpType):
         if runtime_type_information() or self.type_error or self.key_error:
             return super(ObjectSetterType, self).to_ast(dependency_builder, target, new_value)
         return compile_statement(
-            "{target}.__dict__[\"{key}\"] = {rvalue}",
+            "{target}._set(\"{key}\", {rvalue})",
             None, dependency_builder,
             target=target, key=self.key, rvalue=new_value
         )
@@ -599,9 +603,11 @@ class RDHObject(Composite, object):
         raise AttributeError()
 
     def _set(self, key, value):
+        storage_changed(self)
         self.__dict__[key] = value
 
     def _delete(self, key):
+        storage_changed(self)
         del self.__dict__[key]
 
     def _contains(self, key):
@@ -633,7 +639,7 @@ class RDHObject(Composite, object):
             raise TypeError()
 
     def __getattribute__(self, key):
-        if key in ("__dict__", "__class__", "_contains", "_get", "_set", "_delete", "_keys", "_values"):
+        if key in ("__dict__", "__class__", "_contains", "_get", "_set", "_delete", "_keys", "_values", "_types_attached"):
             return super(RDHObject, self).__getattribute__(key)
 
         try:
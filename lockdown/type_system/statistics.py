@@ -0,0 +1,238 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from timeit import default_timer
+
+from lockdown.type_system import composites, dict_types, list_types, \
+    object_types
+from lockdown.type_system.composites import CompositeObjectManager, \
+    CompositeType, binding_map_statistics, composite_type_is_copyable_cache
+from lockdown.type_system.exceptions import FatalError
+from lockdown.type_system.managers import managers_by_object_id
+from lockdown.type_system.micro_ops import MicroOpType
+
+
+# The modules that import the functions that are counted by name, rather than through composites
+IMPORTING_MODULES = [ composites, dict_types, list_types, object_types ]
+
+
+def get_micro_op_classes(micro_op_class=MicroOpType):
+    for subclass in micro_op_class.__subclasses__():
+        yield subclass
+        for descendant in get_micro_op_classes(subclass):
+            yield descendant
+
+
+class OperationStatistics(object):
+    """
+    The calls to one operation, and the time spent in the outermost of them.
+    """
+    __slots__ = [ "calls", "time", "depth" ]
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.depth = 0
+
+
+ACTIVE_STATISTICS = None
+
+
+class TypeSystemStatistics(object):
+    """
+    Counts the work that the type system does while it is enabled: the calls to, and time spent in,
+    binding and checking operations, attaches and detaches of types, how many nodes each bind
+    walks, the hit rates of its caches, and the rebuilds of effective composite types.
+
+    Like OpcodeProfiler, enable() replaces the counted functions and methods with counting
+    versions and disable() puts the originals back, so the type system pays nothing for this
+    while it is disabled.
+    """
+    def __init__(self):
+        self.operations = defaultdict(OperationStatistics)
+        self.attaches = 0
+        self.detaches = 0
+        self.binds = 0
+        self.bind_nodes_visited = 0
+        self.max_bind_nodes_visited = 0
+        self.type_check_cache_hits = 0
+        self.type_check_cache_misses = 0
+        self.copyable_cache_hits = 0
+        self.copyable_cache_misses = 0
+        self.effective_type_hits = 0
+        self.effective_type_rebuilds = 0
+        self.originals = []
+
+    def enable(self):
+        global ACTIVE_STATISTICS
+        if ACTIVE_STATISTICS is not None:
+            raise FatalError()
+        ACTIVE_STATISTICS = self
+
+        for name in ( "add_composite_type", "remove_composite_type" ):
+            self.replace_function(name, self.count_bind)
+        for name in ( "bind_key", "unbind_key", "build_binding_map_for_type" ):
+            self.replace_function(name, self.count_operation)
+        for micro_op_class in get_micro_op_classes():
+            if "raise_micro_op_invocation_conflicts" in micro_op_class.__dict__:
+                self.replace_method(micro_op_class, "raise_micro_op_invocation_conflicts", self.count_operation)
+
+        self.replace_method(CompositeObjectManager, "attach_type", self.count_attach)
+        self.replace_method(CompositeObjectManager, "detach_type", self.count_detach)
+        self.replace_method(CompositeObjectManager, "get_effective_composite_type", self.count_effective_type)
+        self.replace_method(CompositeType, "is_copyable_from", self.count_copyable)
+        self.replace_function("cached_type_check", self.count_type_check)
+
+    def disable(self):
+        global ACTIVE_STATISTICS
+        if ACTIVE_STATISTICS is not self:
+            raise FatalError()
+        ACTIVE_STATISTICS = None
+
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+
+    def replace_function(self, name, counter):
+        original = getattr(composites, name)
+        replacement = counter(name, original)
+        for module in IMPORTING_MODULES:
+            if getattr(module, name, None) is original:
+                self.originals.append((module, name, original))
+                setattr(module, name, replacement)
+
+    def replace_method(self, owner, name, counter):
+        original = owner.__dict__[name]
+        self.originals.append((owner, name, original))
+        setattr(owner, name, counter("{}.{}".format(owner.__name__, name), original))
+
+    def count_operation(self, name, original):
+        operation = self.operations[name.split(".")[-1]]
+
+        def counted(*args, **kwargs):
+            operation.calls += 1
+            operation.depth += 1
+            start = default_timer()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                operation.depth -= 1
+                if operation.depth == 0:
+                    operation.time += default_timer() - start
+        return counted
+
+    def count_bind(self, name, original):
+        timed = self.count_operation(name, original)
+        depth = [ 0 ]
+
+        def counted(*args, **kwargs):
+            # The nodes that the binding map walks visit, for the outermost bind
+            depth[0] += 1
+            nodes_visited = binding_map_statistics.nodes_visited
+            try:
+                return timed(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+                if depth[0] == 0:
+                    nodes_visited = binding_map_statistics.nodes_visited - nodes_visited
+                    self.binds += 1
+                    self.bind_nodes_visited += nodes_visited
+                    self.max_bind_nodes_visited = max(self.max_bind_nodes_visited, nodes_visited)
+        return counted
+
+    def count_attach(self, name, original):
+        def counted(manager, *args, **kwargs):
+            self.attaches += 1
+            return original(manager, *args, **kwargs)
+        return counted
+
+    def count_detach(self, name, original):
+        def counted(manager, *args, **kwargs):
+            self.detaches += 1
+            return original(manager, *args, **kwargs)
+        return counted
+
+    def count_effective_type(self, name, original):
+        def counted(manager):
+            if manager.cached_effective_composite_type:
+                self.effective_type_hits += 1
+            else:
+                self.effective_type_rebuilds += 1
+            return original(manager)
+        return counted
+
+    def count_copyable(self, name, original):
+        def counted(composite_type, other):
+            # The cache only lives for the outermost check, so hits are the types that a recursive
+            # check reached more than once
+            cache = getattr(composite_type_is_copyable_cache, "_is_copyable_from_cache", None)
+            if cache is not None and (id(composite_type), id(other)) in cache:
+                self.copyable_cache_hits += 1
+            else:
+                self.copyable_cache_misses += 1
+            return original(composite_type, other)
+        return counted
+
+    def count_type_check(self, name, original):
+        timed = self.count_operation(name, original)
+
+        def counted(value, type, build_binding_map):
+            manager = managers_by_object_id.get(id(value), None)
+            cached_result = manager.type_check_cache.get((id(type), build_binding_map), None) if manager else None
+            if cached_result and cached_result[0] is type:
+                self.type_check_cache_hits += 1
+            else:
+                self.type_check_cache_misses += 1
+            return timed(value, type, build_binding_map)
+        return counted
+
+    def get_statistics(self):
+        """
+        Returns the statistics as a dict, with the calls and seconds of each operation
+        """
+        def get_rate(hits, misses):
+            return float(hits) / (hits + misses) if hits + misses else None
+
+        return {
+            "operations": {
+                name: { "calls": operation.calls, "seconds": operation.time }
+                for name, operation in self.operations.items() if operation.calls
+            },
+            "attaches": self.attaches,
+            "detaches": self.detaches,
+            "binds": self.binds,
+            "nodes_visited_per_bind": float(self.bind_nodes_visited) / self.binds if self.binds else None,
+            "max_nodes_visited_per_bind": self.max_bind_nodes_visited,
+            "type_check_cache_hit_rate": get_rate(self.type_check_cache_hits, self.type_check_cache_misses),
+            "copyable_cache_hit_rate": get_rate(self.copyable_cache_hits, self.copyable_cache_misses),
+            "effective_type_rebuilds": self.effective_type_rebuilds,
+            "effective_type_hit_rate": get_rate(self.effective_type_hits, self.effective_type_rebuilds),
+            "live_managers": len(managers_by_object_id)
+        }
+
+    def format_statistics(self):
+        statistics = self.get_statistics()
+
+        def format_value(value):
+            if value is None:
+                return "-"
+            if isinstance(value, float):
+                return "{:.3f}".format(value)
+            return str(value)
+
+        report = [ "{:<40} {:>12} {:>12}".format("operation", "calls", "seconds") ]
+        for name, operation in sorted(statistics.pop("operations").items(), key=lambda item: -item[1]["seconds"]):
+            report.append("{:<40} {:>12} {:>12.3f}".format(name, operation["calls"], operation["seconds"]))
+        for name, value in sorted(statistics.items()):
+            report.append("{:<40} {:>12}".format(name, format_value(value)))
+        return "\n".join(report) + "\n"
+
+
+@contextmanager
+def type_system_statistics(statistics=None):
+    if statistics is None:
+        statistics = TypeSystemStatistics()
+    statistics.enable()
+    try:
+        yield statistics
+    finally:
+        statistics.disable()
@@ -1,12 +1,14 @@
 from unittest import main
 from unittest.case import TestCase
 
+from lockdown.type_system import composites, object_types
 from lockdown.type_system.composites import CompositeType, InferredType, \
-    check_dangling_inferred_types, prepare_lhs_type
+    check_dangling_inferred_types, prepare_lhs_type, does_value_fit_through_type, \
+    binding_map_statistics, CompositeObjectManager, get_bound_value, get_bound_values
 from lockdown.type_system.core_types import IntegerType, UnitType, StringType, \
     AnyType, Const, OneOfType, BooleanType, merge_types
 from lockdown.type_system.default_composite_types import DEFAULT_OBJECT_TYPE, \
-    rich_composite_type
+    rich_composite_type, READONLY_DEFAULT_LIST_TYPE, READONLY_DEFAULT_OBJECT_TYPE
 from lockdown.type_system.dict_types import DictGetterType, \
     RDHDict
 from lockdown.type_system.exceptions import CompositeTypeIncompatibleWithTarget, \
@@ -17,6 +19,7 @@ from lockdown.type_system.managers import get_manager, get_type_of_value
 from lockdown.type_system.object_types import ObjectGetterType, ObjectSetterType, \
     ObjectDeletterType, RDHObjectType, PythonObjectType, RDHObject, \
     DefaultDictType, ObjectWildcardGetterType, ObjectWildcardSetterType
+from lockdown.type_system.statistics import type_system_statistics
 from lockdown.utils import set_debug
 
 
@@ -1100,6 +1103,13 @@ class TestList(TestCase):
         foo.insert(0, 2)
         self.assertEqual(list(foo), [ 2, 4, 6, 8, 10, 12, 14 ])
 
+    def test_list_deletion_ok(self):
+        foo = RDHList([ 4, 6, 8 ])
+        get_manager(foo).add_composite_type(RDHListType([ ], IntegerType()))
+
+        del foo[0]
+        self.assertEqual(list(foo), [ 6, 8 ])
+
     def test_sparse_list_setting(self):
         foo = RDHList([ 4, 6, 8 ], is_sparse=True)
         get_manager(foo).add_composite_type(RDHListType([ ], IntegerType(), is_sparse=True))
@@ -1293,6 +1303,301 @@ class TestRuntime(TestCase):
         self.assertEquals(len(get_manager(A).attached_types), 0)
         self.assertEquals(get_manager(A).attached_type_counts[id(At)], 0)
 
+class TestDeferredElementBinding(TestCase):
+    def make_list(self, size):
+        return RDHList([ RDHObject({ "foo": i }) for i in range(size) ])
+
+    def test_elements_bound_on_access(self):
+        foo = self.make_list(100)
+        element_type = RDHObjectType({ "foo": IntegerType() })
+        get_manager(foo).add_composite_type(RDHListType([], element_type), defer_elements=True)
+
+        self.assertEquals(len(get_manager(foo._get(5)).attached_types), 0)
+
+        self.assertEquals(foo[5].foo, 5)
+
+        self.assertEquals(get_manager(foo._get(5)).attached_type_counts[id(element_type)], 1)
+        self.assertEquals(len(get_manager(foo._get(6)).attached_types), 0)
+
+        with self.assertRaises(TypeError):
+            foo[5].foo = "hello"
+
+    def test_incompatible_element_fails_on_access(self):
+        foo = self.make_list(10)
+        foo._set(3, RDHObject({ "foo": "hello" }))
+        get_manager(foo).add_composite_type(
+            RDHListType([], RDHObjectType({ "foo": IntegerType() })), defer_elements=True
+        )
+
+        self.assertEquals(foo[2].foo, 2)
+        with self.assertRaises(CompositeTypeIncompatibleWithTarget):
+            foo[3]
+        with self.assertRaises(CompositeTypeIncompatibleWithTarget):
+            foo[3]
+
+    def test_full_check_binds_elements(self):
+        foo = self.make_list(10)
+        list_type = RDHListType([], RDHObjectType({ "foo": IntegerType() }))
+        get_manager(foo).add_composite_type(list_type, defer_elements=True)
+
+        self.assertTrue(does_value_fit_through_type(foo, list_type))
+        for element in foo._values():
+            self.assertEquals(len(get_manager(element).attached_types), 1)
+        self.assertEquals(len(get_manager(foo).deferred_element_types.values()[0].bound_keys), 10)
+
+    def test_binding_does_not_visit_elements(self):
+        foo = self.make_list(1000)
+        get_manager(foo).add_composite_type(RDHListType([], RDHObjectType({ "foo": IntegerType() })), defer_elements=True)
+
+        self.assertLess(binding_map_statistics.last_nodes_visited, 5)
+
+    def test_element_types_that_admit_any_value_are_always_deferred(self):
+        foo = self.make_list(1000)
+        get_manager(foo).add_composite_type(READONLY_DEFAULT_LIST_TYPE)
+
+        self.assertLess(binding_map_statistics.last_nodes_visited, 5)
+        self.assertEquals(len(get_manager(foo._get(500)).attached_types), 0)
+
+        self.assertEquals(foo[500].foo, 500)
+        self.assertEquals(get_manager(foo._get(500)).attached_type_counts[id(READONLY_DEFAULT_OBJECT_TYPE)], 1)
+
+    def test_raw_reads_bind_elements(self):
+        foo = self.make_list(10)
+        element_type = RDHObjectType({ "foo": IntegerType() })
+        get_manager(foo).add_composite_type(RDHListType([], element_type), defer_elements=True)
+
+        self.assertEquals(get_bound_value(foo, 3).foo, 3)
+        self.assertEquals(get_manager(foo._get(3)).attached_type_counts[id(element_type)], 1)
+
+        for element in get_bound_values(foo):
+            self.assertEquals(get_manager(element).attached_type_counts[id(element_type)], 1)
+
+    def test_conflicting_element_bind_fails_on_access(self):
+        foo = self.make_list(10)
+        get_manager(foo).add_composite_type(
+            RDHListType([], RDHObjectType({ "foo": IntegerType() })), defer_elements=True
+        )
+
+        get_manager(foo._get(2)).add_composite_type(RDHObjectType({ "foo": AnyType() }))
+        with self.assertRaises(CompositeTypeIncompatibleWithTarget):
+            foo[2]
+
+    def test_remove_type_with_deferred_elements(self):
+        foo = self.make_list(10)
+        list_type = RDHListType([], RDHObjectType({ "foo": IntegerType() }))
+        get_manager(foo).add_composite_type(list_type, defer_elements=True)
+
+        foo[1]
+        get_manager(foo).remove_composite_type(list_type)
+
+        for element in foo._values():
+            self.assertEquals(len(get_manager(element).attached_types), 0)
+        self.assertEquals(len(get_manager(foo).deferred_element_types), 0)
+
+    def test_repeated_bind_with_deferred_elements(self):
+        foo = self.make_list(10)
+        element_type = RDHObjectType({ "foo": IntegerType() })
+        list_type = RDHListType([], element_type)
+        get_manager(foo).add_composite_type(list_type, defer_elements=True)
+        foo[1]
+        get_manager(foo).add_composite_type(list_type, defer_elements=True)
+
+        self.assertEquals(get_manager(foo._get(1)).attached_type_counts[id(element_type)], 2)
+        foo[2]
+        self.assertEquals(get_manager(foo._get(2)).attached_type_counts[id(element_type)], 2)
+
+        get_manager(foo).remove_composite_type(list_type)
+        self.assertEquals(get_manager(foo._get(1)).attached_type_counts[id(element_type)], 1)
+        self.assertEquals(get_manager(foo._get(2)).attached_type_counts[id(element_type)], 1)
+        self.assertEquals(len(get_manager(foo._get(3)).attached_types), 0)
+
+    def test_replaced_element_is_unbound(self):
+        foo = self.make_list(10)
+        get_manager(foo).add_composite_type(
+            RDHListType([], RDHObjectType({ "foo": IntegerType() })), defer_elements=True
+        )
+        old_element = foo._get(7)
+
+        foo[7] = RDHObject({ "foo": 42 })
+
+        self.assertEquals(len(get_manager(old_element).attached_types), 0)
+        self.assertEquals(len(get_manager(foo._get(7)).attached_types), 1)
+
+class TestTypeCheckCache(TestCase):
+    def test_result_is_cached(self):
+        foo = RDHObject({ "bar": RDHObject({ "baz": 42 }) })
+        check_type = RDHObjectType({ "bar": RDHObjectType({ "baz": IntegerType() }) })
+
+        self.assertTrue(does_value_fit_through_type(foo, check_type))
+        self.assertEquals(get_manager(foo).type_check_cache[(id(check_type), False)], (check_type, True))
+        self.assertTrue(does_value_fit_through_type(foo, check_type))
+
+    def test_result_dropped_when_child_changes(self):
+        bar = RDHList([ 4 ], bind=RDHListType([], IntegerType(), allow_wildcard_insert=False))
+        foo = RDHObject({ "bar": bar })
+        check_type = RDHObjectType({ "bar": RDHListType([ IntegerType(), IntegerType() ], None) })
+
+        self.assertFalse(does_value_fit_through_type(foo, check_type))
+
+        version = get_manager(bar).version
+        bar.insert(0, 2)
+        self.assertTrue(get_manager(bar).version > version)
+
+        self.assertTrue(does_value_fit_through_type(foo, check_type))
+
+    def test_result_dropped_when_types_change(self):
+        bar = RDHObject({ "baz": 42 })
+        foo = RDHObject({ "bar": bar })
+        check_type = RDHObjectType({ "bar": RDHObjectType({ "baz": IntegerType() }) })
+
+        self.assertTrue(does_value_fit_through_type(foo, check_type))
+
+        get_manager(bar).add_composite_type(RDHObjectType({ "baz": AnyType() }))
+
+        self.assertFalse(does_value_fit_through_type(foo, check_type))
+
+    def test_result_dropped_when_storage_changes(self):
+        foo = RDHObject({ "bar": 5 })
+        check_type = RDHObjectType({ "bar": IntegerType() })
+
+        self.assertTrue(does_value_fit_through_type(foo, check_type))
+        foo._set("bar", "hello")
+        self.assertFalse(does_value_fit_through_type(foo, check_type))
+        foo._set("bar", 6)
+        self.assertTrue(does_value_fit_through_type(foo, check_type))
+        foo._delete("bar")
+        self.assertFalse(does_value_fit_through_type(foo, check_type))
+
+    def test_result_dropped_when_child_storage_changes(self):
+        bar = RDHList([ 4, 5 ])
+        foo = RDHObject({ "bar": bar })
+        check_type = RDHObjectType({ "bar": RDHListType([ IntegerType(), IntegerType() ], None) })
+
+        self.assertTrue(does_value_fit_through_type(foo, check_type))
+        bar._insert(0, "hello")
+        self.assertFalse(does_value_fit_through_type(foo, check_type))
+        bar._delete(0)
+        self.assertTrue(does_value_fit_through_type(foo, check_type))
+
+class TestBindingMapWalk(TestCase):
+    def build_chain(self, length):
+        foo = RDHObject({ "baz": 42 })
+        foo_type = RDHObjectType({ "baz": IntegerType() })
+        for _ in range(length):
+            foo = RDHObject({ "next": foo })
+            foo_type = RDHObjectType({ "next": foo_type })
+        return foo, foo_type
+
+    def test_deep_chain_does_not_recurse(self):
+        foo, foo_type = self.build_chain(3000)
+
+        self.assertTrue(does_value_fit_through_type(foo, foo_type))
+
+        get_manager(foo).add_composite_type(foo_type)
+
+        bottom = foo
+        for _ in range(3000):
+            bottom = bottom.next
+        self.assertEquals(bottom.baz, 42)
+        with self.assertRaises(Exception):
+            bottom.baz = "hello"
+
+    def test_nodes_visited_are_counted(self):
+        foo, foo_type = self.build_chain(10)
+
+        binding_map_statistics.reset()
+        self.assertTrue(does_value_fit_through_type(foo, foo_type))
+
+        self.assertEquals(binding_map_statistics.walks, 1)
+        self.assertEquals(binding_map_statistics.last_nodes_visited, 12)
+
+    def test_attached_types_are_not_walked_again(self):
+        foo, foo_type = self.build_chain(10)
+        get_manager(foo).add_composite_type(foo_type)
+
+        binding_map_statistics.reset()
+        self.assertTrue(does_value_fit_through_type(RDHObject({ "next": foo }), RDHObjectType({ "next": foo_type })))
+
+        self.assertEquals(binding_map_statistics.last_nodes_visited, 2)
+
+class TestTypeSystemStatistics(TestCase):
+    def test_binds_are_counted(self):
+        foo = RDHObject({ "next": RDHObject({ "next": RDHObject({ "baz": 42 }) }) })
+        foo_type = RDHObjectType({ "next": RDHObjectType({ "next": RDHObjectType({ "baz": IntegerType() }) }) })
+
+        with type_system_statistics() as statistics:
+            get_manager(foo).add_composite_type(foo_type)
+            self.assertTrue(does_value_fit_through_type(foo, foo_type))
+            self.assertTrue(does_value_fit_through_type(foo, foo_type))
+
+        results = statistics.get_statistics()
+        self.assertEquals(results["binds"], 1)
+        self.assertEquals(results["attaches"], 3)
+        self.assertEquals(results["max_nodes_visited_per_bind"], 4)
+        self.assertEquals(results["type_check_cache_hit_rate"], 0.5)
+        self.assertEquals(results["operations"]["add_composite_type"]["calls"], 1)
+        self.assertIn("attaches", statistics.format_statistics())
+
+    def test_disabled(self):
+        attach_type = CompositeObjectManager.__dict__["attach_type"]
+        with type_system_statistics():
+            self.assertIsNot(CompositeObjectManager.__dict__["attach_type"], attach_type)
+        self.assertIs(CompositeObjectManager.__dict__["attach_type"], attach_type)
+        self.assertIs(object_types.bind_key, composites.bind_key)
+
+
+class TestPrimitiveArrayLists(TestCase):
+    def test_int_list_uses_typed_array(self):
+        foo = RDHList([ 1, 2, 3 ], bind=RDHListType([], IntegerType()))
+
+        self.assertEquals(foo.typed_array.tolist(), [ 1, 2, 3 ])
+
+        foo[1] = 42
+        foo.insert(0, 5)
+        foo._delete(3)
+
+        self.assertEquals(foo._to_list(), [ 5, 1, 42 ])
+        self.assertEquals(foo.typed_array.tolist(), [ 5, 1, 42 ])
+
+    def test_int_list_enforces_type(self):
+        foo = RDHList([ 1, 2, 3 ], bind=RDHListType([], IntegerType()))
+
+        with self.assertRaises(TypeError):
+            foo[1] = "hello"
+        with self.assertRaises(TypeError):
+            foo[1] = True
+
+        self.assertEquals(foo.typed_array.tolist(), [ 1, 2, 3 ])
+
+    def test_bool_list_uses_typed_array(self):
+        foo = RDHList([ True, False ], bind=RDHListType([], BooleanType()))
+
+        foo[1] = True
+
+        self.assertEquals(foo._to_list(), [ True, True ])
+        self.assertTrue(foo[0] is True)
+
+    def test_mixed_list_is_generic(self):
+        foo = RDHList([ 1, "hello" ], bind=RDHListType([], AnyType()))
+        self.assertIsNone(foo.typed_array)
+
+        bar = RDHList([ 1, 2 ], bind=RDHListType([], AnyType()))
+        self.assertIsNone(bar.typed_array)
+
+    def test_escape_to_generic_storage(self):
+        foo = RDHList([ 1, 2, 3 ], bind=RDHListType([], IntegerType()))
+
+        foo._set(2, 10 ** 30)
+
+        self.assertIsNone(foo.typed_array)
+        self.assertEquals(foo._to_list(), [ 1, 2, 10 ** 30 ])
+
+    def test_buffer(self):
+        foo = RDHList([ 1, 2, 3 ], bind=RDHListType([], IntegerType()))
+
+        self.assertEquals(len(foo._as_buffer()), 3 * foo.typed_array.itemsize)
+        self.assertIsNone(RDHList([ 1 ])._as_buffer())
+
 class TestRDHInstances(TestCase):
     def test_object_set_and_get(self):
         foo = RDHObject({})
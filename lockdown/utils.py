@@ -48,6 +48,7 @@ def micro_op_repr(opname, key, key_error, type=None, type_error=None):
         return "{}.{}{}".format(opname, key, "!" if key_error else "")
 
 def print_code(ast):
+    from lockdown.executor.raw_code import RawCode
     from lockdown.type_system.dict_types import RDHDict
     from lockdown.type_system.exceptions import FatalError
     from lockdown.type_system.list_types import RDHList
@@ -55,6 +56,8 @@ def print_code(ast):
 
     class RDHObjectEncoder(JSONEncoder):
         def default(self, o):
+            if isinstance(o, RawCode):
+                return o._to_dict()
             if isinstance(o, RDHObject):
                 return o.__dict__
             if isinstance(o, RDHList):